@@ -0,0 +1,108 @@
+"""
+Throughput and ratio of the codecs the ingest reads and writes, on a delivery from benchmarks.deliveries. For each
+codec and level it times compressing the delivery and parsing it back, decompressed as it is parsed like the ingest
+does, and encoding its records as an output file, and reports the compressed size against the plain csv. Prints the
+results as JSON. Run from the repository root:
+
+    python -m benchmarks.compression_benchmark --rows 200000 --output before.json
+    python -m benchmarks.compression_benchmark --rows 200000 --compare before.json
+"""
+import argparse
+import io
+import json
+import platform
+import time
+
+import pandas as pd
+
+from benchmarks.deliveries import generate_frame
+from benchmarks.ingest_benchmark import _commit
+from ingest_utils.compression import compress
+from ingest_utils.output_format import encode
+
+# (output format, codec, level), None is the codec's default level
+CODECS = [('csv', None, None),
+          ('csv', 'gzip', 1), ('csv', 'gzip', 6), ('csv', 'gzip', 9),
+          ('csv', 'zstd', 1), ('csv', 'zstd', 3), ('csv', 'zstd', 9), ('csv', 'zstd', 19),
+          ('parquet', 'snappy', None), ('parquet', 'zstd', None), ('parquet', 'gzip', None)]
+
+
+def _name(output_format, codec, level):
+    return '-'.join(str(part) for part in (output_format, codec, level) if part is not None)
+
+
+def _best(func, repeat):
+    """
+    Runs func repeat times, returns its result and the fastest time
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        seconds.append(time.perf_counter() - start)
+    return result, min(seconds)
+
+
+def measure(df, output_format, codec, level, repeat=3):
+    """
+    :return: dict with the compressed size, the ratio to the plain csv and the throughput in plain csv MB/s of
+        compressing the source, parsing it back and encoding the output, csv sources only
+    """
+    plain = df.to_csv(index=False).encode('utf-8')
+    mb = len(plain) / 1e6
+    result = dict()
+    if output_format == 'csv':
+        source = plain
+        if codec:
+            source, seconds = _best(lambda: compress(plain, codec, level), repeat)
+            result['compress_mb_per_second'] = round(mb / max(seconds, 1e-9), 1)
+        _, seconds = _best(lambda: pd.read_csv(io.BytesIO(source), compression=codec), repeat)
+        result['parse_mb_per_second'] = round(mb / max(seconds, 1e-9), 1)
+    output, seconds = _best(lambda: encode(df, output_format, codec, level), repeat)
+    result.update(bytes=len(output),
+                  ratio=round(len(plain) / len(output), 2),
+                  encode_mb_per_second=round(mb / max(seconds, 1e-9), 1))
+    return result
+
+
+def run(args):
+    df = generate_frame('20220512', args.rows, seed=args.seed).astype(str)
+    return {'commit': _commit(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'parameters': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+            'codecs': {_name(*codec): measure(df, *codec, repeat=args.repeat) for codec in CODECS}}
+
+
+def compare(results, baseline):
+    """
+    Speedup of encoding with each codec against the results of an earlier run, above 1 is faster
+    """
+    speedup = dict()
+    for name, result in results['codecs'].items():
+        if name in baseline.get('codecs', dict()):
+            before = baseline['codecs'][name]['encode_mb_per_second']
+            speedup[name] = round(result['encode_mb_per_second'] / max(before, 1e-9), 2)
+    return speedup
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput and ratio of the source and output codecs")
+    parser.add_argument('--rows', type=int, default=100000, help="records of the delivery")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="runs per measure, the fastest is kept")
+    parser.add_argument('--output', help="also write the results to this file")
+    parser.add_argument('--compare', help="results of an earlier run to report the speedup against")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    results = run(args)
+    if args.compare:
+        with open(args.compare) as f:
+            results['speedup'] = compare(results, json.load(f))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,82 @@
+"""
+Generates synthetic deliveries shaped like the real ones, `YYYYMMDD/TV_n.csv` objects with several brands and
+values that every rule of the scrubber config has to act on
+"""
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from ingest_utils.compression import CODEC_SUFFIXES, compress
+
+BRANDS = ['TCL', 'TOSHIBA', 'Mi', 'realme', 'OnePlus', 'Samsung']
+RESOLUTIONS = ['HD LED', 'Full HD LED', 'Ultra HD LED', 'QLED Ultra HD']
+OPERATING_SYSTEMS = ['Android', 'VIDAA', 'Linux', 'Tizen', 'WebOS']
+
+# clean values first, then out of range, decimals and text, so dirty_fraction picks from the tail
+SIZES = [32, 43, 50, 55, 65, -1, 1e9, 42.5]
+PRICES = ['13999', '37999', '52999', '129990', '-5', '900000000', '14999.5', 'abc', '']
+RATINGS = [4.1, 4.3, 4.4, 4.5, -1, 99e9, np.nan]
+DATES = ['19000101', '20991231']
+
+
+def delivery_days(days, end=None):
+    """
+    The last `days` days up to end, by default today, so they fall inside the default date window
+    """
+    end = end or date.today()
+    return [(end - timedelta(days=i)).strftime('%Y%m%d') for i in range(days)][::-1]
+
+
+def _pick(rng, values, clean, rows, dirty_fraction):
+    dirty = rng.random(rows) < dirty_fraction
+    return np.where(dirty, rng.choice(np.array(values[clean:], dtype=object), rows),
+                    rng.choice(np.array(values[:clean], dtype=object), rows))
+
+
+def generate_frame(day, rows, brands=BRANDS, dirty_fraction=0.05, seed=0):
+    """
+    Records of one delivery
+    :param day: YYYYMMDD of the delivery, records outside the date window are mixed in as dirty values
+    :param rows: number of records
+    :param brands: brands to spread the records over
+    :param dirty_fraction: share of the values of each column that the scrubber has to fix
+    :param seed: seed of the random generator, the same arguments always give the same frame
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'Brand': rng.choice(brands, rows),
+                         'Resolution': rng.choice(RESOLUTIONS, rows),
+                         'Size ': _pick(rng, SIZES, 5, rows, dirty_fraction),
+                         'Selling Price': _pick(rng, PRICES, 4, rows, dirty_fraction),
+                         'Original Price': _pick(rng, PRICES, 4, rows, dirty_fraction),
+                         'Operating System': rng.choice(OPERATING_SYSTEMS, rows),
+                         'Rating': _pick(rng, RATINGS, 4, rows, dirty_fraction),
+                         'date': _pick(rng, [day] + DATES, 1, rows, dirty_fraction)})
+
+
+def generate_deliveries(days=3, files=2, rows=1000, brands=BRANDS, dirty_fraction=0.05, seed=0, end=None,
+                        compression=None):
+    """
+    Yields the key and csv body of days x files deliveries of rows records each
+    :param compression: 'gzip' or 'zstd' to deliver .csv.gz or .csv.zst files
+    """
+    for d, day in enumerate(delivery_days(days, end)):
+        for f in range(files):
+            df = generate_frame(day, rows, brands, dirty_fraction, seed=seed + d * files + f)
+            body = df.to_csv(index=False).encode('utf-8')
+            if compression:
+                yield f'{day}/TV_{f}.csv' + CODEC_SUFFIXES[compression], compress(body, compression)
+            else:
+                yield f'{day}/TV_{f}.csv', body
+
+
+def load_deliveries(s3, bucket, prefix="", **kwargs):
+    """
+    Puts generated deliveries in a benchmarks.local_aws.LocalS3 bucket
+    :return: number of deliveries and their total size in bytes
+    """
+    count, size = 0, 0
+    for key, body in generate_deliveries(**kwargs):
+        s3.put(bucket, prefix + key, body)
+        count, size = count + 1, size + len(body)
+    return count, size
@@ -0,0 +1,114 @@
+"""
+Import time benchmark of the ingest modules and the CLI. Each module is imported in a fresh interpreter with
+`python -X importtime`, the cumulative time of the import, its slowest imports and the heavy dependencies it pulled
+in are reported, with the wall-clock time of `python run.py --help`, as JSON. The heavy dependencies must only be
+imported once they are used, the benchmark exits with 1 if any of them is imported up front. Run from the repository
+root:
+
+    python -m benchmarks.import_benchmark --output before.json
+    python -m benchmarks.import_benchmark --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks.ingest_benchmark import _commit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ['ingest', 'ingest_utils.metrics', 's3_client.s3_client', 's3_client.async_s3_client']
+
+# imported where they are first used, never when the modules above are imported
+LAZY = ['pandas', 'numpy', 'pyarrow', 'newtools', 'dativa', 'aiobotocore', 'asyncio', 'boto3', 'zstandard']
+
+
+def parse_importtime(stderr):
+    """
+    Parses the `-X importtime` report
+    :return: list of (module, self us, cumulative us, depth), in the order the imports finished
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def time_import(module, repeat=3):
+    """
+    Imports a module in `repeat` fresh interpreters and keeps the fastest
+    :return: dict with the cumulative seconds, the slowest direct imports and the lazy dependencies imported
+    """
+    best = None
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"], cwd=ROOT,
+                                capture_output=True, text=True, check=True)
+        imports = parse_importtime(result.stderr)
+        if best is None or imports[-1][2] < best[-1][2]:
+            best = imports
+    loaded = {name.split('.')[0] for name, _, _, _ in best}
+    direct = sorted((imp for imp in best if imp[3] == 1), key=lambda imp: -imp[2])
+    return {'seconds': round(best[-1][2] / 1e6, 4),
+            'modules': len(best),
+            'slowest': {name: round(cumulative / 1e6, 4) for name, _, cumulative, _ in direct[:5]},
+            'lazy_imported': [name for name in LAZY if name in loaded]}
+
+
+def time_cli(repeat=3):
+    """
+    Wall-clock seconds of `python run.py --help`, the fastest of `repeat` runs
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, 'run.py', '--help'], cwd=ROOT, capture_output=True, check=True)
+        seconds.append(time.perf_counter() - start)
+    return round(min(seconds), 4)
+
+
+def run(args):
+    return {'commit': _commit(),
+            'python': platform.python_version(),
+            'imports': {module: time_import(module, args.repeat) for module in args.modules},
+            'cli_help_seconds': time_cli(args.repeat)}
+
+
+def compare(results, baseline):
+    """
+    Speedup of each import and of the CLI against the results of an earlier run, above 1 is faster
+    """
+    speedup = {module: round(baseline['imports'][module]['seconds'] / max(result['seconds'], 1e-9), 2)
+               for module, result in results['imports'].items() if module in baseline.get('imports', dict())}
+    if 'cli_help_seconds' in baseline:
+        speedup['cli_help'] = round(baseline['cli_help_seconds'] / max(results['cli_help_seconds'], 1e-9), 2)
+    return speedup
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Import time benchmark of the ingest modules and the CLI")
+    parser.add_argument('--modules', nargs='+', default=MODULES, help="modules to import")
+    parser.add_argument('--repeat', type=int, default=3, help="fresh interpreters per measure, the fastest is kept")
+    parser.add_argument('--output', help="also write the results to this file")
+    parser.add_argument('--compare', help="results of an earlier run to report the speedup against")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    results = run(args)
+    if args.compare:
+        with open(args.compare) as f:
+            results['speedup'] = compare(results, json.load(f))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    if any(result['lazy_imported'] for result in results['imports'].values()):
+        sys.exit(1)
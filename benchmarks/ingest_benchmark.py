@@ -0,0 +1,193 @@
+"""
+Offline benchmark of the ingest, against the in-process stand-ins of benchmarks.local_aws and deliveries from
+benchmarks.deliveries. Times each stage on its own, list, load, scrub, write and partition, and then a whole
+ingest() run, and prints the results as JSON. Run from the repository root:
+
+    python -m benchmarks.ingest_benchmark --days 5 --files 4 --rows 20000 --output before.json
+    python -m benchmarks.ingest_benchmark --days 5 --files 4 --rows 20000 --compare before.json
+"""
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import time
+
+import pandas as pd
+
+from benchmarks.deliveries import BRANDS, load_deliveries
+from benchmarks.local_aws import LocalS3, local_ingest
+from ingest import _brand_frames, _read_csv, _scrub, logger
+from ingest_utils.compression import SOURCE_SUFFIXES
+from ingest_utils.date_window import list_window
+from ingest_utils.output_format import encode
+from ingest_utils.stats import RunningStats
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Stage:
+    """
+    Times a stage and counts what went through it, and the requests it made to the LocalS3
+    """
+
+    def __init__(self, name, s3):
+        self.name = name
+        self.s3 = s3
+        self.objects = 0
+        self.rows = 0
+        self.bytes = 0
+
+    def __enter__(self):
+        self._requests = dict(self.s3.requests)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._start
+        self.requests = {k: v - self._requests.get(k, 0) for k, v in self.s3.requests.items()
+                         if v != self._requests.get(k, 0)}
+
+    def as_dict(self):
+        seconds = self.seconds or 1e-9
+        return {'seconds': round(self.seconds, 4),
+                'objects': self.objects,
+                'rows': self.rows,
+                'bytes': self.bytes,
+                'requests': self.requests,
+                'objects_per_second': round(self.objects / seconds, 1),
+                'rows_per_second': round(self.rows / seconds, 1),
+                'mb_per_second': round(self.bytes / seconds / 1e6, 2)}
+
+
+def run_stages(s3, args):
+    """
+    Runs the stages of an ingest one after the other, each on the output of the one before
+    """
+    ingest = local_ingest(s3, **_ingest_kwargs(args))
+    stages = []
+
+    with Stage('list', s3) as stage:
+        objects = list_window(ingest.s3c, ingest.source_bucket.s3_url, ingest.window, suffix=tuple(SOURCE_SUFFIXES),
+                              max_workers=ingest.list_workers)
+        stage.objects = len(objects)
+    stages.append(stage)
+
+    frames = []
+    with Stage('load', s3) as stage:
+        for obj in objects:
+            body = ingest._read(obj)
+            frames.append((obj, _read_csv(body)))
+            stage.bytes += len(body)
+        stage.objects = len(frames)
+        stage.rows = sum(len(df) for _, df in frames)
+    stages.append(stage)
+
+    brand_frames = []
+    with Stage('scrub', s3) as stage:
+        for obj, df in frames:
+            for tv_type, brand_df in _brand_frames(df, ingest.tv_types):
+                _scrub(brand_df, RunningStats(), dict(), ingest.scrubber_engine)
+                brand_frames.append((obj, tv_type, brand_df))
+                stage.rows += len(brand_df)
+        stage.objects = len(frames)
+    stages.append(stage)
+
+    written = dict()
+    with Stage('write', s3) as stage:
+        for obj, tv_type, brand_df in brand_frames:
+            output = encode(brand_df, ingest.output_format, ingest.compression, ingest.compression_level)
+            location = ingest._write_location(obj['key'], tv_type)
+            s3.put_object(Bucket=location.bucket, Key=location.key, Body=output)
+            written.setdefault(tv_type, set()).add(ingest._key_map(obj['key'])['day'])
+            stage.objects += 1
+            stage.rows += len(brand_df)
+            stage.bytes += len(output)
+    stages.append(stage)
+
+    with Stage('partition', s3) as stage:
+        ingest.add_partitions(written)
+        stage.objects = sum(len(days) for days in written.values())
+    stages.append(stage)
+    return stages
+
+
+def run_ingest(s3, args):
+    """
+    Times a whole ingest() run, with the pipelining and chunking asked for
+    """
+    ingest = local_ingest(s3, full_refresh=True, **_ingest_kwargs(args))
+    with Stage('ingest', s3) as stage:
+        ingest.ingest()
+    return stage
+
+
+def _ingest_kwargs(args):
+    return dict(tv_type=args.tv_type, scrubber_engine=args.scrubber_engine, output_format=args.output_format,
+                compression=args.compression, compression_level=args.compression_level, chunk_size=args.chunk_size,
+                pipelined=args.pipelined, async_io=args.async_io)
+
+
+def run(args):
+    s3 = LocalS3()
+    deliveries, size = load_deliveries(s3, 'raw', days=args.days, files=args.files, rows=args.rows,
+                                       brands=BRANDS[:args.brands], seed=args.seed,
+                                       compression=args.source_compression)
+    stages = run_stages(s3, args)
+    ingest = run_ingest(s3, args)
+    ingest.objects, ingest.rows, ingest.bytes = deliveries, deliveries * args.rows, size
+    return {'commit': _commit(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'parameters': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+            'stages': {stage.name: stage.as_dict() for stage in stages + [ingest]}}
+
+
+def compare(results, baseline):
+    """
+    Speedup of each stage against the results of an earlier run, above 1 is faster
+    """
+    return {name: round(baseline['stages'][name]['seconds'] / max(stage['seconds'], 1e-9), 2)
+            for name, stage in results['stages'].items() if name in baseline.get('stages', dict())}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the ingest stages")
+    parser.add_argument('--days', type=int, default=3, help="day folders of deliveries")
+    parser.add_argument('--files', type=int, default=2, help="deliveries per day")
+    parser.add_argument('--rows', type=int, default=10000, help="records per delivery")
+    parser.add_argument('--brands', type=int, default=len(BRANDS), choices=range(1, len(BRANDS) + 1),
+                        help="number of brands in the deliveries")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-tv', '--tv-type', default='TCL,TOSHIBA', help="tv types to ingest, or all")
+    parser.add_argument('--scrubber-engine', default='dativa', choices=['dativa', 'vectorized'])
+    parser.add_argument('--output-format', default='csv', choices=['csv', 'parquet'])
+    parser.add_argument('--compression', default=None, choices=['snappy', 'zstd', 'gzip'])
+    parser.add_argument('--compression-level', type=int, default=None)
+    parser.add_argument('--source-compression', default=None, choices=['gzip', 'zstd'],
+                        help="deliver .csv.gz or .csv.zst files")
+    parser.add_argument('--chunk-size', type=int, default=None, help="stream deliveries in the ingest() run")
+    parser.add_argument('--pipelined', action='store_true', help="pipeline the ingest() run")
+    parser.add_argument('--async-io', action='store_true', help="read and write with coroutines in the ingest() run")
+    parser.add_argument('--output', help="also write the results to this file")
+    parser.add_argument('--compare', help="results of an earlier run to report the speedup against")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logger.setLevel(logging.WARNING)
+    results = run(args)
+    if args.compare:
+        with open(args.compare) as f:
+            results['speedup'] = compare(results, json.load(f))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
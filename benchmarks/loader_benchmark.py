@@ -0,0 +1,128 @@
+"""
+Parse time and memory of the two delivery loaders, 'infer' which parses every column and infers its type, and
+'schema' which parses the columns of scrubber_config/input_schema.py with pyarrow and only converts the records of
+the tv types. Each loader parses a delivery from benchmarks.deliveries and splits it by brand in a fresh process,
+so its peak resident memory is its own. Prints the results as JSON. Run from the repository root:
+
+    python -m benchmarks.loader_benchmark --rows 500000 --output before.json
+    python -m benchmarks.loader_benchmark --rows 500000 --compare before.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from benchmarks.deliveries import generate_frame
+from benchmarks.ingest_benchmark import _commit
+from ingest_utils.compression import compress
+from ingest_utils.loader import LOADERS
+from ingest_utils.metrics import peak_memory_mb
+
+
+def measure(path, loader, tv_types=None, repeat=3):
+    """
+    Parses the delivery in the file repeat times and splits it by brand, run in a fresh process
+    :return: dict with the fastest parse, the records parsed and kept, the memory of the parsed frame and the peak
+        resident memory of the process, in total and above what it was before the delivery was read
+    """
+    # imported before the baseline so the memory of the modules is not counted as the loader's
+    import pyarrow.csv  # noqa: F401
+    from ingest import _brand_frames, _frame_bytes, _load
+
+    baseline = peak_memory_mb()
+    with open(path, 'rb') as f:
+        body = f.read()
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df, rows = _load(body, loader, tv_types)
+        kept = sum(len(brand_df) for _, brand_df in _brand_frames(df, tv_types))
+        seconds.append(time.perf_counter() - start)
+    peak = peak_memory_mb()
+    return {'parse_seconds': round(min(seconds), 4),
+            'rows_in': rows,
+            'rows_kept': kept,
+            'frame_mb': round(_frame_bytes(df) / 1e6, 2),
+            'peak_memory_mb': peak,
+            'peak_increase_mb': round(peak - baseline, 1)}
+
+
+def write_delivery(path, rows, seed=0, compression=None):
+    """
+    Writes a generated delivery to a file
+    :return: its size in bytes
+    """
+    body = generate_frame('20220512', rows, seed=seed).to_csv(index=False).encode('utf-8')
+    if compression:
+        body = compress(body, compression)
+    with open(path, 'wb') as f:
+        f.write(body)
+    return len(body)
+
+
+def _in_fresh_process(func, *args):
+    # the peak resident memory of a process carries over to the processes it starts, so everything is run in
+    # its own process, the delivery too is generated in one rather than in this one
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(func, *args).result()
+
+
+def run(args):
+    tv_types = [tv_type.strip() for tv_type in args.tv_type.split(',')] if args.tv_type != 'all' else None
+    loaders = dict()
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'delivery.csv')
+        size = _in_fresh_process(write_delivery, path, args.rows, args.seed, args.source_compression)
+        for loader in LOADERS:
+            loaders[loader] = _in_fresh_process(measure, path, loader, tv_types, args.repeat)
+    infer, schema = loaders['infer'], loaders['schema']
+    return {'commit': _commit(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'parameters': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+            'bytes': size,
+            'loaders': loaders,
+            # above 1 the schema loader is faster, or uses less memory
+            'schema_vs_infer': {
+                'parse_speedup': round(infer['parse_seconds'] / max(schema['parse_seconds'], 1e-9), 2),
+                'frame_memory_ratio': round(infer['frame_mb'] / max(schema['frame_mb'], 1e-9), 2),
+                'peak_increase_ratio': round(infer['peak_increase_mb'] / max(schema['peak_increase_mb'], 1e-9), 2)}}
+
+
+def compare(results, baseline):
+    """
+    Speedup of the parse of each loader against the results of an earlier run, above 1 is faster
+    """
+    return {loader: round(baseline['loaders'][loader]['parse_seconds'] / max(result['parse_seconds'], 1e-9), 2)
+            for loader, result in results['loaders'].items() if loader in baseline.get('loaders', dict())}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Parse time and memory of the delivery loaders")
+    parser.add_argument('--rows', type=int, default=200000, help="records of the delivery")
+    parser.add_argument('--tv-type', default='TCL,TOSHIBA', help="brands kept, or all")
+    parser.add_argument('--source-compression', default=None, choices=['gzip', 'zstd'],
+                        help="compress the delivery with this codec")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="parses per loader, the fastest is kept")
+    parser.add_argument('--output', help="also write the results to this file")
+    parser.add_argument('--compare', help="results of an earlier run to report the speedup against")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    results = run(args)
+    if args.compare:
+        with open(args.compare) as f:
+            results['speedup'] = compare(results, json.load(f))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,255 @@
+"""
+In-process stand-ins for the AWS services the ingest talks to, so it can be run and timed without
+an account. Objects are held in memory, Athena queries are recorded instead of run.
+"""
+import asyncio
+import hashlib
+import io
+import threading
+from datetime import datetime, timezone
+
+from s3_client.s3_client import S3Location
+
+
+class NoSuchKey(Exception):
+    pass
+
+
+class _LocalPaginator:
+
+    def __init__(self, method):
+        self.method = method
+
+    def paginate(self, **kwargs):
+        response = self.method(**kwargs)
+        yield response
+        while response.get('IsTruncated'):
+            response = self.method(ContinuationToken=response['NextContinuationToken'], **kwargs)
+            yield response
+
+
+class LocalS3:
+    """
+    The subset of the boto3 s3 client used by the ingest, S3Client and S3StreamWriter, backed by a dict.
+    Calls are counted per operation in `requests`
+    """
+
+    class exceptions:
+        NoSuchKey = NoSuchKey
+
+    def __init__(self):
+        self.objects = dict()
+        self.requests = dict()
+        self._uploads = dict()
+        self._lock = threading.Lock()
+
+    def _count(self, operation):
+        with self._lock:
+            self.requests[operation] = self.requests.get(operation, 0) + 1
+
+    def put(self, bucket, key, body):
+        self.objects[(bucket, key)] = (body, datetime.now(timezone.utc), hashlib.md5(body).hexdigest())
+
+    def list_objects_v2(self, Bucket, Prefix="", Delimiter=None, ContinuationToken=None, StartAfter=None,
+                        MaxKeys=1000, **kwargs):
+        self._count('list')
+        keys = sorted(k for (b, k) in list(self.objects) if b == Bucket and k.startswith(Prefix))
+        if StartAfter:
+            keys = [k for k in keys if k > StartAfter]
+        folders = []
+        if Delimiter:
+            folders = sorted({Prefix + k[len(Prefix):].split(Delimiter)[0] + Delimiter
+                              for k in keys if Delimiter in k[len(Prefix):]})
+            keys = [k for k in keys if Delimiter not in k[len(Prefix):]]
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + MaxKeys]
+        response = {'IsTruncated': start + MaxKeys < len(keys), 'KeyCount': len(page)}
+        if page:
+            response['Contents'] = [{'Key': k, 'Size': len(self.objects[(Bucket, k)][0]),
+                                     'LastModified': self.objects[(Bucket, k)][1],
+                                     'ETag': '"{}"'.format(self.objects[(Bucket, k)][2])} for k in page]
+        if folders:
+            response['CommonPrefixes'] = [{'Prefix': f} for f in folders]
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(start + MaxKeys)
+        return response
+
+    def get_paginator(self, operation):
+        return _LocalPaginator(getattr(self, operation))
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._count('get')
+        if (Bucket, Key) not in self.objects:
+            raise NoSuchKey(Key)
+        body = self.objects[(Bucket, Key)][0]
+        return {'Body': io.BytesIO(body), 'ContentLength': len(body)}
+
+    def download_fileobj(self, Bucket, Key, Fileobj, **kwargs):
+        self._count('get')
+        Fileobj.write(self.objects[(Bucket, Key)][0])
+
+    def download_file(self, Bucket, Key, Filename, **kwargs):
+        with open(Filename, 'wb') as f:
+            self.download_fileobj(Bucket, Key, f)
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._count('put')
+        self.put(Bucket, Key, Body if isinstance(Body, bytes) else Body.read())
+        return {}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, **kwargs):
+        self.put_object(Bucket, Key, Fileobj.read())
+
+    def upload_file(self, Filename, Bucket, Key, **kwargs):
+        with open(Filename, 'rb') as f:
+            self.put_object(Bucket, Key, f.read())
+
+    def copy_object(self, CopySource, Bucket, Key, **kwargs):
+        self._count('copy')
+        self.put(Bucket, Key, self.objects[(CopySource['Bucket'], CopySource['Key'])][0])
+
+    def delete_objects(self, Bucket, Delete):
+        self._count('delete')
+        for obj in Delete['Objects']:
+            self.objects.pop((Bucket, obj['Key']), None)
+        return {}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._count('put')
+        with self._lock:
+            upload_id = str(len(self._uploads) + 1)
+            self._uploads[upload_id] = dict()
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self._count('put')
+        self._uploads[UploadId][PartNumber] = Body
+        return {'ETag': '"{}"'.format(hashlib.md5(Body).hexdigest())}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self._count('put')
+        parts = self._uploads.pop(UploadId)
+        self.put(Bucket, Key, b''.join(parts[part['PartNumber']] for part in MultipartUpload['Parts']))
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self._uploads.pop(UploadId, None)
+        return {}
+
+    def total_bytes(self, bucket, prefix=""):
+        return sum(len(body) for (b, k), (body, _, _) in list(self.objects.items())
+                   if b == bucket and k.startswith(prefix))
+
+
+class LocalFileSystem:
+    """
+    Stand-in for newtools.DoggoFileSystem, copies between locations of a LocalS3
+    """
+
+    def __init__(self, s3):
+        self.s3 = s3
+
+    def cp(self, source, destination):
+        source, destination = S3Location(source), S3Location(destination)
+        self.s3.copy_object({'Bucket': source.bucket, 'Key': source.key}, destination.bucket, destination.key)
+
+
+class _LocalAsyncBody:
+
+    def __init__(self, body):
+        self._body = body
+
+    async def read(self):
+        return self._body
+
+    def close(self):
+        pass
+
+
+class LocalAsyncS3:
+    """
+    Stand-in for an aiobotocore s3 client over a LocalS3, each call waits `latency` seconds like a round trip
+    would and the most calls in flight at once is kept in `max_in_flight`
+    """
+
+    def __init__(self, s3, latency=0.0):
+        self.s3 = s3
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _call(self, method, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            return getattr(self.s3, method)(**kwargs)
+        finally:
+            self.in_flight -= 1
+
+    async def list_objects_v2(self, **kwargs):
+        return await self._call('list_objects_v2', **kwargs)
+
+    async def get_object(self, **kwargs):
+        response = await self._call('get_object', **kwargs)
+        return dict(response, Body=_LocalAsyncBody(response['Body'].read()))
+
+    async def put_object(self, **kwargs):
+        return await self._call('put_object', **kwargs)
+
+    async def copy_object(self, **kwargs):
+        return await self._call('copy_object', **kwargs)
+
+    async def delete_objects(self, **kwargs):
+        return await self._call('delete_objects', **kwargs)
+
+
+class LocalQuery:
+
+    def __init__(self, query_id, output_location):
+        self.id = query_id
+        self.arguments = {'output_location': output_location}
+
+
+class LocalAthena:
+    """
+    Stand-in for newtools.AthenaClient that records the queries instead of running them, and in `batches` the
+    queries submitted between each wait_for_completion. With a LocalS3, `SHOW PARTITIONS` writes the partitions
+    of the table in `partitions` to the output location, the way Athena does
+    """
+
+    def __init__(self, s3=None, partitions=None):
+        self.s3 = s3
+        self.partitions = partitions if partitions is not None else dict()
+        self.queries = []
+        self.batches = []
+        self._batch = []
+
+    def add_query(self, sql, name=None, output_location=None, **kwargs):
+        self.queries.append(sql)
+        self._batch.append(sql)
+        query = LocalQuery(str(len(self.queries)), output_location)
+        if sql.startswith('SHOW PARTITIONS') and self.s3 is not None:
+            result = S3Location(output_location).join(f'{query.id}.txt')
+            self.s3.put(result.bucket, result.key, '\n'.join(self.partitions.get(sql.split()[-1], [])).encode('utf-8'))
+        return query
+
+    def wait_for_completion(self):
+        if self._batch:
+            self.batches.append(self._batch)
+        self._batch = []
+
+
+def local_ingest(s3=None, **kwargs):
+    """
+    Returns an IngestClass wired to the local stand-ins, reading from s3://raw/ and writing to s3://out/
+    unless other locations are passed
+    """
+    from ingest import IngestClass
+
+    s3 = s3 if s3 is not None else LocalS3()
+    args = dict(region='us-east-1', tv_type='TCL', database='benchmark', source_bucket='s3://raw/',
+                destination_bucket='s3://out/', table='{tv_type}_data', boto3_client=s3,
+                athena_client=LocalAthena(s3), file_system=LocalFileSystem(s3), async_s3_client=LocalAsyncS3(s3))
+    args.update(kwargs)
+    return IngestClass(**args)
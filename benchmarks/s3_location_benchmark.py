@@ -0,0 +1,42 @@
+"""
+Micro-benchmark of S3Location construction and join, against the newtools S3Location that the
+s3_client one was copied from. Run from the repository root:
+
+    python -m benchmarks.s3_location_benchmark
+"""
+import itertools
+import json
+import timeit
+
+from newtools import S3Location as ReferenceLocation
+
+from s3_client.s3_client import S3Location
+
+NUMBER = 20000
+
+# every key is new in "parse" and "join", "parse repeated prefix" builds the same location over and over
+CASES = {
+    "parse": "cls('s3://tv-type-raw/20220512/TV_%d.csv' % next(counter))",
+    "parse repeated prefix": "cls('s3://tv-type-output/TCL-data')",
+    "join": "base.join('day=20220512', 'TV_%d.csv' % next(counter))",
+    "bucket and key": "(base.bucket, base.key)",
+}
+
+
+def run(number=NUMBER):
+    results = []
+    for name, statement in CASES.items():
+        timings = dict()
+        for label, cls in (("reference", ReferenceLocation), ("s3_client", S3Location)):
+            context = {"cls": cls, "counter": itertools.count(), "base": cls('s3://tv-type-output/TCL-data')}
+            timer = timeit.Timer(statement, globals=context)
+            timings[label] = min(timer.repeat(repeat=3, number=number)) / number * 1e6
+        results.append({"case": name,
+                        "reference_us": round(timings["reference"], 3),
+                        "s3_client_us": round(timings["s3_client"], 3),
+                        "speedup": round(timings["reference"] / timings["s3_client"], 1)})
+    return results
+
+
+if __name__ == '__main__':
+    print(json.dumps(run(), indent=2))
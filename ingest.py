@@ -1,27 +1,304 @@
 import os
-import boto3
+import io
+import re
+import sys
+import json
 import logging
-import pandas as pd
-from s3_client.s3_client import S3Client
-from newtools.aws import AthenaPartition
-from dativa.scrubber import PersistentFieldLogger, Scrubber
-from newtools import DoggoFileSystem, S3Location, AthenaClient, log_to_stdout, PandasDoggo
-from datetime import datetime, timedelta
+from functools import lru_cache, partial
+from s3_client.s3_client import S3Client, S3Location
+from s3_client.s3_writer import S3StreamWriter
+from s3_client.async_s3_client import AsyncS3Client, DEFAULT_MAX_POOL_CONNECTIONS
+from ingest_utils.manifest import ProcessedManifest
+from ingest_utils.date_window import DateWindow, list_window
+from ingest_utils.pipeline import BoundedPipeline, run_serial, DEFAULT_MAX_IN_FLIGHT_BYTES
+from ingest_utils.metrics import Metrics, CountingClient, peak_memory_mb
+from ingest_utils.ddl_cache import DDLCache
+from ingest_utils.shards import ShardRecords, select_shard, SHARD_STRATEGIES
+from ingest_utils.source_cache import SourceCache, CachedFile, DEFAULT_MAX_BYTES as DEFAULT_SOURCE_CACHE_BYTES
+from ingest_utils.output_format import FrameWriter, encode, file_name, OUTPUT_FORMATS, PARQUET_COMPRESSIONS
+from ingest_utils.compression import SOURCE_SUFFIXES, CSV_COMPRESSIONS, is_source, sniff, sniff_stream, validate_level
+from ingest_utils.loader import LOADERS, brand_key
 
 from scrubber_config.scrubber_settings import scrubber_config
+from scrubber_config.table_schema import columns_ddl
+from scrubber_config.input_schema import validate as validate_input_schema
 
-logger = log_to_stdout("toms ingest", logging.DEBUG)
-stat_logger = PersistentFieldLogger(logger, {"message": ""})
+# pandas, numpy, newtools, dativa and aiobotocore take most of a second to import, they are imported where they
+# are first used so runs with nothing to ingest, and the cli, start quickly. benchmarks/import_benchmark.py
+# checks that importing this module does not import them
+
+
+def _log_to_stdout(logger_name, level):
+    """
+    The same as newtools.log_to_stdout, without importing newtools
+    """
+    logger = logging.getLogger(logger_name)
+    logger.setLevel(level)
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        logger.addHandler(handler)
+    return logger
+
+
+logger = _log_to_stdout("toms ingest", logging.DEBUG)
+
+
+@lru_cache(maxsize=None)
+def _stat_logger():
+    from newtools import PersistentFieldLogger
+    return PersistentFieldLogger(logger, {"message": ""})
+
+
+def parse_tv_types(tv_type):
+    """
+    Parses the tv types a run is for
+    :param tv_type: a tv type, a comma separated string or list of tv types, or 'all'
+    :return: list of tv types, or None for all of them
+    """
+    if isinstance(tv_type, str):
+        if tv_type.strip().lower() == 'all':
+            return None
+        tv_type = tv_type.split(',')
+    return [i.strip() for i in tv_type if i.strip()]
+
+
+def tv_type_name(tv_type):
+    """
+    The tv type as it is used in output prefixes and, lower cased, in table names
+    """
+    return re.sub('[^0-9A-Za-z_]', '_', tv_type)
+
+
+def _brand_frames(df, tv_types):
+    """
+    Splits a frame by tv type. Brands are matched on their brand_key, whatever their case and spacing, and named
+    as the tv types asked for, or by their brand_key when running for all of them
+    """
+    names = None if tv_types is None else {brand_key(tv_type): tv_type for tv_type in tv_types}
+    tv_type_of = dict()
+    for brand in df['Brand'].dropna().unique():
+        tv_type_of[brand] = brand_key(brand) if names is None else names.get(brand_key(brand))
+    brands = df['Brand'].map(tv_type_of)
+    if names is not None:
+        df, brands = df[brands.notna()], brands.dropna()
+    # observed, so a categorical Brand does not give a group for each brand that was filtered out
+    return df.groupby(brands, sort=False, observed=True)
+
+
+def _infer_numeric(df):
+    """
+    Converts the columns of a frame read as strings the way read_csv would have inferred them
+    """
+    import pandas as pd
+
+    df = df.copy()
+    for column in df.columns:
+        try:
+            df[column] = pd.to_numeric(df[column])
+        except (ValueError, TypeError):
+            pass
+    return df
+
+
+SCRUBBER_ENGINES = ('dativa', 'vectorized')
+
+
+@lru_cache(maxsize=None)
+def _vector_scrubber():
+    """
+    The scrubber config compiled once per process
+    """
+    from ingest_utils.vector_scrubber import VectorScrubber
+    return VectorScrubber(scrubber_config)
+
+
+def _run_scrubber(df, engine='dativa'):
+    if engine == 'vectorized':
+        return _vector_scrubber().run(df)
+    from dativa.scrubber import Scrubber
+    return Scrubber().run(df, config=scrubber_config)
+
+
+def _scrub(df, stats, reports, engine='dativa'):
+    """
+    Updates the stats and the scrubber reports with the records of a single tv type. Report entries for the
+    same field, rule and outcome are merged, so a delivery cleaned in chunks reports like a whole one
+    :return: the report entries of the scrubber, with the invalid records they describe
+    """
+    import pandas as pd
+
+    df = df.assign(date=pd.to_datetime(df.date, format='%Y%m%d'))
+    stats.update(df)
+    entries = _run_scrubber(df, engine)
+    for entry in entries:
+        report_key = (entry.field, entry.rule, entry.category, entry.description)
+        if report_key in reports:
+            reports[report_key]['number_records'] += entry.number_records
+        else:
+            reports[report_key] = entry.get_log_dict()
+    return entries
+
+
+def _defaulted(*reports):
+    """
+    Returns the number of values each rule replaced with its default
+    """
+    defaulted = dict()
+    for entry in (entry for brand_reports in reports for entry in brand_reports.values()):
+        if entry['category'] == 'replaced':
+            rule = "{0}({1})".format(entry['field'], entry['rule'])
+            defaulted[rule] = defaulted.get(rule, 0) + entry['number_records']
+    return defaulted
+
+
+def _format_reports(reports):
+    return ["{0}, Field {1}({2}): #{3} {4}/|{5}".format(entry['date'], entry['field'], entry['rule'],
+                                                        entry['number_records'], entry['category'],
+                                                        entry['description'])
+            for entry in reports.values()]
+
+
+def _read_csv(body, **kwargs):
+    """
+    Parses a delivery held in memory, or a cached one straight from the memory mapped file. Gzip and zstd
+    deliveries are found from their first bytes and decompressed as they are parsed
+    """
+    import pandas as pd
+
+    if isinstance(body, CachedFile):
+        codec = _codec(body)
+        if codec is not None:
+            return pd.read_csv(body.path, compression=codec, **kwargs)
+        return pd.read_csv(body.path, memory_map=True, **kwargs)
+    return pd.read_csv(io.BytesIO(body), compression=sniff(body[:4]), **kwargs)
+
+
+def _codec(body):
+    if isinstance(body, CachedFile):
+        with open(body.path, 'rb') as f:
+            return sniff(f.read(4))
+    return sniff(body[:4])
+
+
+def _load(body, loader='infer', tv_types=None):
+    """
+    Parses a whole delivery, with the schema loader only the records of the tv types are converted to a frame
+    :return: the frame and the number of records in the delivery
+    """
+    if loader == 'infer':
+        df = _read_csv(body)
+        return df, len(df)
+    from ingest_utils.loader import read_schema
+    return read_schema(body.path if isinstance(body, CachedFile) else body, _codec(body), tv_types)
+
+
+def _frame_bytes(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+def _check_source(key):
+    if not is_source(key):
+        logger.error("File should be in valid {} format".format(", ".join(SOURCE_SUFFIXES)))
+
+
+def clean_delivery(body, tv_types, output_format='csv', compression=None, scrubber_engine='dativa', metrics=None,
+                   dedup_rows=False, quarantine=False, compression_level=None, loader='infer'):
+    """
+    Parses a delivery once, splits it by brand and runs the scrubber over the records of each tv type.
+    Runs in the worker processes in pipelined mode, so it only takes and returns plain data
+    :param body: the raw csv bytes of the delivery, gzip or zstd compressed or not, or the CachedFile of it in the
+        source cache
+    :param tv_types: list of the brands to keep, None keeps every brand
+    :param output_format: 'csv' or 'parquet'
+    :param compression: parquet codec, or csv codec
+    :param compression_level: level of the codec
+    :param scrubber_engine: 'dativa' or 'vectorized'
+    :param metrics: Metrics the parse, filter, encode and scrub times, the row counts and the memory of the
+        parsed frame are added to
+    :param dedup_rows: return the records and their row hashes instead of the output, so rows already
+        written for the day can be dropped before the output is encoded
+    :param quarantine: also return the records the scrubber rules rejected, see quarantine.rejected_rows
+    :param loader: 'infer' parses every column and infers its type, 'schema' parses the columns of
+        scrubber_config.input_schema as the types it declares, and only converts the records of the tv types
+    :return: None if there are no records for the tv types, otherwise a dict of tv type to a dict with
+        the output, the stats, the RunningStats they came from, the scrubber reports and the rejected records
+    """
+    from ingest_utils.dedup import row_hashes
+    from ingest_utils.quarantine import rejected_rows
+    from ingest_utils.stats import RunningStats
+
+    metrics = metrics if metrics is not None else Metrics()
+    with metrics.timer('parse'):
+        df, rows = _load(body, loader, tv_types)
+    with metrics.timer('filter'):
+        brand_frames = list(_brand_frames(df, tv_types))
+    metrics.add({'rows_in': rows, 'frame_bytes': _frame_bytes(df)})
+    results = dict()
+    for tv_type, brand_df in brand_frames:
+        stats, reports = RunningStats(), dict()
+        if dedup_rows:
+            with metrics.timer('dedup'):
+                output = {'frame': brand_df, 'row_hashes': row_hashes(brand_df)}
+        else:
+            with metrics.timer('encode'):
+                output = {'output': encode(brand_df, output_format, compression, compression_level)}
+        with metrics.timer('scrub'):
+            # the schema loader parses the checked columns as strings, they are converted like read_csv would have
+            scrubbed = _infer_numeric(brand_df) if loader == 'schema' else brand_df
+            entries = _scrub(scrubbed, stats, reports, scrubber_engine)
+        if quarantine:
+            with metrics.timer('quarantine'):
+                output['quarantine'] = rejected_rows(brand_df, entries)
+            metrics.count('rows_quarantined', len(output['quarantine']) if output['quarantine'] is not None else 0)
+        metrics.add({'rows_kept': len(brand_df), 'defaulted': _defaulted(reports)})
+        results[tv_type] = dict(output, stats=stats.as_dict(), running_stats=stats, reports=_format_reports(reports))
+    return results or None
+
+
+def _clean_and_measure(body, **kwargs):
+    """
+    Runs clean_delivery and returns its result with its metrics, as plain data so it can run in a worker process
+    """
+    metrics = Metrics()
+    return clean_delivery(body, metrics=metrics, **kwargs), metrics.as_dict()
 
 
 class IngestClass:
     """
 
-    This class will Ingest match data for a given sports tv type
+    This class will Ingest match data for a given sports tv type, a list of tv types or all of them,
+    reading each delivery once for all tv types
     It will then clean the data according to the scrubber configurations
     Output the data in a S3 location of your choice
     Dynamically create DB, and tv type specific table
     Automatically add missing partitions
+    Only processes deliveries that are new or changed since the last run, unless full_refresh is set
+    The boto3 s3 client, Athena client and file system can be passed in, eg. the local stand-ins in
+    benchmarks/local_aws.py
+    With dedup_deliveries, deliveries with the same content as one already ingested are skipped, with dedup_rows,
+    rows already written to the day= partition by another delivery are dropped
+    Each run collects the time spent in each stage, the bytes and rows in and out and the S3 requests, per
+    delivery and in total, the totals are logged as JSON and, like the metrics of each delivery, passed to the
+    metrics_sink if there is one
+    DDL is only sent to Athena when its rendered SQL or location differs from what the DDL cache recorded as
+    run, set refresh_ddl to send it anyway. Independent statements are submitted together, athena_max_queries
+    of them run at a time
+    A backfill can be split into shard_count shards run as separate processes, each given its shard_index. Whole
+    days go to one shard, so each day= partition has a single writer. Shards record the days they wrote instead
+    of adding partitions, coordinate() then adds them all at once
+    With async_io the deliveries are read and the outputs written by coroutines over one aiobotocore client,
+    whose connection pool of max_pool_connections connections also caps the deliveries in flight
+    With a source_cache_dir, the deliveries read are kept on local disk by ETag, up to source_cache_max_bytes,
+    so runs on the same machine read them from there instead of S3
+    Deliveries may be gzip or zstd compressed, .csv.gz or .csv.zst or found from their first bytes, and are
+    decompressed as they are parsed. The csv output can be compressed too, with compression and compression_level
+    With quarantine, the records the scrubber rules default, remove or let through invalid are copied, as they were
+    delivered and tagged with their delivery, rule and original value, to the day= partitions of the
+    quarantine_table under quarantine_location, buffered per day so each day gets a few large objects
+    With the schema loader, deliveries are parsed by the pyarrow csv reader, only the columns of
+    scrubber_config.input_schema and as the types it declares, and only the records of the tv types are converted
+    to a frame. The run summary reports the memory of the parsed frames and the peak memory of the run
 
     """
 
@@ -31,110 +308,903 @@ class IngestClass:
                  database,
                  source_bucket,
                  destination_bucket,
-                 table):
+                 table,
+                 manifest_location=None,
+                 full_refresh=False,
+                 start_date=None,
+                 end_date=None,
+                 list_workers=8,
+                 pipelined=False,
+                 io_workers=8,
+                 cpu_workers=None,
+                 max_in_flight_bytes=DEFAULT_MAX_IN_FLIGHT_BYTES,
+                 chunk_size=None,
+                 stage_intermediary=False,
+                 output_format='csv',
+                 compression=None,
+                 compression_level=None,
+                 scrubber_engine='dativa',
+                 reconcile_partitions=False,
+                 boto3_client=None,
+                 athena_client=None,
+                 file_system=None,
+                 metrics_sink=None,
+                 dedup_deliveries=False,
+                 dedup_rows=False,
+                 dedup_location=None,
+                 ddl_cache_location=None,
+                 refresh_ddl=False,
+                 athena_max_queries=3,
+                 shard_index=None,
+                 shard_count=1,
+                 shard_strategy='day',
+                 shard_location=None,
+                 async_io=False,
+                 max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS,
+                 async_s3_client=None,
+                 source_cache_dir=None,
+                 source_cache_max_bytes=DEFAULT_SOURCE_CACHE_BYTES,
+                 quarantine=False,
+                 quarantine_location=None,
+                 quarantine_table='quarantine',
+                 quarantine_max_rows=None,
+                 loader='infer'):
         self.region = region
         self.tv_type = tv_type
+        self.tv_types = parse_tv_types(tv_type)
         self.database = database
-        self.ac = AthenaClient(self.region, db=self.database)
+        # the clients are created when they are first used
+        self._ac = athena_client
+        self.athena_max_queries = athena_max_queries
         self.source_bucket = S3Location(source_bucket)
         self.int_bucket = S3Location('s3://tv-type-intermediary')
-        self.output_location = S3Location(destination_bucket).join(
-            f'{self.tv_type}-data')
+        self.destination_bucket = S3Location(destination_bucket)
+        # with more than one tv type each one has its own output location, see output_location_for
+        self.output_location = self.output_location_for(self.tv_types[0]) if self.single_tv_type else None
         self.athena_temp = S3Location('s3://temp-output-query').join('temp')
-        self.s3c = S3Client()
-        self.boto_client = boto3.client('s3')
+        self.metrics = Metrics()
+        self.metrics_sink = metrics_sink
+        self.metrics_summary = None
+        self.boto_client = CountingClient(boto3_client, self.metrics)
+        self.s3c = S3Client(self.boto_client)
         self.table = table
-        self.dfs = DoggoFileSystem()
+        self._dfs = file_system
         self.key_map_list = ["day","file"]
         self.sql_path = os.path.join(os.path.dirname(__file__), "sql")
+        self.full_refresh = full_refresh
+        self.window = DateWindow(start=start_date, end=end_date)
+        self.list_workers = list_workers
+        self.pipelined = pipelined
+        self.pipeline = BoundedPipeline(io_workers=io_workers,
+                                        cpu_workers=cpu_workers,
+                                        max_in_flight_bytes=max_in_flight_bytes)
+        self.chunk_size = chunk_size
+        if async_io and chunk_size:
+            raise ValueError("async_io reads whole deliveries, it can't be combined with chunk_size")
+        self.async_io = async_io
+        self.source_cache = SourceCache(source_cache_dir, source_cache_max_bytes) if source_cache_dir else None
+        # the pins of the cached deliveries read and not cleaned yet, by key
+        self._pinned = dict()
+        self.async_s3, self.async_pipeline = None, None
+        if async_io:
+            from ingest_utils.async_pipeline import AsyncPipeline
+            self.async_s3 = AsyncS3Client(async_s3_client, max_pool_connections=max_pool_connections,
+                                          metrics=self.metrics)
+            self.async_pipeline = AsyncPipeline(max_in_flight=max_pool_connections,
+                                                cpu_workers=cpu_workers,
+                                                max_in_flight_bytes=max_in_flight_bytes)
+        self.stage_intermediary = stage_intermediary
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}")
+        if output_format == 'parquet' and compression not in (None,) + PARQUET_COMPRESSIONS:
+            raise ValueError(f"parquet compression must be one of {PARQUET_COMPRESSIONS}")
+        if output_format == 'csv' and compression not in (None,) + CSV_COMPRESSIONS:
+            raise ValueError(f"csv compression must be one of {CSV_COMPRESSIONS}")
+        validate_level(compression or ('snappy' if output_format == 'parquet' else None), compression_level)
+        self.output_format = output_format
+        self.compression = compression
+        self.compression_level = compression_level
+        if scrubber_engine not in SCRUBBER_ENGINES:
+            raise ValueError(f"scrubber_engine must be one of {SCRUBBER_ENGINES}")
+        if scrubber_engine == 'vectorized':
+            # compile now so a config the vectorized engine can't run fails before anything is read
+            _vector_scrubber()
+        self.scrubber_engine = scrubber_engine
+        if loader not in LOADERS:
+            raise ValueError(f"loader must be one of {LOADERS}")
+        if loader == 'schema':
+            validate_input_schema()
+        self.loader = loader
+        self.reconcile_partitions = reconcile_partitions
+        self.failures = dict()
+        self.run_stats = dict()
+        # the manifest, shard records, dedup index and DDL cache of each set of tv types are named after it
+        label = '_'.join(map(tv_type_name, self.tv_types)) if self.tv_types is not None else 'all'
+        if manifest_location is None:
+            manifest_location = self.destination_bucket.join('_manifests', f'{label}-data.json')
+        self.manifest_location = manifest_location
+        if shard_count < 1:
+            raise ValueError("shard_count must be at least 1")
+        if shard_index is not None and not 0 <= shard_index < shard_count:
+            raise ValueError(f"shard_index must be between 0 and {shard_count - 1}")
+        if shard_strategy not in SHARD_STRATEGIES:
+            raise ValueError(f"shard_strategy must be one of {SHARD_STRATEGIES}")
+        if shard_count > 1 and dedup_deliveries:
+            raise ValueError("dedup_deliveries can't be used with shards, they would overwrite each other's index")
+        self.shard_index = shard_index if shard_count > 1 else None
+        self.shard_count = shard_count
+        self.shard_strategy = shard_strategy
+        self.shard_records = None
+        if shard_count > 1:
+            if shard_location is None:
+                shard_location = self.destination_bucket.join('_shards', f'{label}-data')
+            self.shard_records = ShardRecords(shard_location, shard_count, s3_client=self.boto_client)
+        if self.shard_index is not None:
+            manifest_location = self.shard_records.manifest_location(self.shard_index)
+        self.manifest = ProcessedManifest(manifest_location,
+                                          source=self.source_bucket,
+                                          s3_client=self.boto_client)
+        if dedup_location is None:
+            dedup_location = self.destination_bucket.join('_dedup', f'{label}-data')
+        self.content_index, self.row_index = None, None
+        if dedup_deliveries or dedup_rows:
+            from ingest_utils.dedup import ContentIndex, RowIndex
+            self.content_index = ContentIndex(dedup_location, s3_client=self.boto_client) if dedup_deliveries else None
+            self.row_index = RowIndex(dedup_location, s3_client=self.boto_client) if dedup_rows else None
+        if ddl_cache_location is None:
+            ddl_cache_location = self.destination_bucket.join('_manifests', f'{label}-ddl.json')
+        self.ddl_cache = DDLCache(ddl_cache_location, s3_client=self.boto_client)
+        # every set of tv types shares the database, so it is recorded in a cache of its own that a teardown for
+        # any of them clears
+        self.database_ddl_cache = self.ddl_cache.sibling(f'{database}-database-ddl.json')
+        self.refresh_ddl = refresh_ddl
+        # the sink writes under the location without its trailing slash, so the partitions have to as well
+        quarantine_location = quarantine_location or self.destination_bucket.join('quarantine')
+        self.quarantine_location = S3Location(quarantine_location.rstrip('/'))
+        self.quarantine_table = quarantine_table
+        self.quarantine = None
+        if quarantine:
+            from ingest_utils.quarantine import QuarantineSink, DEFAULT_MAX_ROWS
+            self.quarantine = QuarantineSink(self.quarantine_location, s3_client=self.boto_client,
+                                             max_rows=quarantine_max_rows or DEFAULT_MAX_ROWS)
+
+    @property
+    def ac(self):
+        if self._ac is None:
+            from newtools import AthenaClient
+            self._ac = AthenaClient(self.region, db=self.database, max_queries=self.athena_max_queries)
+        return self._ac
+
+    @property
+    def dfs(self):
+        if self._dfs is None:
+            from newtools import DoggoFileSystem
+            self._dfs = DoggoFileSystem()
+        return self._dfs
+
+    @property
+    def single_tv_type(self):
+        return self.tv_types is not None and len(self.tv_types) == 1
+
+    def output_location_for(self, tv_type):
+        return self.destination_bucket.join(f'{tv_type_name(tv_type)}-data')
+
+    def table_for(self, tv_type):
+        """
+        Returns the table of a tv type. The table may contain a {tv_type} placeholder, otherwise runs for more
+        than one tv type suffix it with the tv type
+        """
+        name = tv_type_name(tv_type).lower()
+        if '{tv_type}' in self.table:
+            return self.table.format(tv_type=name)
+        if self.single_tv_type:
+            return self.table
+        return f'{self.table}_{name}'
+
+    def _key_map(self, key):
+        key_map = list(zip(self.key_map_list, key.split('/')))
+        return {i[0]: i[1] for i in key_map}
+
+    def _locations(self, key, tv_type):
+        key_map = self._key_map(key)
+        output_file = file_name(key_map['file'], self.output_format, self.compression)
+        file_path = f"day={key_map['day']}/{output_file}"
+        return (self.int_bucket.join(f"{tv_type_name(tv_type)}-data/{key_map['day']}/{output_file}"),
+                self.output_location_for(tv_type).join(file_path))
+
+    def _caches(self, obj):
+        return (self.source_cache is not None and bool(obj.get('etag'))
+                and (obj.get('size') or 0) <= self.source_cache.max_bytes)
+
+    def _cache_hit(self, obj, source):
+        """
+        :return: the CachedFile of a delivery, None if it is not cached
+        """
+        cached = self.source_cache.get(source.bucket, source.key, obj['etag'])
+        if cached is not None:
+            self.metrics.add({'source_cache': {'hits': 1, 'bytes_saved': cached.size}, 'bytes_in': cached.size},
+                             obj['key'])
+        return cached
+
+    def _cache_fill(self, obj, source, write):
+        cached = self.source_cache.fill(source.bucket, source.key, obj['etag'], write)
+        self.metrics.add({'source_cache': {'misses': 1}, 'bytes_in': cached.size}, obj['key'])
+        return cached
+
+    def _pin(self, obj, cached):
+        """
+        Pins a cached delivery until it has been cleaned, so another worker evicting it from the cache doesn't
+        delete it before the transform opens it
+        :return: the CachedFile of the pin, None if the delivery was evicted before it could be pinned, it is then
+            downloaded again
+        """
+        pinned = self.source_cache.pin(cached)
+        if pinned is not None:
+            self._pinned[obj['key']] = pinned
+        return pinned
+
+    def _unpin(self, key):
+        pinned = self._pinned.pop(key, None)
+        if pinned is not None:
+            self.source_cache.unpin(pinned)
+
+    def _read(self, obj):
+        _check_source(obj['key'])
+        source = self.source_bucket.join(obj['key'])
+        if self._caches(obj):
+            cached = self._cache_hit(obj, source)
+            if cached is None:
+                with self.metrics.timer('download', obj['key']):
+                    cached = self._cache_fill(obj, source, lambda f: self.boto_client.download_fileobj(
+                        Bucket=source.bucket, Key=source.key, Fileobj=f))
+            pinned = self._pin(obj, cached)
+            if pinned is not None:
+                return pinned
+        body = io.BytesIO()
+        with self.metrics.timer('download', obj['key']):
+            self.boto_client.download_fileobj(Bucket=source.bucket, Key=source.key, Fileobj=body)
+        self.metrics.count('bytes_in', body.tell(), obj['key'])
+        return body.getvalue()
+
+    async def _read_async(self, obj):
+        import asyncio
+
+        _check_source(obj['key'])
+        source = self.source_bucket.join(obj['key'])
+        # the cache is on local disk, it is read and filled on the loop's thread pool so the other deliveries in
+        # flight are not held up by it
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(None, self._cache_hit, obj, source) if self._caches(obj) else None
+        if cached is not None:
+            pinned = await loop.run_in_executor(None, self._pin, obj, cached)
+            if pinned is not None:
+                return pinned
+        with self.metrics.timer('download', obj['key']):
+            body = await self.async_s3.get(source)
+        if self._caches(obj):
+            cached = await loop.run_in_executor(None, self._cache_fill, obj, source, lambda f: f.write(body))
+            pinned = await loop.run_in_executor(None, self._pin, obj, cached)
+            if pinned is not None:
+                return pinned
+        else:
+            self.metrics.count('bytes_in', len(body), obj['key'])
+        return body
+
+    def _write_location(self, key, tv_type):
+        """
+        Returns where the cleaned output is written, the day= partition itself unless staging in the
+        intermediary bucket was asked for
+        """
+        intermediary, output = self._locations(key, tv_type)
+        return intermediary if self.stage_intermediary else output
+
+    def _write(self, obj, cleaned):
+        """
+        Writes the cleaned output of a delivery. S3 only makes an object visible once its PUT, or the
+        completion of its multipart upload, has succeeded, so readers never see a partial file. The delivery
+        is only recorded in the manifest once every output has been written.
+        :param cleaned: the result of cleaning the delivery and its metrics
+        """
+        result, _ = cleaned
+        day = self._key_map(obj['key'])['day']
+        try:
+            for tv_type, body in self._outputs(obj['key'], day, result):
+                self._write_output(obj['key'], tv_type, body)
+        except Exception:
+            if self.row_index is not None:
+                self.row_index.discard(day, obj['key'])
+            raise
+
+    async def _write_async(self, obj, cleaned):
+        """
+        Writes the cleaned outputs of a delivery like _write, all the tv types at once
+        """
+        import asyncio
+
+        result, _ = cleaned
+        day = self._key_map(obj['key'])['day']
+        try:
+            # with dedup_rows the outputs are encoded here, on the loop's thread pool as it is cpu work
+            outputs = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: list(self._outputs(obj['key'], day, result)))
+            await asyncio.gather(*(self._write_output_async(obj['key'], tv_type, body) for tv_type, body in outputs))
+        except Exception:
+            if self.row_index is not None:
+                self.row_index.discard(day, obj['key'])
+            raise
+
+    def _outputs(self, key, day, result):
+        """
+        Yields the tv type and the body of each output of a delivery, without the rows already written with
+        dedup_rows
+        """
+        for tv_type, brand_result in (result or dict()).items():
+            body = brand_result.get('output')
+            if 'frame' in brand_result:
+                body = self._drop_written_rows(key, day, brand_result)
+                if body is None:
+                    continue
+            yield tv_type, body
+
+    def _drop_written_rows(self, key, day, brand_result):
+        """
+        Drops the rows already written to the day= partition by other deliveries and encodes the rest, None if
+        there is nothing left
+        """
+        with self.metrics.timer('dedup', key):
+            keep = self.row_index.keep(day, key, brand_result['row_hashes'])
+        self.metrics.count('rows_duplicate', int(len(keep) - keep.sum()), key)
+        if not keep.any():
+            logger.info(f"Every record of {key} has already been written to day={day}")
+            return None
+        with self.metrics.timer('encode', key):
+            return encode(brand_result['frame'][keep], self.output_format, self.compression, self.compression_level)
+
+    def _write_output(self, key, tv_type, body):
+        intermediary, output = self._locations(key, tv_type)
+        location = self._write_location(key, tv_type)
+        # streamed deliveries have already been written
+        if body is not None:
+            # upload_fileobj switches to a multipart upload for large outputs
+            with self.metrics.timer('upload', key):
+                self.boto_client.upload_fileobj(io.BytesIO(body), Bucket=location.bucket, Key=location.key)
+            self.metrics.count('bytes_out', len(body), key)
+        if self.stage_intermediary:
+            with self.metrics.timer('copy', key):
+                self.dfs.cp(source=intermediary, destination=output)
+            self.metrics.add({'requests': {'copy_object': 1}})
+
+    async def _write_output_async(self, key, tv_type, body):
+        intermediary, output = self._locations(key, tv_type)
+        with self.metrics.timer('upload', key):
+            await self.async_s3.put(self._write_location(key, tv_type), body)
+        self.metrics.count('bytes_out', len(body), key)
+        if self.stage_intermediary:
+            with self.metrics.timer('copy', key):
+                await self.async_s3.copy(intermediary, output)
+
+    def _stream(self, obj):
+        """
+        Cleans a delivery chunk_size rows at a time, writing each chunk to the output as it goes, so
+        memory is bounded by the chunk size rather than the size of the delivery. Records are written as they
+        were delivered, so they are formatted the same whichever chunk they are in
+        :return: the same as clean_delivery, without the csv output, and empty metrics as they are added to
+            self.metrics as the delivery is read
+        """
+        _check_source(obj['key'])
+        import pandas as pd
+        from ingest_utils.dedup import row_hashes
+        from ingest_utils.quarantine import rejected_rows
+        from ingest_utils.stats import RunningStats
+
+        key, metrics = obj['key'], self.metrics
+        day = self._key_map(key)['day']
+        source = self.source_bucket.join(key)
+        body = None
+        if self._caches(obj):
+            # a delivery that is not cached yet is downloaded to the cache first, and parsed from there
+            cached = self._cache_hit(obj, source)
+            if cached is None:
+                with metrics.timer('download', key):
+                    cached = self._cache_fill(obj, source, lambda f: self.boto_client.download_fileobj(
+                        Bucket=source.bucket, Key=source.key, Fileobj=f))
+            body = self._pin(obj, cached)
+        if body is None:
+            with metrics.timer('download', key):
+                response = self.boto_client.get_object(Bucket=source.bucket, Key=source.key)
+            metrics.count('bytes_in', response.get('ContentLength', obj.get('size', 0)), key)
+            body = response['Body']
+        writers, sinks, stats, reports, rejected = dict(), dict(), dict(), dict(), dict()
+        if self.loader == 'schema':
+            from ingest_utils.loader import read_csv_options
+            options = read_csv_options()
+        else:
+            options = {'dtype': str}
+        try:
+            # the parse time includes reading the body as each chunk is parsed
+            if isinstance(body, CachedFile):
+                chunks = iter(_read_csv(body, chunksize=self.chunk_size, **options))
+            else:
+                codec, body = sniff_stream(key, body)
+                chunks = iter(pd.read_csv(body, chunksize=self.chunk_size, compression=codec, **options))
+            while True:
+                with metrics.timer('parse', key):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                metrics.add({'rows_in': len(chunk), 'frame_bytes': _frame_bytes(chunk)}, key)
+                with metrics.timer('filter', key):
+                    brand_frames = list(_brand_frames(chunk, self.tv_types))
+                for tv_type, brand_df in brand_frames:
+                    if tv_type not in stats:
+                        stats[tv_type], reports[tv_type] = RunningStats(), dict()
+                    rows = brand_df
+                    if self.row_index is not None:
+                        with metrics.timer('dedup', key):
+                            keep = self.row_index.keep(day, key, row_hashes(brand_df))
+                        metrics.count('rows_duplicate', int(len(keep) - keep.sum()), key)
+                        rows = brand_df[keep]
+                    if len(rows):
+                        if tv_type not in writers:
+                            sinks[tv_type] = S3StreamWriter(self.boto_client, self._write_location(key, tv_type))
+                            writers[tv_type] = FrameWriter(sinks[tv_type], self.output_format, self.compression,
+                                                           self.compression_level)
+                        with metrics.timer('upload', key):
+                            writers[tv_type].write(rows)
+                    with metrics.timer('scrub', key):
+                        entries = _scrub(_infer_numeric(brand_df), stats[tv_type], reports[tv_type],
+                                         self.scrubber_engine)
+                    if self.quarantine is not None:
+                        with metrics.timer('quarantine', key):
+                            rows = rejected_rows(brand_df, entries)
+                        if rows is not None:
+                            rejected.setdefault(tv_type, []).append(rows)
+                            metrics.count('rows_quarantined', len(rows), key)
+                    metrics.count('rows_kept', len(brand_df), key)
+            with metrics.timer('upload', key):
+                for writer in writers.values():
+                    writer.close()
+        except Exception:
+            for writer in writers.values():
+                writer.abort()
+            if self.row_index is not None:
+                self.row_index.discard(day, key)
+            raise
+        metrics.add({'bytes_out': sum(sink.bytes_written for sink in sinks.values()),
+                     'defaulted': _defaulted(*reports.values())}, key)
+        quarantined = {tv_type: pd.concat(rows, ignore_index=True) for tv_type, rows in rejected.items()}
+        return {tv_type: {'stats': stats[tv_type].as_dict(), 'running_stats': stats[tv_type],
+                          'reports': _format_reports(reports[tv_type]),
+                          'quarantine': quarantined.get(tv_type)}
+                for tv_type in writers} or None, dict()
+
+    @staticmethod
+    def _log_stats(message, tv_type, stats, **fields):
+        stats_dict = stats.as_dict()
+        _stat_logger().info(message=message,
+                            tv_type=tv_type,
+                            max_date=str(stats_dict['Maximum']),
+                            min_date=str(stats_dict['Minimum']),
+                            total_count=str(stats_dict['Records']),
+                            total_unique_count=str(stats_dict['Unique Record']),
+                            unique_count_exact=str(stats_dict['Unique Exact']),
+                            **fields)
+
+    @staticmethod
+    def _log_clean(key, result):
+        if result is None:
+            logger.info(f"No records to ingest in {key}")
+            return
+        for tv_type, brand_result in result.items():
+            stats_dict = brand_result['stats']
+            _stat_logger().info(message="Ingest clean",
+                                key=key,
+                                tv_type=tv_type,
+                                max_date=str(stats_dict['Maximum']),
+                                min_date=str(stats_dict['Minimum']),
+                                total_unique_count=str(stats_dict['Unique Record']))
+            for entry in brand_result['reports']:
+                _stat_logger().info(message="Ingest Scrubber clean:" + entry)
+
+    def _stages(self):
+        """
+        Returns the read and transform stages and the in-flight size of a delivery
+        """
+        if self.chunk_size:
+            # streamed deliveries are cleaned as they are read, only chunk_size rows of each are held in memory
+            return self._stream, None, lambda obj: 0
+        transform = partial(_clean_and_measure, tv_types=self.tv_types, output_format=self.output_format,
+                            compression=self.compression, compression_level=self.compression_level,
+                            scrubber_engine=self.scrubber_engine,
+                            dedup_rows=self.row_index is not None, quarantine=self.quarantine is not None,
+                            loader=self.loader)
+        return self._read, transform, lambda obj: obj['size']
 
     def clean(self, key):
+        """
+        Cleans a single delivery and writes it to its day= partition
+        :param key: the delivery key in the source bucket
+        :return: True if records were written, False if the delivery had nothing for the tv types
+        """
+        read, transform, _ = self._stages()
+        for obj, cleaned, error in run_serial([{'key': key}], read=read, transform=transform, write=self._write):
+            self._unpin(key)
+            if error is not None:
+                raise error
+            result, metrics = cleaned
+            self.metrics.add(metrics, key)
+            self._log_clean(key, result)
+            if self.quarantine is not None:
+                self._quarantine_rows(key, result)
+                self._flush_quarantine()
+            return result is not None
+
+    def _quarantine_rows(self, key, result):
+        """
+        Buffers the records of a delivery the scrubber rejected, the rows of a day are written once they are
+        over quarantine_max_rows or the day is flushed
+        """
+        day = self._key_map(key)['day']
+        for brand_result in (result or dict()).values():
+            with self.metrics.timer('quarantine', key):
+                written = self.quarantine.add(day, key, brand_result.get('quarantine'))
+            self.metrics.count('bytes_quarantined', written, key)
+
+    def _flush_quarantine(self, day=None):
+        with self.metrics.timer('quarantine'):
+            self.metrics.count('bytes_quarantined', self.quarantine.flush(day))
+        self.manifest.add_pending_partitions(quarantined=self.quarantine.days)
+
+    def _process(self, objects):
+        """
+        Cleans and writes the deliveries, one at a time or pipelined, and records them in the manifest.
+        Failures are collected per key in self.failures instead of stopping the run
+        :return: dict of tv type to the set of days written for it
+        """
+        from ingest_utils.stats import RunningStats
+
+        read, transform, size = self._stages()
+        if self.async_io:
+            outcomes = self.async_pipeline.run(objects, read=self._read_async, transform=transform,
+                                               write=self._write_async, size=size, context=self.async_s3)
+        elif self.pipelined:
+            outcomes = self.pipeline.run(objects, read=read, transform=transform, write=self._write, size=size)
+        else:
+            outcomes = run_serial(objects, read=read, transform=transform, write=self._write)
+
+        self.failures = dict()
+        written = dict()
+        # stats are merged per day= partition, and logged once every delivery of the day is done so only the
+        # days in flight are held, then merged into the totals of the run
+        remaining = dict()
+        for obj in objects:
+            day = self._key_map(obj['key'])['day']
+            remaining[day] = remaining.get(day, 0) + 1
+        day_stats, run_stats = dict(), dict()
         try:
-            if not key.endswith(".csv"):
-                logger.error("File should be in valid .csv format")
-            pdg = PandasDoggo()
-            df = pdg.load(self.source_bucket.join(key).s3_url)
-            df = df[df['Brand'] == self.tv_type]
-            dates = df['date'].unique()
-            for date in dates:
-                pdg.save_csv(df,
-                             path=self.int_bucket.join(f'{self.tv_type}-data/{date}/{self.tv_type}.csv'),
-                             index=False)
-                df['date'] = pd.to_datetime(df.date, format='%Y%m%d')
-                stats_dict = dict()
-                stats_dict['Maximum'] = max(df['date']).strftime('%Y-%m-%d')
-                stats_dict['Minimum'] = min(df['date']).strftime('%Y-%m-%d')
-                stats_dict['Unique Record'] = len(df.drop_duplicates())
-                stat_logger.info(message="Ingest clean",
-                                 max_date=str(stats_dict['Maximum']),
-                                 min_date=str(stats_dict['Minimum']),
-                                 total_unique_count=str(stats_dict['Unique Record']))
-                sc = Scrubber()
-                reports = sc.run(df, config=scrubber_config)
-                for entry in reports:
-                    stat_logger.info(message="Ingest Scrubber clean:" + str(entry))
-                return True
-        except Exception as e:
-            logger.error(str(e))
+            for obj, cleaned, error in outcomes:
+                self._unpin(obj['key'])
+                day = self._key_map(obj['key'])['day']
+                if error is not None:
+                    self.failures[obj['key']] = error
+                    logger.error(f"Failed to ingest {obj['key']}: {error}")
+                    self.metrics.count('failed', 1, obj['key'])
+                else:
+                    result, metrics = cleaned
+                    self.metrics.add(metrics, obj['key'])
+                    self._log_clean(obj['key'], result)
+                    for tv_type, brand_result in (result or dict()).items():
+                        written.setdefault(tv_type, set()).add(day)
+                        day_stats.setdefault(day, dict()).setdefault(tv_type, RunningStats()).merge(
+                            brand_result['running_stats'])
+                    if self.quarantine is not None:
+                        self._quarantine_rows(obj['key'], result)
+                    # saved with the delivery, so its days are added even if this run does not get that far
+                    self.manifest.add_pending_partitions({tv_type: [day] for tv_type in result or dict()})
+                    self.manifest.mark_processed(obj)
+                    if self.content_index is not None:
+                        self.content_index.add(obj['content_hash'])
+                if self.metrics_sink is not None:
+                    self.metrics_sink.delivery(obj['key'], self.metrics.for_delivery(obj['key']))
+                remaining[day] -= 1
+                if not remaining[day]:
+                    for tv_type, stats in sorted(day_stats.pop(day, dict()).items()):
+                        self._log_stats("Ingest partition stats", tv_type, stats, day=day)
+                        run_stats.setdefault(tv_type, RunningStats()).merge(stats)
+                    if self.row_index is not None:
+                        self.row_index.release(day)
+                    if self.quarantine is not None:
+                        self._flush_quarantine(day)
+        finally:
+            for key in list(self._pinned):
+                self._unpin(key)
+            try:
+                # the days of a run that stopped before all of their deliveries were done
+                if self.quarantine is not None:
+                    self._flush_quarantine()
+            finally:
+                with self.metrics.timer('manifest'):
+                    self.manifest.save()
+                    if self.content_index is not None:
+                        self.content_index.save()
+                    if self.row_index is not None:
+                        self.row_index.release_all()
+
+        self.run_stats = run_stats
+        for tv_type, stats in sorted(run_stats.items()):
+            self._log_stats("Ingest run stats", tv_type, stats, partitions=str(len(written[tv_type])))
+
+        if self.failures:
+            logger.error(f"{len(self.failures)} of {len(objects)} deliveries failed: "
+                         + ", ".join(sorted(self.failures)))
+        return written
+
+    def _skip_duplicate_deliveries(self, objects):
+        """
+        Drops the deliveries with the same content as one already ingested, or as an earlier one of this run.
+        Copies of deliveries ingested by earlier runs are recorded as processed, copies of deliveries of this
+        run are not, so they are checked again if the delivery they copy fails
+        """
+        with self.metrics.timer('dedup'):
+            unique, seen, skipped = [], dict(), 0
+            for obj in objects:
+                obj['content_hash'] = self.content_index.content_hash(obj['etag'],
+                                                                      self.source_bucket.join(obj['key']))
+                if self.content_index.is_indexed(obj['content_hash']):
+                    logger.info(f"{obj['key']} has the same content as a delivery already ingested, skipping it")
+                    self.manifest.mark_processed(obj)
+                    skipped += 1
+                elif obj['content_hash'] in seen:
+                    logger.info(f"{obj['key']} has the same content as {seen[obj['content_hash']]}, skipping it")
+                    skipped += 1
+                else:
+                    seen[obj['content_hash']] = obj['key']
+                    unique.append(obj)
+        self.metrics.count('deliveries_duplicate', skipped)
+        if skipped:
+            logger.info(f"Skipped {skipped} of {len(objects)} deliveries with the same content as another one")
+            self.manifest.save()
+            self.content_index.save()
+        return unique
+
+    def add_partitions(self, written, reconcile=False, quarantined=()):
+        """
+        Adds the day= partitions written by a run, submitting the queries for all the tables as one batch.
+        Each table gets ALTER TABLE ... ADD IF NOT EXISTS statements for just those days, chunked to stay under
+        the Athena query size limit, so nothing is listed and the cost does not grow with the table history.
+        Tables of tv types that are discovered during the run are created first, the partition batches are only
+        submitted once the tables exist
+        :param written: dict of tv type to the days written for it
+        :param reconcile: also list the whole output prefix and add every partition Athena does not have yet,
+            to repair tables after failed or manual writes
+        :param quarantined: the days written to the quarantine table
+        """
+        with self.metrics.timer('athena'):
+            self._add_partitions(written, reconcile, quarantined)
+
+    def _add_partitions(self, written, reconcile, quarantined=()):
+        tv_types = sorted(set(written) | set(self.tv_types if reconcile and self.tv_types else []))
+        if not self.single_tv_type:
+            self._create_tables(tv_types)
+        elif self.quarantine is not None and quarantined:
+            # the table of a single tv type is created by setup(), the quarantine table is created on first use
+            self._create_tables([])
+        for tv_type in tv_types:
+            self._add_partition_queries(self.table_for(tv_type), self.output_location_for(tv_type),
+                                        written.get(tv_type, ()), reconcile)
+        if self.quarantine is not None and (quarantined or reconcile):
+            self._add_partition_queries(self.quarantine_table, self.quarantine_location, quarantined, reconcile)
+        self.ac.wait_for_completion()
+
+    def _add_partition_queries(self, table, location, days, reconcile):
+        from newtools.aws import AthenaPartition
+
+        ap = AthenaPartition(bucket=location.bucket, s3_client=self.boto_client)
+        if reconcile:
+            list_query = ap.get_sql(table=table,
+                                    s3_path=location.key,
+                                    athena_client=self.ac,
+                                    output_location=self.athena_temp,
+                                    athena_s3_client=self.boto_client)
+        else:
+            partitions = [f"{location.key}/day={day}/" for day in sorted(days)]
+            list_query = ap.generate_sql(table=table,
+                                         partitions_list=partitions,
+                                         s3_path=location.key)
+        for query in list_query:
+            self.ac.add_query(query, output_location=self.athena_temp)
 
     def ingest(self):
         """
-        Ingests data, will query for all data we receive each and everytime
+        Ingests data from the day prefixes inside the date window, only the deliveries that are not recorded
+        in the manifest as already processed are cleaned and copied, set full_refresh to reprocess everything
         :return:
         """
+        self.metrics.reset()
+        if self.quarantine is not None:
+            self.quarantine.days.clear()
         try:
-            dates = pd.date_range(start=(datetime.utcnow() - timedelta(days=2500)),
-                                  end=datetime.utcnow()).tolist()
-            date_range = [i.strftime("%Y%m%d") for i in dates]
-            delivery_keys = self.s3c.list(self.source_bucket.s3_url, suffix=".csv")
-            keys = [i for i in delivery_keys if i.split("/")[0] in [datetime.strptime(i, "%Y%m%d").strftime("%Y%m%d") for i in date_range]]
-            if len(keys) > 0:
-                for key in keys:
-                    key_map = list(zip(self.key_map_list, key.split('/')))
-                    key_map = {i[0]: i[1] for i in key_map}
-                    date = key.split('/')[0]
-                    file_path = f"day={key_map['day']}/{key_map['file']}"
-                    flag = self.clean(key)
-                    if flag:
-                        self.dfs.cp(source=self.int_bucket.join(f'{self.tv_type}-data/{date}/{self.tv_type}.csv'),
-                                    destination=self.output_location.join(file_path))
-                ap = AthenaPartition(bucket=self.output_location.bucket, s3_client=self.boto_client)
-                list_query = ap.get_sql(table=self.table,
-                                        s3_path=self.output_location.key,
-                                        athena_client=self.ac,
-                                        output_location=self.athena_temp)
-                for query in list_query:
-                    self.ac.add_query(query, output_location=self.athena_temp)
-                self.ac.wait_for_completion()
+            with self.metrics.timer('list'):
+                objects = list_window(self.s3c, self.source_bucket.s3_url, self.window,
+                                      suffix=tuple(SOURCE_SUFFIXES), max_workers=self.list_workers)
+            if self.shard_index is not None:
+                listed = len(objects)
+                objects = select_shard(objects, self.shard_index, self.shard_count, self.shard_strategy)
+                logger.info(f"Shard {self.shard_index} of {self.shard_count} has {len(objects)} of {listed} "
+                            f"deliveries")
+            if self.full_refresh:
+                # loaded for the partitions earlier runs have not added yet
+                with self.metrics.timer('manifest'):
+                    self.manifest.load()
+                self.manifest.reset()
+                for index in (self.content_index, self.row_index):
+                    if index is not None:
+                        index.reset()
+            else:
+                with self.metrics.timer('manifest'):
+                    self._load_manifest()
+                    if self.content_index is not None:
+                        self.content_index.load()
+                pending = self.manifest.pending(objects)
+                logger.info(f"{len(pending)} of {len(objects)} deliveries are new or changed")
+                objects = pending
+            if self.content_index is not None:
+                objects = self._skip_duplicate_deliveries(objects)
+            if len(objects) > 0:
+                self._process(objects)
             else:
-                logger.error("No key to process")
+                logger.info("No new or changed key to process")
+            # the days written by this run, and by earlier ones that failed to add them
+            written = {tv_type: set(days) for tv_type, days in self.manifest.pending_partitions.items()}
+            quarantined = set(self.manifest.pending_quarantine)
+            if self.shard_index is not None:
+                self.shard_records.write(self.shard_index, written, deliveries=len(objects), failures=self.failures,
+                                         quarantined=quarantined, strategy=self.shard_strategy,
+                                         start=str(self.window.start), end=str(self.window.end))
+            elif written or quarantined or self.reconcile_partitions:
+                self.add_partitions(written, reconcile=self.reconcile_partitions, quarantined=quarantined)
+            if written or quarantined:
+                with self.metrics.timer('manifest'):
+                    self.manifest.clear_pending_partitions()
+                    self.manifest.save()
         except Exception as e:
             logger.error(str(e))
+        self._emit_metrics()
 
-    def setup(self):
-        self.ac.add_query("CREATE DATABASE IF NOT EXISTS {}".format(self.database),
-                          name="building db {} if doesnt exist".format(self.database),
-                          output_location=self.athena_temp)
+    def _load_manifest(self):
+        self.manifest.load()
+        if self.shard_index is not None:
+            # a shard also skips what unsharded runs, and earlier coordinated backfills, have processed
+            processed = ProcessedManifest(self.manifest_location, source=self.source_bucket,
+                                          s3_client=self.boto_client).load()
+            self.manifest.objects = dict(processed.objects, **self.manifest.objects)
+
+    def coordinate(self):
+        """
+        Final step of a sharded backfill, run once the shards are done: adds the partitions written by all of
+        them in one batch and merges their manifests into the one of unsharded runs. Shards that have not
+        recorded their work yet are reported, coordinate can be run again once they have
+        :return: the indexes of the shards with no record
+        """
+        if self.shard_records is None:
+            raise ValueError("coordinate needs the shard_count of the backfill")
+        written, missing = self.shard_records.collect()
+        if missing:
+            logger.warning(f"Shards {missing} of {self.shard_count} have not recorded their work, "
+                           f"their partitions are not added")
+        manifest = ProcessedManifest(self.manifest_location, source=self.source_bucket,
+                                     s3_client=self.boto_client).load()
+        for shard_index in range(self.shard_count):
+            if shard_index not in missing:
+                shard_manifest = ProcessedManifest(self.shard_records.manifest_location(shard_index),
+                                                   source=self.source_bucket, s3_client=self.boto_client).load()
+                manifest.objects.update(shard_manifest.objects)
+        manifest.save()
+        quarantined = self.shard_records.quarantined() if self.quarantine is not None else set()
+        if written or quarantined or self.reconcile_partitions:
+            self.add_partitions(written, reconcile=self.reconcile_partitions, quarantined=quarantined)
+        return missing
+
+    def _emit_metrics(self):
+        """
+        Logs the metrics of the run as one JSON summary, and passes it to the metrics sink
+        """
+        self.metrics_summary = self.metrics.summary(tv_types=self.tv_types or 'all',
+                                                    failures=len(self.failures),
+                                                    loader=self.loader,
+                                                    peak_memory_mb=peak_memory_mb())
+        logger.info("Ingest metrics " + json.dumps(self.metrics_summary, default=str))
+        if self.metrics_sink is not None:
+            self.metrics_sink.run(self.metrics_summary)
+
+    def _run_ddl(self, statements, cache=None):
+        """
+        Submits DDL statements together and waits for them, skipping those the DDL cache has already seen run
+        with the same SQL and location. Statements that succeed are recorded in the cache
+        :param statements: list of (name, sql, location, description), independent of each other
+        :param cache: the DDLCache of the statements, defaults to the one of the tv types
+        :return: the number of statements run
+        """
+        cache = cache or self.ddl_cache
+        pending = [statement for statement in statements
+                   if self.refresh_ddl or not cache.is_current(*statement[:3])]
+        self.metrics.add({'ddl': {'run': len(pending), 'skipped': len(statements) - len(pending)}})
+        if not pending:
+            return 0
+        for name, sql, location, description in pending:
+            self.ac.add_query(sql, name=description, output_location=self.athena_temp)
         self.ac.wait_for_completion()
+        for name, sql, location, _ in pending:
+            cache.record(name, sql, location)
+        cache.save()
+        return len(pending)
+
+    def setup(self):
+        sql = "CREATE DATABASE IF NOT EXISTS {}".format(self.database)
+        self._run_ddl([(self.database, sql, None, "building db {} if doesnt exist".format(self.database))],
+                      cache=self.database_ddl_cache)
         self.create_table()
 
-    def create_table(self):
-        sql_path = os.path.join(self.sql_path, "create_table.sql")
+    def _create_tables(self, tv_types):
+        """
+        Creates the tables of the tv types whose DDL has changed, and the quarantine table, all at once, and waits
+        for them
+        """
+        if self.output_format == 'parquet':
+            sql_path = os.path.join(self.sql_path, "create_table_parquet.sql")
+        else:
+            sql_path = os.path.join(self.sql_path, "create_table.sql")
         with open(sql_path) as f:
             query = f.read()
-        self.ac.add_query(query.format(table=self.table, location=self.output_location),
-                          name="build table {}.{} if doesnt exist".format(self.database,
-                                                                          self.table),
-                          output_location=self.athena_temp)
-        self.ac.wait_for_completion()
+        statements = []
+        for tv_type in tv_types:
+            table = self.table_for(tv_type)
+            location = self.output_location_for(tv_type)
+            statements.append(("{}.{}".format(self.database, table),
+                               query.format(table=table,
+                                            location=location,
+                                            columns=columns_ddl(),
+                                            compression=(self.compression or 'snappy').upper()),
+                               str(location),
+                               "build table {}.{} if doesnt exist".format(self.database, table)))
+        if self.quarantine is not None:
+            statements.append(self._quarantine_table_ddl())
+        self._run_ddl(statements)
 
-    def drop_table(self):
-        self.ac.add_query("""
-                            DROP TABLE IF EXISTS {}
-                          """.format(self.table),
-                          name="drop table {}.{} if exists".format(self.database, self.table),
-                          output_location=self.athena_temp)
+    def _quarantine_table_ddl(self):
+        from ingest_utils.quarantine import columns_ddl
+
+        with open(os.path.join(self.sql_path, "create_quarantine_table.sql")) as f:
+            query = f.read()
+        return ("{}.{}".format(self.database, self.quarantine_table),
+                query.format(table=self.quarantine_table, location=self.quarantine_location, columns=columns_ddl()),
+                str(self.quarantine_location),
+                "build table {}.{} if doesnt exist".format(self.database, self.quarantine_table))
+
+    def create_table(self, tv_type=None):
+        """
+        Creates the table of a tv type, by default of every tv type the class was created for.
+        With tv_type 'all' the tables are created by ingest() as the tv types are found
+        """
+        self._create_tables([tv_type] if tv_type else self.tv_types or [])
+
+    def drop_table(self, tv_type=None):
+        """
+        Drops the table of a tv type, by default the tables of every tv type the class was created for and the
+        quarantine table
+        """
+        tables = [self.table_for(tv_type) for tv_type in ([tv_type] if tv_type else self.tv_types or [])]
+        if tv_type is None and self.quarantine is not None:
+            tables.append(self.quarantine_table)
+        for table in tables:
+            self.ac.add_query("""
+                                DROP TABLE IF EXISTS {}
+                              """.format(table),
+                              name="drop table {}.{} if exists".format(self.database, table),
+                              output_location=self.athena_temp)
         self.ac.wait_for_completion()
+        self.ddl_cache.forget(*["{}.{}".format(self.database, table) for table in tables])
+        self.ddl_cache.save()
 
     def teardown(self):
         self.drop_table()
@@ -142,6 +1212,8 @@ class IngestClass:
                           name="drop db {} if exists".format(self.database),
                           output_location=self.athena_temp)
         self.ac.wait_for_completion()
+        self.database_ddl_cache.forget(self.database)
+        self.database_ddl_cache.save()
         self.create_table()
 
 
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import AsyncExitStack
+
+from ingest_utils.pipeline import _InFlightBudget, DEFAULT_MAX_IN_FLIGHT_BYTES
+
+
+class _AsyncInFlightBudget(_InFlightBudget):
+    """
+    The same budget for the coroutines of one event loop
+    """
+
+    def __init__(self, max_items, max_bytes):
+        super().__init__(max_items, max_bytes)
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, nbytes):
+        async with self._condition:
+            await self._condition.wait_for(lambda: not self.items or (self.items < self.max_items and
+                                                                      self.bytes + nbytes <= self.max_bytes))
+            self.items += 1
+            self.bytes += nbytes
+
+    async def release(self, nbytes):
+        async with self._condition:
+            self.items -= 1
+            self.bytes -= nbytes
+            self._condition.notify_all()
+
+
+class AsyncPipeline:
+    """
+    Runs read -> transform -> write for many items at once like BoundedPipeline, but the read and write stages
+    are coroutines on one event loop, run on a thread of its own. An item waiting on S3 costs a coroutine rather
+    than a thread, so hundreds of them can be in flight, bounded by max_in_flight and max_in_flight_bytes. The
+    transform still runs on a process pool.
+
+    :param max_in_flight: cap on the number of items in flight
+    :param cpu_workers: processes used for the transform stage, defaults to the number of cpus. 0 runs the
+        transform on the default thread pool of the loop instead
+    :param max_in_flight_bytes: cap on the summed size of the items in flight
+    """
+
+    def __init__(self, max_in_flight=128, cpu_workers=None, max_in_flight_bytes=DEFAULT_MAX_IN_FLIGHT_BYTES):
+        self.max_in_flight = max_in_flight
+        self.cpu_workers = os.cpu_count() if cpu_workers is None else cpu_workers
+        self.max_in_flight_bytes = max_in_flight_bytes
+
+    def run(self, items, read, transform, write, size=lambda item: item['size'], context=None):
+        """
+        Pushes the items through the stages, yielding (item, result, error) as each item completes.
+        Failures in any stage are reported for that item and do not stop the others.
+
+        :param items: iterable of items, eg. dicts from `S3Client.list_dict`
+        :param read: async read(item) -> data
+        :param transform: transform(data) -> result, must be picklable to run on the process pool. None
+            passes the data read straight to write
+        :param write: async write(item, result)
+        :param size: size(item) -> bytes counted against max_in_flight_bytes
+        :param context: async context manager entered on the loop around the run, eg. an AsyncS3Client
+        """
+        completed = queue.Queue()
+        stopped = threading.Event()
+        done = object()
+
+        def _loop():
+            try:
+                asyncio.run(self._run(items, read, transform, write, size, context, completed, stopped))
+            except BaseException as e:
+                completed.put(e)
+            finally:
+                completed.put(done)
+
+        thread = threading.Thread(target=_loop, name="ingest-async-io", daemon=True)
+        thread.start()
+        try:
+            while True:
+                outcome = completed.get()
+                if outcome is done:
+                    break
+                if isinstance(outcome, BaseException):
+                    raise outcome
+                yield outcome
+        finally:
+            # a consumer that stops early lets the items in flight finish, and no new one is started
+            stopped.set()
+            thread.join()
+
+    async def _run(self, items, read, transform, write, size, context, completed, stopped):
+        loop = asyncio.get_running_loop()
+        budget = _AsyncInFlightBudget(self.max_in_flight, self.max_in_flight_bytes)
+        cpu_pool = ProcessPoolExecutor(max_workers=self.cpu_workers) if self.cpu_workers else None
+
+        async def _item(item, nbytes):
+            try:
+                result = await read(item)
+                if transform is not None:
+                    result = await loop.run_in_executor(cpu_pool, transform, result)
+                await write(item, result)
+            except Exception as e:
+                completed.put((item, None, e))
+            else:
+                completed.put((item, result, None))
+            finally:
+                await budget.release(nbytes)
+
+        try:
+            async with AsyncExitStack() as stack:
+                if context is not None:
+                    await stack.enter_async_context(context)
+                tasks = set()
+                for item in items:
+                    if stopped.is_set():
+                        break
+                    nbytes = size(item) or 0
+                    await budget.acquire(nbytes)
+                    task = asyncio.ensure_future(_item(item, nbytes))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                await asyncio.gather(*tasks)
+        finally:
+            if cpu_pool is not None:
+                cpu_pool.shutdown(wait=True)
@@ -0,0 +1,146 @@
+import gzip
+import io
+
+# suffixes of the deliveries that are ingested, and the codec of each
+SOURCE_SUFFIXES = {'.csv': None, '.csv.gz': 'gzip', '.csv.zst': 'zstd'}
+
+CSV_COMPRESSIONS = ('gzip', 'zstd')
+
+# file suffix of each codec, the one Athena reads compressed text files by
+CODEC_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+DEFAULT_LEVELS = {'gzip': 6, 'zstd': 3}
+
+_MAGIC = {b'\x1f\x8b': 'gzip', b'\x28\xb5\x2f\xfd': 'zstd'}
+
+# bytes read from a stream to sniff its codec
+SNIFF_BYTES = 4
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstandard must be installed to read or write zstd files")
+    return zstandard
+
+
+def is_source(key):
+    return key.endswith(tuple(SOURCE_SUFFIXES))
+
+
+def strip_suffix(name):
+    """
+    Returns the name of a delivery without its compression suffix, eg. `TV_1.csv` for `TV_1.csv.gz`
+    """
+    for suffix in CODEC_SUFFIXES.values():
+        if name.endswith('.csv' + suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def sniff(head):
+    """
+    Returns the codec of a file from its first bytes, None if it is not compressed
+    """
+    for magic, codec in _MAGIC.items():
+        if head.startswith(magic):
+            return codec
+    return None
+
+
+def codec_of(key, head=None):
+    """
+    Returns the codec of a delivery, from its suffix or else from its first bytes, so compressed deliveries
+    with a plain .csv name are read too
+    """
+    for suffix, codec in SOURCE_SUFFIXES.items():
+        if codec is not None and key.endswith(suffix):
+            return codec
+    return sniff(head) if head is not None else None
+
+
+class _Prefixed(io.RawIOBase):
+    """
+    A stream whose first bytes have already been read, to sniff its codec, without seeking back
+    """
+
+    def __init__(self, head, stream):
+        self._head = head
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._head:
+            data, self._head = self._head[:len(buffer)], self._head[len(buffer):]
+        else:
+            data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def sniff_stream(key, stream):
+    """
+    Returns the codec of a delivery being streamed and a stream that still starts at its first byte
+    """
+    codec = codec_of(key)
+    if codec is not None:
+        return codec, stream
+    head = stream.read(SNIFF_BYTES)
+    return sniff(head), io.BufferedReader(_Prefixed(head, stream))
+
+
+def validate_level(codec, level):
+    """
+    Raises a ValueError if the level is out of range for the codec
+    """
+    if level is None:
+        return
+    ranges = {'gzip': (1, 9), 'zstd': (1, 22)}
+    if codec not in ranges:
+        raise ValueError(f"compression_level can only be set with {tuple(ranges)}")
+    low, high = ranges[codec]
+    if not low <= level <= high:
+        raise ValueError(f"{codec} compression_level must be between {low} and {high}")
+
+
+def compress(data, codec, level=None):
+    """
+    Compresses bytes with a codec, at its default level unless one is given
+    """
+    level = level or DEFAULT_LEVELS[codec]
+    if codec == 'gzip':
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    return _zstandard().ZstdCompressor(level=level).compress(data)
+
+
+class CompressedWriter(io.RawIOBase):
+    """
+    Binary file like object that compresses what is written to it into a sink as it goes, closing it ends the
+    compressed stream but leaves the sink open
+
+    :param sink: binary file like object, eg. an S3StreamWriter
+    :param codec: 'gzip' or 'zstd'
+    :param level: compression level, defaults to DEFAULT_LEVELS
+    """
+
+    def __init__(self, sink, codec, level=None):
+        level = level or DEFAULT_LEVELS[codec]
+        if codec == 'gzip':
+            self._writer = gzip.GzipFile(fileobj=sink, mode='wb', compresslevel=level, mtime=0)
+        else:
+            self._writer = _zstandard().ZstdCompressor(level=level).stream_writer(sink, closefd=False)
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._writer.write(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._writer.close()
+        super().close()
@@ -0,0 +1,79 @@
+import logging
+from datetime import date, datetime, timedelta
+
+logger = logging.getLogger("toms ingest.date_window")
+
+DEFAULT_WINDOW_DAYS = 2500
+DAY_FORMAT = "%Y%m%d"
+
+
+def parse_day(value):
+    """
+    Parses a day given as a date, datetime or a 'YYYYMMDD' / 'YYYY-MM-DD' string
+    :param value: the day to parse, None is passed through
+    :return: datetime.date
+    """
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    for fmt in (DAY_FORMAT, "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError("Could not parse day {}, expected YYYYMMDD or YYYY-MM-DD".format(value))
+
+
+class DateWindow:
+    """
+    The inclusive range of delivery days a run picks up. Deliveries are stored under `YYYYMMDD/`
+    day prefixes, the set of day strings in the window is built once so key membership is a set lookup.
+
+    :param start: first day of the window, defaults to `days` before end
+    :param end: last day of the window, defaults to today (utc)
+    :param days: size of the window when start is not given
+    """
+
+    def __init__(self, start=None, end=None, days=DEFAULT_WINDOW_DAYS):
+        self.end = parse_day(end) or datetime.utcnow().date()
+        self.start = parse_day(start) or self.end - timedelta(days=days)
+        if self.start > self.end:
+            raise ValueError("Window start {} is after window end {}".format(self.start, self.end))
+
+        self.days = frozenset((self.start + timedelta(days=i)).strftime(DAY_FORMAT)
+                              for i in range((self.end - self.start).days + 1))
+
+    def __contains__(self, day):
+        return day in self.days
+
+    def __len__(self):
+        return len(self.days)
+
+    def __repr__(self):
+        return "DateWindow('{}', '{}')".format(self.start, self.end)
+
+
+def list_window(s3c, path, window, suffix=None, max_workers=8):
+    """
+    Lists the deliveries below path that sit in a `YYYYMMDD/` day prefix inside the window.
+
+    Only the top level day folders are listed with a delimiter, the folders outside the window are
+    never opened, and the ones inside it are listed concurrently.
+
+    :param s3c: S3Client
+    :param path: the source location, containing day folders
+    :param window: DateWindow
+    :param suffix: suffix filter for the delivery files
+    :param max_workers: number of day prefixes to list at the same time
+    :return: list of dicts as returned by `S3Client.list_dict`, sorted by key
+    """
+    location = path if path.endswith("/") else path + "/"
+    day_prefixes = sorted(folder for folder in s3c.list_folders(location, remove_prefix=True)
+                          if folder.rstrip("/") in window)
+    logger.info("{} day prefixes of {} are inside {}".format(len(day_prefixes), location, window))
+
+    if not day_prefixes:
+        return []
+
+    return list(s3c.list_parallel(location, suffix, prefixes=day_prefixes, max_workers=max_workers, sort=True))
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import logging
+
+from ingest_utils.store import ObjectStore
+
+logger = logging.getLogger("toms ingest.ddl_cache")
+
+
+def fingerprint(sql, location=None):
+    """
+    Returns the sha256 of a rendered DDL statement and the location it points at
+    """
+    return hashlib.sha256("{}\n{}".format(location or '', sql.strip()).encode('utf-8')).hexdigest()
+
+
+class DDLCache:
+    """
+    Persistent record of the DDL statements that have been run against Athena, so a run only sends the
+    CREATE DATABASE and CREATE TABLE statements whose rendered SQL or location has changed since they last
+    succeeded. Statements are named, eg. `database.table`, and fingerprinted with the sha256 of the rendered
+    SQL and the location. The cache lives in a local JSON file or an S3 object, replaced atomically on save.
+
+    The cache only knows what this ingest has run, a table dropped by anything else is not recreated until the
+    cache is refreshed
+
+    :param location: local path or s3 location of the cache
+    :param s3_client: optional boto3 s3 client, used when the cache lives in s3
+    """
+
+    version = 1
+
+    def __init__(self, location, s3_client=None):
+        self.location = str(location)
+        folder, _, self._name = self.location.rstrip('/').rpartition('/')
+        self.store = ObjectStore(folder or '.', s3_client)
+        self._s3_client = s3_client
+        self.statements = None
+
+    def sibling(self, name):
+        """
+        Returns the DDLCache of another name in the same folder
+        """
+        return DDLCache(self.store.path(name), self._s3_client)
+
+    def load(self):
+        """
+        Loads the cache, a missing cache starts empty
+        """
+        body = self.store.read(self._name)
+        content = json.loads(body) if body is not None else dict()
+        self.statements = content.get('statements', dict())
+        logger.debug("Loaded DDL cache {} with {} statements".format(self.location, len(self.statements)))
+        return self
+
+    def _loaded(self):
+        if self.statements is None:
+            self.load()
+        return self.statements
+
+    def is_current(self, name, sql, location=None):
+        """
+        Whether the statement has already been run with the same rendered SQL and location
+        """
+        return self._loaded().get(name) == fingerprint(sql, location)
+
+    def record(self, name, sql, location=None):
+        self._loaded()[name] = fingerprint(sql, location)
+
+    def forget(self, *names):
+        """
+        Forgets statements whose objects have been dropped, so they are run again
+        """
+        for name in names:
+            self._loaded().pop(name, None)
+
+    def save(self):
+        body = json.dumps({'version': self.version, 'statements': self._loaded()}, sort_keys=True)
+        self.store.write(self._name, body.encode('utf-8'))
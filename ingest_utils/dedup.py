@@ -0,0 +1,256 @@
+import hashlib
+import io
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from ingest_utils.store import ObjectStore
+from s3_client.s3_client import S3Location
+
+logger = logging.getLogger("toms ingest.dedup")
+
+
+def _digest(hex_digest):
+    """
+    The first 64 bits of an md5, plenty to tell millions of deliveries apart
+    """
+    return int(hex_digest[:16], 16)
+
+
+def is_multipart_etag(etag):
+    """
+    The ETag of a multipart upload is the md5 of the md5s of its parts, followed by the number of parts,
+    so it depends on how the object was uploaded rather than only on its content
+    """
+    return '-' in (etag or '')
+
+
+def _load_array(store, name, dtype):
+    body = store.read(name)
+    if body is None:
+        return np.array([], dtype=dtype)
+    return np.load(io.BytesIO(body), allow_pickle=False)
+
+
+def _save_array(store, name, array):
+    body = io.BytesIO()
+    np.save(body, array, allow_pickle=False)
+    store.write(name, body.getvalue())
+
+
+class ContentIndex:
+    """
+    Persistent index of the content hashes of the deliveries that have been ingested, so the same file
+    redelivered under another key is skipped before it is downloaded.
+
+    The content hash of an object uploaded in one part is its ETag, the md5 of its content. Multipart ETags
+    depend on the part size, so those objects are streamed once to compute the md5 of their content, and the
+    ETag to md5 mapping is kept so they are not read again. The index is stored as sorted arrays of 64 bit
+    digests, `contents.npy` and `multipart.npy`, under the location, and held in memory the same way, 8 bytes
+    per delivery plus 16 per multipart one.
+
+    :param location: local folder or s3 prefix of the index
+    :param s3_client: optional boto3 s3 client, used to read the index from s3 and to hash multipart objects
+    """
+
+    def __init__(self, location, s3_client=None):
+        self.store = ObjectStore(location, s3_client)
+        self.reset()
+
+    def __len__(self):
+        return len(self._contents) + len(self._new_contents)
+
+    def load(self):
+        self._contents = _load_array(self.store, 'contents.npy', np.uint64)
+        self._multipart = _load_array(self.store, 'multipart.npy', self._multipart.dtype)
+        self._new_contents, self._new_multipart = set(), dict()
+        logger.info("Loaded dedup index {} with {} deliveries".format(self.store.location, len(self._contents)))
+        return self
+
+    def reset(self):
+        """
+        Forgets all indexed deliveries, used for a full refresh
+        """
+        self._contents = np.array([], dtype=np.uint64)
+        self._multipart = np.array([], dtype=[('etag', np.uint64), ('content', np.uint64)])
+        self._new_contents = set()
+        self._new_multipart = dict()
+
+    @staticmethod
+    def _contains(sorted_array, value):
+        position = np.searchsorted(sorted_array, np.uint64(value))
+        return position < len(sorted_array) and sorted_array[position] == value
+
+    def _cached_content(self, etag):
+        if etag in self._new_multipart:
+            return self._new_multipart[etag]
+        position = np.searchsorted(self._multipart['etag'], np.uint64(etag))
+        if position < len(self._multipart) and self._multipart['etag'][position] == etag:
+            return int(self._multipart['content'][position])
+        return None
+
+    def content_hash(self, etag, location, chunk_size=8 * 1024 * 1024):
+        """
+        Returns the 64 bit digest of the content of an object, from its ETag where that is possible
+        :param etag: the ETag of the object, as listed
+        :param location: the s3 location of the object, read if the ETag is a multipart one not seen before
+        """
+        if not is_multipart_etag(etag):
+            return _digest(etag)
+        etag_digest = _digest(etag.split('-')[0])
+        content = self._cached_content(etag_digest)
+        if content is None:
+            md5 = hashlib.md5()
+            location = S3Location(location)
+            body = self.store.s3_client.get_object(Bucket=location.bucket, Key=location.key)['Body']
+            for chunk in iter(lambda: body.read(chunk_size), b''):
+                md5.update(chunk)
+            content = _digest(md5.hexdigest())
+            self._new_multipart[etag_digest] = content
+        return content
+
+    def is_indexed(self, digest):
+        return digest in self._new_contents or self._contains(self._contents, digest)
+
+    def add(self, digest):
+        if not self._contains(self._contents, digest):
+            self._new_contents.add(digest)
+
+    def save(self):
+        """
+        Merges the deliveries added since the index was loaded and replaces the stored index
+        """
+        if self._new_contents:
+            self._contents = np.union1d(self._contents, np.array(list(self._new_contents), dtype=np.uint64))
+            _save_array(self.store, 'contents.npy', self._contents)
+        if self._new_multipart:
+            new = np.array(list(self._new_multipart.items()), dtype=self._multipart.dtype)
+            multipart = np.concatenate([self._multipart, new])
+            self._multipart = multipart[np.argsort(multipart['etag'], kind='stable')]
+            _save_array(self.store, 'multipart.npy', self._multipart)
+        self._new_contents, self._new_multipart = set(), dict()
+        logger.debug("Saved dedup index {} with {} deliveries".format(self.store.location, len(self._contents)))
+
+
+def row_hashes(df):
+    """
+    64 bit hashes of the rows of a frame. Numbers are hashed as floats and everything else as text, so a row
+    hashes the same however its columns were parsed, eg. inferred from a whole delivery or as strings in chunks
+    """
+    canonical = dict()
+    for column in df.columns:
+        numbers = pd.to_numeric(df[column], errors='coerce').astype('float64')
+        canonical[column] = numbers.astype(str).where(numbers.notna(), df[column].astype(str))
+    return pd.util.hash_pandas_object(pd.DataFrame(canonical, index=df.index), index=False).values
+
+
+class RowIndex:
+    """
+    The hashes of the rows written to each day= partition, with the delivery they were written from, so rows
+    delivered again in another file for the same day are dropped. A delivery that is processed again, eg. a
+    corrected file redelivered under the same key, replaces its own rows rather than being deduplicated against
+    them, as its output replaces the one written before. The hashes of a day are loaded from `rows/day={day}.npy`
+    under the location the first time the day is seen, and saved and released once the day is done, so memory
+    is 16 bytes for each row of the days in flight. Safe to use from the pipeline threads.
+
+    :param location: local folder or s3 prefix of the index
+    :param s3_client: optional boto3 s3 client, used when the index is in s3
+    """
+
+    dtype = np.dtype([('source', np.uint64), ('row', np.uint64)])
+
+    def __init__(self, location, s3_client=None):
+        self.store = ObjectStore(location, s3_client)
+        self._fresh = False
+        self._days = dict()
+        # the rows the deliveries processed again by this run had written before, by day and delivery
+        self._replaced = dict()
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """
+        Ignores the stored hashes, the days seen from now on start empty. Used for a full refresh
+        """
+        with self._lock:
+            self._fresh = True
+            self._days = dict()
+            self._replaced = dict()
+
+    @staticmethod
+    def _name(day):
+        return f"rows/day={day}.npy"
+
+    @staticmethod
+    def _source(key):
+        return _digest(hashlib.md5(key.encode('utf-8')).hexdigest())
+
+    def _day(self, day):
+        if day not in self._days:
+            rows = np.array([], dtype=self.dtype)
+            if not self._fresh:
+                rows = _load_array(self.store, self._name(day), self.dtype)
+                if rows.dtype.names is None:
+                    # written before the rows had their delivery, they count as rows of another one
+                    rows = np.array([(0, row) for row in rows.tolist()], dtype=self.dtype)
+            self._days[day] = rows
+        return self._days[day]
+
+    def _rows(self, day, source):
+        """
+        The rows of the day, without those the delivery had written before this run
+        """
+        if (day, source) not in self._replaced:
+            rows = self._day(day)
+            own = rows['source'] == source
+            self._replaced[(day, source)] = rows[own]
+            self._days[day] = rows[~own]
+        return self._days[day]
+
+    def keep(self, day, key, hashes):
+        """
+        Returns a boolean mask of the rows that have not been written to the day by another delivery, or
+        earlier in this one, and records them. Only the first of rows repeated within the hashes is kept
+        :param day: the day= partition
+        :param key: the key of the delivery
+        :param hashes: uint64 hashes of the rows, see row_hashes
+        """
+        source = self._source(key)
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        unique, first = np.unique(hashes, return_index=True)
+        with self._lock:
+            rows = self._rows(day, source)
+            new = ~np.isin(unique, rows['row'], assume_unique=True)
+            added = np.empty(new.sum(), dtype=self.dtype)
+            added['source'], added['row'] = source, unique[new]
+            self._days[day] = np.concatenate([rows, added])
+        mask = np.zeros(len(hashes), dtype=bool)
+        mask[first[new]] = True
+        return mask
+
+    def discard(self, day, key):
+        """
+        Forgets the rows recorded by keep() for a delivery that could not be written after all, it keeps the rows
+        it had written before
+        """
+        source = self._source(key)
+        with self._lock:
+            if (day, source) in self._replaced:
+                rows = self._day(day)
+                self._days[day] = np.concatenate([rows[rows['source'] != source], self._replaced.pop((day, source))])
+
+    def release(self, day):
+        """
+        Saves the hashes of a day that is done and frees them
+        """
+        with self._lock:
+            rows = self._days.pop(day, None)
+            self._replaced = {(replaced_day, source): replaced
+                              for (replaced_day, source), replaced in self._replaced.items() if replaced_day != day}
+        if rows is not None:
+            _save_array(self.store, self._name(day), rows)
+
+    def release_all(self):
+        for day in list(self._days):
+            self.release(day)
@@ -0,0 +1,101 @@
+import csv
+
+from scrubber_config.input_schema import input_schema, usecols, categorical_columns, dtypes
+
+# 'infer' parses every column of a delivery and infers its type, 'schema' only parses the columns of the input
+# schema, as the types it declares
+LOADERS = ('infer', 'schema')
+
+# bytes read at a time to find the header of a delivery
+HEADER_BYTES = 1 << 16
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+        import pyarrow.compute as pc
+    except ImportError:
+        raise ImportError("pyarrow must be installed to load deliveries with the input schema")
+    return pa, pacsv, pc
+
+
+def _header(open_stream):
+    """
+    Returns the column names of a delivery from its first line
+    """
+    head = b''
+    with open_stream() as f:
+        while b'\n' not in head:
+            block = f.read(HEADER_BYTES)
+            if not block:
+                break
+            head += block
+    line = head.split(b'\n', 1)[0].decode('utf-8-sig').rstrip('\r')
+    return next(csv.reader([line]), [])
+
+
+def _nulls_as_nan(df, columns):
+    """
+    Missing strings come out of arrow as None, read_csv gives NaN, so the records hash the same either way
+    """
+    import numpy as np
+    import pandas as pd
+
+    for column in columns:
+        values = df[column].to_numpy()
+        missing = pd.isna(values)
+        if missing.any():
+            df[column] = np.where(missing, np.nan, values)
+    return df
+
+
+def brand_key(brand):
+    """
+    The tv type a value of the brand column belongs to, its words upper cased, so 'LG', 'LG ' and 'lg' are one
+    """
+    return ' '.join(brand.split()).upper() if isinstance(brand, str) else brand
+
+
+def read_schema(source, codec=None, brands=None, schema=input_schema):
+    """
+    Parses a delivery with the pyarrow csv reader, only the columns of the input schema, which are not in the
+    delivery are left out so the scrubber reports them missing. The records of other brands are dropped from
+    the arrow table, before any of them is converted to python objects
+    :param source: csv bytes of the delivery, or the path of a file holding them
+    :param codec: 'gzip' or 'zstd' if the delivery is compressed
+    :param brands: list of the brands to keep, matched on their brand_key, None keeps every brand
+    :return: the frame, with the categorical columns of the schema as categoricals and the others as strings,
+        and the number of records in the delivery
+    """
+    pa, pacsv, pc = _pyarrow()
+
+    def open_stream():
+        raw = pa.memory_map(source) if isinstance(source, str) else pa.BufferReader(source)
+        return pa.input_stream(raw, compression=codec)
+
+    header = set(_header(open_stream))
+    columns = [column for column in usecols(schema) if column in header]
+    convert_options = pacsv.ConvertOptions(include_columns=columns,
+                                           column_types={column: pa.string() for column in columns},
+                                           strings_can_be_null=True)
+    with open_stream() as f:
+        table = pacsv.read_csv(f, convert_options=convert_options)
+    rows = table.num_rows
+    brand = schema["brand_column"]
+    if brands is not None and brand in columns:
+        keys = pc.utf8_upper(pc.replace_substring_regex(pc.utf8_trim_whitespace(table[brand]), pattern=r'\s+',
+                                                        replacement=' '))
+        table = table.filter(pc.is_in(keys, value_set=pa.array([brand_key(b) for b in brands], pa.string())))
+    categorical = [column for column in categorical_columns(schema) if column in columns]
+    df = table.to_pandas(categories=categorical)
+    return _nulls_as_nan(df, [column for column in columns if column not in categorical]), rows
+
+
+def read_csv_options(schema=input_schema):
+    """
+    Returns the read_csv arguments that parse only the columns of the input schema, as the types it declares,
+    for deliveries read in chunks
+    """
+    names = set(usecols(schema))
+    return {'usecols': lambda column: column in names, 'dtype': dtypes(schema)}
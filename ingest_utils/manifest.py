@@ -0,0 +1,135 @@
+import json
+import logging
+
+from ingest_utils.store import ObjectStore
+
+logger = logging.getLogger("toms ingest.manifest")
+
+
+class ProcessedManifest:
+    """
+    Persistent record of the source objects that have already been ingested, so a run only has to
+    process deliveries that are new or have changed since the last one.
+
+    Objects are keyed by their source key and fingerprinted with the ETag, size and LastModified
+    returned by `S3Client.list_dict`. The manifest lives either in a local JSON file or in an S3 object
+    and every save replaces it atomically, so a crashed run resumes from its last checkpoint.
+
+    The days written for processed objects are recorded as pending partitions until they have been added
+    to Athena, so the days of a run that failed to add them, or stopped before it got there, are added by
+    the next one.
+
+    :param location: local path or s3 location of the manifest
+    :param source: the source location the manifest tracks, a manifest written for a different
+        source is ignored
+    :param s3_client: optional boto3 s3 client, used when the manifest lives in s3
+    :param checkpoint_every: save the manifest after this many objects have been marked as processed
+    """
+
+    version = 1
+
+    def __init__(self, location, source=None, s3_client=None, checkpoint_every=25):
+        self.location = str(location)
+        folder, _, self._name = self.location.rstrip('/').rpartition('/')
+        self.store = ObjectStore(folder or '.', s3_client)
+        self.source = str(source) if source is not None else None
+        self.checkpoint_every = checkpoint_every
+        self.objects = dict()
+        self.pending_partitions = dict()
+        self.pending_quarantine = set()
+        self._unsaved = 0
+
+    @staticmethod
+    def fingerprint(obj):
+        """
+        Returns the fields that identify a version of a listed object
+        :param obj: a dict as returned by `S3Client.list_dict`
+        """
+        last_modified = obj.get('last_modified')
+        return {
+            'etag': obj.get('etag'),
+            'size': obj.get('size'),
+            'last_modified': last_modified.isoformat() if hasattr(last_modified, 'isoformat') else last_modified
+        }
+
+    def load(self):
+        """
+        Loads the manifest, a missing manifest or one written for another source starts empty
+        """
+        body = self.store.read(self._name)
+        self.objects = dict()
+        self.pending_partitions = dict()
+        self.pending_quarantine = set()
+        if body is None:
+            logger.info("No manifest found at {}, all objects will be processed".format(self.location))
+            return self
+
+        content = json.loads(body)
+        if self.source is not None and content.get('source') not in (None, self.source):
+            logger.warning("Manifest {} was written for {}, ignoring it".format(self.location, content.get('source')))
+            return self
+
+        self.objects = content.get('objects', dict())
+        self.pending_partitions = {tv_type: set(days)
+                                   for tv_type, days in content.get('pending_partitions', dict()).items()}
+        self.pending_quarantine = set(content.get('pending_quarantine', []))
+        logger.info("Loaded manifest {} with {} processed objects".format(self.location, len(self.objects)))
+        return self
+
+    def reset(self):
+        """
+        Forgets all processed objects, used for a full refresh. The pending partitions are kept, their days
+        have been written either way
+        """
+        self.objects = dict()
+        self._unsaved = 0
+
+    def is_processed(self, obj):
+        return self.objects.get(obj['key']) == self.fingerprint(obj)
+
+    def pending(self, objects):
+        """
+        Returns the objects that are new or have changed since they were last processed
+        :param objects: iterable of dicts as returned by `S3Client.list_dict`
+        """
+        return [obj for obj in objects if not self.is_processed(obj)]
+
+    def mark_processed(self, obj):
+        """
+        Records an object as processed, saving the manifest every `checkpoint_every` objects
+        """
+        self.objects[obj['key']] = self.fingerprint(obj)
+        self._unsaved += 1
+        if self._unsaved >= self.checkpoint_every:
+            self.save()
+
+    def add_pending_partitions(self, written=None, quarantined=()):
+        """
+        Records days written but not added to Athena yet, they are saved with the next checkpoint
+        :param written: dict of tv type to the days written for it
+        :param quarantined: the days written to the quarantine table
+        """
+        for tv_type, days in (written or dict()).items():
+            self.pending_partitions.setdefault(tv_type, set()).update(days)
+        self.pending_quarantine.update(quarantined)
+
+    def clear_pending_partitions(self):
+        """
+        Forgets the pending partitions once they have been added
+        """
+        self.pending_partitions = dict()
+        self.pending_quarantine = set()
+
+    def save(self):
+        """
+        Atomically replaces the stored manifest with the current state
+        """
+        body = json.dumps({'version': self.version,
+                           'source': self.source,
+                           'objects': self.objects,
+                           'pending_partitions': {tv_type: sorted(days)
+                                                  for tv_type, days in self.pending_partitions.items()},
+                           'pending_quarantine': sorted(self.pending_quarantine)}, sort_keys=True)
+        self.store.write(self._name, body.encode('utf-8'))
+        self._unsaved = 0
+        logger.debug("Saved manifest {} with {} processed objects".format(self.location, len(self.objects)))
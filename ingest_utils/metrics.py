@@ -0,0 +1,158 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+def _merge(target, values):
+    """
+    Adds a nested dict of numbers into another one
+    """
+    for name, value in values.items():
+        if isinstance(value, dict):
+            _merge(target.setdefault(name, dict()), value)
+        else:
+            target[name] = target.get(name, 0) + value
+    return target
+
+
+def peak_memory_mb():
+    """
+    Peak resident memory of this process, or of the largest of its finished worker processes if that is higher,
+    None where the resource module is not available
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # kilobytes on linux, bytes on macos
+    return round(peak / (1e6 if sys.platform == 'darwin' else 1e3), 1)
+
+
+class Metrics:
+    """
+    Wall time per stage, and counters such as bytes, rows and S3 requests, of an ingest run, in total and per
+    delivery. Values are nested dicts of numbers that are added up, so the metrics a worker process collects
+    for a delivery can be sent back with as_dict() and merged into the run's with add()
+
+    Threads of the pipeline update the same Metrics, updates are done under a lock
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.totals = dict()
+            self.deliveries = dict()
+            self._start = time.perf_counter()
+
+    def add(self, values, key=None):
+        """
+        :param values: nested dict of numbers, eg. {'rows_in': 10, 'seconds': {'parse': 0.1}}
+        :param key: the delivery the values are for, None only counts them for the run
+        """
+        with self._lock:
+            _merge(self.totals, values)
+            if key is not None:
+                _merge(self.deliveries.setdefault(key, dict()), values)
+
+    def count(self, name, value=1, key=None):
+        self.add({name: value}, key)
+
+    @contextmanager
+    def timer(self, stage, key=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add({'seconds': {stage: time.perf_counter() - start}}, key)
+
+    def as_dict(self):
+        with self._lock:
+            return _merge(dict(), self.totals)
+
+    def for_delivery(self, key):
+        with self._lock:
+            return _merge(dict(), self.deliveries.get(key, dict()))
+
+    def summary(self, **fields):
+        """
+        Returns the run totals with the wall time of the run and the throughput, in the form they are emitted
+        :param fields: extra fields, eg. the tv types of the run
+        """
+        totals = self.as_dict()
+        elapsed = time.perf_counter() - self._start
+        summary = dict(fields)
+        summary.update(totals)
+        summary['deliveries'] = len(self.deliveries)
+        summary['elapsed_seconds'] = round(elapsed, 4)
+        summary['seconds'] = {stage: round(seconds, 4) for stage, seconds in totals.get('seconds', {}).items()}
+        summary['rows_per_second'] = round(totals.get('rows_in', 0) / elapsed, 1) if elapsed else 0
+        summary['mb_per_second'] = round(totals.get('bytes_in', 0) / elapsed / 1e6, 3) if elapsed else 0
+        return summary
+
+
+class MetricsSink:
+    """
+    Receives the metrics of an ingest run, subclass it to send them somewhere else, eg. CloudWatch or statsd
+    """
+
+    def delivery(self, key, metrics):
+        """
+        Called with the metrics of each delivery once it has been processed
+        """
+
+    def run(self, summary):
+        """
+        Called with the summary of the run once it has finished
+        """
+
+
+class JsonFileSink(MetricsSink):
+    """
+    Writes the run summary, with the metrics of every delivery under 'deliveries_metrics', to a local JSON file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._deliveries = dict()
+
+    def delivery(self, key, metrics):
+        self._deliveries[key] = metrics
+
+    def run(self, summary):
+        with open(self.path, 'w') as f:
+            json.dump(dict(summary, deliveries_metrics=self._deliveries), f, indent=2, default=str)
+
+
+class CountingClient:
+    """
+    Wraps a boto3 s3 client and counts the calls made through it, by operation, in a Metrics under 'requests'.
+    Without a client, a boto3 s3 client is only created when it is first used
+    """
+
+    def __init__(self, client, metrics):
+        self._client = client
+        self._metrics = metrics
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+            self._client = boto3.client('s3')
+        return self._client
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not callable(attribute) or isinstance(attribute, type):
+            return attribute
+
+        def counted(*args, **kwargs):
+            self._metrics.add({'requests': {name: 1}})
+            return attribute(*args, **kwargs)
+        return counted
@@ -0,0 +1,128 @@
+from io import BytesIO
+
+from ingest_utils.compression import CODEC_SUFFIXES, CompressedWriter, compress, strip_suffix
+from scrubber_config.table_schema import table_columns, column_types, date_formats
+
+OUTPUT_FORMATS = ('csv', 'parquet')
+PARQUET_COMPRESSIONS = ('snappy', 'zstd', 'gzip')
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("pyarrow must be installed to write parquet output")
+    return pa, pq
+
+
+def file_name(name, output_format='csv', compression=None):
+    """
+    Returns the name of the output file for a delivery file name, compressed csv files end with the suffix of
+    their codec so Athena decompresses them
+    """
+    name = strip_suffix(name)
+    if output_format == 'csv':
+        return name + CODEC_SUFFIXES.get(compression, '')
+    return name.rsplit('.', 1)[0] + '.parquet'
+
+
+def arrow_schema():
+    """
+    Returns the arrow schema of the typed table, see scrubber_config.table_schema
+    """
+    pa, _ = _pyarrow()
+    arrow_types = {"string": pa.string(), "double": pa.float64(), "bigint": pa.int64(), "date": pa.date32()}
+    types = column_types()
+    return pa.schema([(name, arrow_types[types[column]]) for column, name in table_columns])
+
+
+def to_arrow(df, schema=None):
+    """
+    Converts delivery records to an arrow table with the typed table schema. Values that do not convert
+    to the type of their column are null, as Athena would read them from the csv table
+    """
+    import pandas as pd
+
+    pa, _ = _pyarrow()
+    schema = schema or arrow_schema()
+    types, formats = column_types(), date_formats()
+    arrays = []
+    for column, name in table_columns:
+        values = df[column] if column in df else pd.Series([None] * len(df), index=df.index, dtype=object)
+        if types[column] == "double":
+            values = pd.to_numeric(values, errors='coerce')
+        elif types[column] == "date":
+            values = pd.to_datetime(values.astype(str), format=formats.get(column), errors='coerce').dt.date
+        else:
+            values = values.astype('string')
+        arrays.append(pa.array(values, type=schema.field(name).type, from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def encode(df, output_format='csv', compression=None, compression_level=None):
+    """
+    Returns the bytes of a frame in the output format
+    :param df: the records to write
+    :param output_format: 'csv' or 'parquet'
+    :param compression: parquet codec, defaults to snappy, or csv codec, gzip or zstd, csv is not compressed by
+        default
+    :param compression_level: level of the codec, defaults to the default level of the codec
+    """
+    if output_format == 'csv':
+        body = df.to_csv(index=False).encode('utf-8')
+        return compress(body, compression, compression_level) if compression else body
+    _, pq = _pyarrow()
+    buffer = BytesIO()
+    pq.write_table(to_arrow(df), buffer, compression=compression or 'snappy', compression_level=compression_level)
+    return buffer.getvalue()
+
+
+class FrameWriter:
+    """
+    Writes frames one after another to a binary file like object, eg. an S3StreamWriter, as one file in the
+    output format. Csv files get a single header, parquet files a row group per frame.
+
+    :param sink: binary file like object, closed when the writer is closed
+    :param output_format: 'csv' or 'parquet'
+    :param compression: parquet codec, defaults to snappy, or csv codec, gzip or zstd, the csv is compressed as it
+        is written
+    :param compression_level: level of the codec, defaults to the default level of the codec
+    """
+
+    def __init__(self, sink, output_format='csv', compression=None, compression_level=None):
+        self.sink = sink
+        self.output_format = output_format
+        self.compression = compression
+        self.compression_level = compression_level
+        self.rows = 0
+        self._parquet_writer = None
+        self._compressed = None
+        if output_format == 'csv' and compression:
+            self._compressed = CompressedWriter(sink, compression, compression_level)
+
+    def write(self, df):
+        if self.output_format == 'csv':
+            (self._compressed or self.sink).write(df.to_csv(index=False, header=self.rows == 0).encode('utf-8'))
+        else:
+            _, pq = _pyarrow()
+            table = to_arrow(df)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.sink, table.schema,
+                                                        compression=self.compression or 'snappy',
+                                                        compression_level=self.compression_level)
+            self._parquet_writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if self._compressed is not None:
+            self._compressed.close()
+        self.sink.close()
+
+    def abort(self):
+        if hasattr(self.sink, 'abort'):
+            self.sink.abort()
+        else:
+            self.sink.close()
@@ -0,0 +1,149 @@
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+logger = logging.getLogger("toms ingest.pipeline")
+
+DEFAULT_MAX_IN_FLIGHT_BYTES = 256 * 1024 * 1024
+
+
+def run_serial(items, read, transform, write):
+    """
+    Runs read -> transform -> write for one item at a time, yielding (item, result, error) like
+    `BoundedPipeline.run` so callers handle both modes the same way
+    """
+    for item in items:
+        try:
+            result = read(item)
+            if transform is not None:
+                result = transform(result)
+            write(item, result)
+        except Exception as e:
+            yield item, None, e
+        else:
+            yield item, result, None
+
+
+class _InFlightBudget:
+    """
+    Blocks the producer while too many items, or too many bytes, are between the stages.
+    A single item bigger than the byte budget is let through once nothing else is in flight.
+    """
+
+    def __init__(self, max_items, max_bytes):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.items = 0
+        self.bytes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, nbytes):
+        with self._condition:
+            while self.items and (self.items >= self.max_items or self.bytes + nbytes > self.max_bytes):
+                self._condition.wait()
+            self.items += 1
+            self.bytes += nbytes
+
+    def release(self, nbytes):
+        with self._condition:
+            self.items -= 1
+            self.bytes -= nbytes
+            self._condition.notify_all()
+
+
+class BoundedPipeline:
+    """
+    Runs read -> transform -> write for many items at once. Reads and writes are S3 round trips and run
+    on a thread pool, the transform is CPU bound and runs on a process pool, so the network and the CPU
+    are both kept busy.
+
+    The number of items, and the number of bytes, in flight between the stages is capped, so the work
+    queued up for each stage is bounded no matter how fast the listing produces keys.
+
+    :param io_workers: threads used for the read and write stages
+    :param cpu_workers: processes used for the transform stage, defaults to the number of cpus. 0 runs
+        the transform on the io threads instead
+    :param max_in_flight_bytes: cap on the summed size of the items in flight
+    :param max_in_flight: cap on the number of items in flight, defaults to twice io_workers
+    """
+
+    def __init__(self, io_workers=8, cpu_workers=None, max_in_flight_bytes=DEFAULT_MAX_IN_FLIGHT_BYTES,
+                 max_in_flight=None):
+        self.io_workers = io_workers
+        self.cpu_workers = os.cpu_count() if cpu_workers is None else cpu_workers
+        self.max_in_flight_bytes = max_in_flight_bytes
+        self.max_in_flight = max_in_flight or 2 * io_workers
+
+    def run(self, items, read, transform, write, size=lambda item: item['size']):
+        """
+        Pushes the items through the stages, yielding (item, result, error) as each item completes.
+        Failures in any stage are reported for that item and do not stop the others.
+
+        :param items: iterable of items, eg. dicts from `S3Client.list_dict`
+        :param read: read(item) -> data, run on the io threads
+        :param transform: transform(data) -> result, must be picklable to run on the process pool. None
+            passes the data read straight to write
+        :param write: write(item, result), run on the io threads
+        :param size: size(item) -> bytes counted against max_in_flight_bytes
+        """
+        budget = _InFlightBudget(self.max_in_flight, self.max_in_flight_bytes)
+        completed = queue.Queue()
+        io_pool = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="ingest-io")
+        cpu_pool = ProcessPoolExecutor(max_workers=self.cpu_workers) if self.cpu_workers else io_pool
+
+        def _finish(item, nbytes, result, error):
+            budget.release(nbytes)
+            completed.put((item, result, error))
+
+        def _chain(item, nbytes, future, next_stage):
+            try:
+                value = future.result()
+            except Exception as e:
+                _finish(item, nbytes, None, e)
+                return
+            try:
+                next_stage(value)
+            except Exception as e:
+                _finish(item, nbytes, None, e)
+
+        def _start(item, nbytes):
+
+            def _after_write(result):
+                _finish(item, nbytes, result, None)
+
+            def _write(result):
+
+                def _do_write():
+                    write(item, result)
+                    return result
+
+                future = io_pool.submit(_do_write)
+                future.add_done_callback(lambda f: _chain(item, nbytes, f, _after_write))
+
+            def _transform(data):
+                future = cpu_pool.submit(transform, data)
+                future.add_done_callback(lambda f: _chain(item, nbytes, f, _write))
+
+            future = io_pool.submit(read, item)
+            future.add_done_callback(lambda f: _chain(item, nbytes, f, _write if transform is None else _transform))
+
+        submitted = 0
+        try:
+            for item in items:
+                nbytes = size(item) or 0
+                budget.acquire(nbytes)
+                _start(item, nbytes)
+                submitted += 1
+                while not completed.empty():
+                    submitted -= 1
+                    yield completed.get()
+
+            while submitted:
+                submitted -= 1
+                yield completed.get()
+        finally:
+            io_pool.shutdown(wait=True)
+            if cpu_pool is not io_pool:
+                cpu_pool.shutdown(wait=True)
@@ -0,0 +1,106 @@
+import logging
+import time
+import uuid
+
+import pandas as pd
+
+from ingest_utils.store import ObjectStore
+from scrubber_config.table_schema import table_columns
+
+logger = logging.getLogger("toms ingest.quarantine")
+
+# rows up to which the rejected rows of a day are buffered before they are written as a part
+DEFAULT_MAX_ROWS = 500000
+
+# scrubber report categories of the values a rule found invalid: replaced with the default, passed through
+# unchanged and removed
+OUTCOMES = ('replaced', 'ignored', 'quarantined')
+
+# columns added to the delivery columns of each rejected row
+TAGS = ['source_key', 'field', 'rule', 'outcome', 'original_value']
+
+
+def rejected_rows(df, entries):
+    """
+    Returns the records whose values a scrubber rule found invalid, one row per rule and record, as they were
+    delivered and tagged with the field and rule, what the rule did with the value and the original value. The
+    source_key is left empty, QuarantineSink.add sets it as the worker processes don't know the delivery key.
+    Entries of rules whose column is missing from the delivery reject the whole delivery rather than some of its
+    records, they are only reported
+    :param df: the records as they were read, the scrubber ran on a copy with the same index
+    :param entries: the report entries of the scrubber, with the invalid records in entry.df
+    :return: DataFrame of the delivery columns and TAGS, None if no record was rejected
+    """
+    frames = []
+    for entry in entries:
+        records = getattr(entry, 'df', None)
+        if entry.category not in OUTCOMES or records is None or entry.field not in df.columns:
+            continue
+        rows = df.loc[records.index]
+        frames.append(rows.reindex(columns=[column for column, _ in table_columns])
+                      .assign(source_key='', field=entry.field, rule=entry.rule, outcome=entry.category,
+                              original_value=rows[entry.field].to_numpy()))
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True).fillna('').astype(str)
+
+
+def columns_ddl():
+    """
+    Returns the column list of the CREATE TABLE statement of the quarantine table, every column is a string
+    """
+    return ",\n".join("  `{}` string".format(name) for name in [name for _, name in table_columns] + TAGS)
+
+
+class QuarantineSink:
+    """
+    Buffers the rejected rows of a run per day and writes them as csv objects under `day=` partitions of the
+    location, once every delivery of the day is done or max_rows are buffered for it, so a day gets a few
+    large objects rather than one per delivery. Object names start with an id unique to the sink, runs never
+    overwrite each other's rows
+
+    :param location: local folder or s3 prefix of the quarantine table
+    :param s3_client: optional boto3 s3 client, used when the location is in s3
+    :param max_rows: rows buffered for a day before they are written
+    """
+
+    def __init__(self, location, s3_client=None, max_rows=DEFAULT_MAX_ROWS):
+        self.store = ObjectStore(location, s3_client)
+        self.max_rows = max_rows
+        self.run_id = "{}-{}".format(time.strftime('%Y%m%dT%H%M%S'), uuid.uuid4().hex[:8])
+        self.buffers = dict()
+        self.parts = dict()
+        self.days = set()
+
+    def add(self, day, key, rows):
+        """
+        Buffers the rejected rows of a delivery, writing the day if it is over max_rows
+        :param rows: the rows returned by rejected_rows
+        :return: the bytes written
+        """
+        if rows is None or not len(rows):
+            return 0
+        self.buffers.setdefault(day, []).append(rows.assign(source_key=key))
+        if sum(len(frame) for frame in self.buffers[day]) >= self.max_rows:
+            return self.flush(day)
+        return 0
+
+    def flush(self, day=None):
+        """
+        Writes the rows buffered for a day, by default for every day
+        :return: the bytes written
+        """
+        written = 0
+        for day in ([day] if day is not None else sorted(self.buffers)):
+            frames = self.buffers.pop(day, None)
+            if not frames:
+                continue
+            part = self.parts.get(day, 0)
+            self.parts[day] = part + 1
+            body = pd.concat(frames, ignore_index=True).to_csv(index=False).encode('utf-8')
+            name = f"day={day}/{self.run_id}-{part:05d}.csv"
+            self.store.write(name, body)
+            self.days.add(day)
+            written += len(body)
+            logger.debug("Quarantined {} rows to {}".format(sum(len(frame) for frame in frames), self.store.path(name)))
+        return written
@@ -0,0 +1,128 @@
+import json
+import logging
+import zlib
+
+from ingest_utils.store import ObjectStore
+
+logger = logging.getLogger("toms ingest.shards")
+
+SHARD_STRATEGIES = ('day', 'size')
+
+
+def _day(obj):
+    return obj['key'].split('/', 1)[0]
+
+
+def shard_of_day(day, shard_count):
+    """
+    The shard a day goes to with the 'day' strategy, from a crc32 of the day alone, so it does not depend on
+    what else was listed and shards that list at different times still agree
+    """
+    return zlib.crc32(day.encode('utf-8')) % shard_count
+
+
+def pack_days(objects, shard_count):
+    """
+    Assigns whole days to shards by size, the largest day first to the shard with the fewest bytes so far.
+    Every shard must be given the same listing to agree on the assignment
+    :param objects: listed objects, dicts with 'key' and 'size' as returned by `S3Client.list_dict`
+    :return: dict of day to shard
+    """
+    sizes = dict()
+    for obj in objects:
+        sizes[_day(obj)] = sizes.get(_day(obj), 0) + (obj.get('size') or 0)
+    loads = [0] * shard_count
+    shards = dict()
+    for day, size in sorted(sizes.items(), key=lambda item: (-item[1], item[0])):
+        shard = min(range(shard_count), key=lambda i: (loads[i], i))
+        shards[day] = shard
+        loads[shard] += size
+    return shards
+
+
+def select_shard(objects, shard_index, shard_count, strategy='day'):
+    """
+    Returns the objects of one shard. Objects are assigned by day, so each day= partition has a single writer
+    :param objects: listed objects, dicts with 'key' and 'size' as returned by `S3Client.list_dict`
+    :param shard_index: the shard to return, 0 to shard_count - 1
+    :param shard_count: number of shards the objects are split into
+    :param strategy: 'day' spreads the days by a hash of the day, 'size' balances the bytes of each shard
+    """
+    if strategy not in SHARD_STRATEGIES:
+        raise ValueError(f"shard strategy must be one of {SHARD_STRATEGIES}")
+    if strategy == 'size':
+        shards = pack_days(objects, shard_count)
+        return [obj for obj in objects if shards[_day(obj)] == shard_index]
+    return [obj for obj in objects if shard_of_day(_day(obj), shard_count) == shard_index]
+
+
+class ShardRecords:
+    """
+    The work each shard of a backfill has completed, `shard-{index}-of-{count}.json` under the location, with
+    the days written for each tv type, so a coordinator can register every partition once all shards are done.
+    Writing a record adds to what the shard recorded before, a shard that is run again does not lose the days
+    of its earlier attempts
+
+    :param location: local folder or s3 prefix of the records
+    :param shard_count: number of shards of the backfill
+    :param s3_client: optional boto3 s3 client, used when the records are in s3
+    """
+
+    def __init__(self, location, shard_count, s3_client=None):
+        self.store = ObjectStore(location, s3_client)
+        self.shard_count = shard_count
+
+    def name(self, shard_index):
+        return f"shard-{shard_index}-of-{self.shard_count}.json"
+
+    def manifest_location(self, shard_index):
+        """
+        Where a shard keeps its manifest, shards can't share one without overwriting each other's
+        """
+        return self.store.path(f"manifest-{shard_index}-of-{self.shard_count}.json")
+
+    def read(self, shard_index):
+        body = self.store.read(self.name(shard_index))
+        return json.loads(body) if body is not None else None
+
+    def write(self, shard_index, written, deliveries=0, failures=(), quarantined=(), **fields):
+        """
+        :param written: dict of tv type to the days written for it
+        :param deliveries: number of deliveries processed by this attempt
+        :param failures: keys of the deliveries that failed in this attempt
+        :param quarantined: days written to the quarantine table
+        """
+        record = self.read(shard_index) or {'written': dict(), 'deliveries': 0}
+        for tv_type, days in written.items():
+            record['written'][tv_type] = sorted(set(record['written'].get(tv_type, [])) | set(days))
+        record['quarantined'] = sorted(set(record.get('quarantined', [])) | set(quarantined))
+        record.update(fields, shard_index=shard_index, shard_count=self.shard_count,
+                      deliveries=record['deliveries'] + deliveries, failures=sorted(failures))
+        self.store.write(self.name(shard_index), json.dumps(record, sort_keys=True).encode('utf-8'))
+        logger.info("Recorded shard {} of {}: {} deliveries, {} failures".format(
+            shard_index, self.shard_count, deliveries, len(record['failures'])))
+        return record
+
+    def collect(self):
+        """
+        Merges the days written by all shards
+        :return: dict of tv type to days, and the indexes of the shards that have no record yet
+        """
+        written, missing = dict(), []
+        for shard_index in range(self.shard_count):
+            record = self.read(shard_index)
+            if record is None:
+                missing.append(shard_index)
+                continue
+            for tv_type, days in record['written'].items():
+                written.setdefault(tv_type, set()).update(days)
+        return written, missing
+
+    def quarantined(self):
+        """
+        :return: the days written to the quarantine table by all shards
+        """
+        days = set()
+        for shard_index in range(self.shard_count):
+            days.update((self.read(shard_index) or dict()).get('quarantined', []))
+        return days
@@ -0,0 +1,139 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+logger = logging.getLogger("toms ingest.source_cache")
+
+DEFAULT_MAX_BYTES = 10 * 1024 ** 3
+
+# a cached source object, only its path and size travel to the worker processes, which read it from disk
+CachedFile = namedtuple('CachedFile', ['path', 'size'])
+
+
+class SourceCache:
+    """
+    Read-through cache of source objects on local disk, keyed by bucket, key and ETag so a changed object is
+    never served stale. Files are filled in a temporary file and renamed into place, so processes and threads
+    sharing the directory only ever see complete files. Every hit touches the file, and once the cache is over
+    max_bytes the least recently used files are deleted until it is back under 90% of it. A file handed on to be
+    parsed later is pinned, hard linked to a name of its own, so evicting it doesn't take it away from the reader.
+
+    :param directory: local folder of the cache, shared by every worker on the machine
+    :param max_bytes: size cap of the cache, objects bigger than it are not cached
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+
+    def path(self, bucket, key, etag):
+        name = hashlib.sha256(f"{bucket}/{key}/{etag}".encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name[:2], name)
+
+    def get(self, bucket, key, etag):
+        """
+        :return: the CachedFile of an object, None if it is not cached
+        """
+        path = self.path(bucket, key, etag)
+        try:
+            os.utime(path)
+            return CachedFile(path, os.path.getsize(path))
+        except FileNotFoundError:
+            return None
+
+    def fill(self, bucket, key, etag, write):
+        """
+        Caches an object and returns its CachedFile
+        :param write: write(f) writes the content of the object to the binary file f
+        """
+        path = self.path(bucket, key, etag)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".fill-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        size = os.path.getsize(path)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            else:
+                self._size += size
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+        return CachedFile(path, size)
+
+    def pin(self, cached):
+        """
+        Hard links a cached file to a name that is never evicted, its content stays on disk until it is unpinned
+        :return: the CachedFile of the link, None if the file has been evicted already
+        """
+        path = os.path.join(os.path.dirname(cached.path), f".pin-{uuid.uuid4().hex}")
+        try:
+            os.link(cached.path, path)
+        except FileNotFoundError:
+            return None
+        return CachedFile(path, cached.size)
+
+    def unpin(self, pinned):
+        try:
+            os.remove(pinned.path)
+        except FileNotFoundError:
+            pass
+
+    def _scan(self):
+        """
+        :return: the (mtime, size, path) of the cached files, oldest first, and their total size
+        """
+        files, total = [], 0
+        if not os.path.isdir(self.directory):
+            return files, total
+        stale = time.time() - 3600
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir():
+                continue
+            for file in os.scandir(entry.path):
+                try:
+                    stat = file.stat()
+                    if file.name.startswith('.'):
+                        # the temporary file of a fill, or the pin of a reader, that crashed
+                        if stat.st_mtime < stale:
+                            os.remove(file.path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, file.path))
+                total += stat.st_size
+        return sorted(files), total
+
+    def evict(self):
+        """
+        Deletes the least recently used files until the cache is under 90% of max_bytes. Other workers fill the
+        same directory, so the files are listed again rather than trusting the size this one has counted
+        """
+        with self._lock:
+            files, total = self._scan()
+            evicted = 0
+            for _, size, path in files:
+                if total <= 0.9 * self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                evicted += 1
+            self._size = total
+        logger.debug("Evicted {} files from source cache {}, {} bytes left".format(evicted, self.directory, total))
+        return evicted
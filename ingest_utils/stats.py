@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+
+from ingest_utils.dedup import row_hashes
+
+DEFAULT_EXACT_THRESHOLD = 16384
+DEFAULT_PRECISION = 14
+
+
+class DistinctCount:
+    """
+    Counts distinct 64 bit hashes. The hashes are kept, and the count is exact, up to `threshold` of them,
+    beyond that they are folded into a HyperLogLog sketch of 2 ** precision one byte registers and the count
+    is an estimate, with a standard error of about 1.04 / sqrt(2 ** precision), 0.8% at the default precision.
+    Memory is bounded by the threshold whatever the number of records, and counts of different files, workers
+    or days are merged without losing anything the separate counts had.
+
+    :param threshold: most distinct hashes counted exactly
+    :param precision: number of hash bits that pick the register, 11 to 18
+    """
+
+    def __init__(self, threshold=DEFAULT_EXACT_THRESHOLD, precision=DEFAULT_PRECISION):
+        if not 11 <= precision <= 18:
+            raise ValueError("precision must be between 11 and 18")
+        self.threshold = threshold
+        self.precision = precision
+        self._hashes = set()
+        self._registers = None
+
+    @property
+    def exact(self):
+        return self._registers is None
+
+    def update(self, hashes):
+        """
+        :param hashes: numpy array of uint64 hashes
+        """
+        hashes = np.unique(np.asarray(hashes, dtype=np.uint64))
+        if self.exact and len(self._hashes) + len(hashes) <= self.threshold:
+            self._hashes.update(hashes.tolist())
+            return self
+        if self.exact:
+            hashes = np.union1d(hashes, np.fromiter(self._hashes, dtype=np.uint64, count=len(self._hashes)))
+            if len(hashes) <= self.threshold:
+                self._hashes = set(hashes.tolist())
+                return self
+            self._registers = np.zeros(1 << self.precision, dtype=np.uint8)
+            self._hashes = set()
+        self._add_to_registers(hashes)
+        return self
+
+    def _add_to_registers(self, hashes):
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # the rest has at most 53 bits, so it converts to a float exactly and frexp gives its bit length
+        _, bit_length = np.frexp(rest.astype(np.float64))
+        rank = (bits - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self._registers, index, rank)
+
+    def merge(self, other):
+        """
+        Adds the hashes counted by another DistinctCount of the same precision
+        """
+        if other.precision != self.precision:
+            raise ValueError("can only merge counts of the same precision")
+        if other.exact:
+            return self.update(np.fromiter(other._hashes, dtype=np.uint64, count=len(other._hashes)))
+        if self.exact:
+            hashes = np.fromiter(self._hashes, dtype=np.uint64, count=len(self._hashes))
+            self._registers = other._registers.copy()
+            self._hashes = set()
+            self._add_to_registers(hashes)
+        else:
+            np.maximum(self._registers, other._registers, out=self._registers)
+        return self
+
+    def count(self):
+        if self.exact:
+            return len(self._hashes)
+        m = len(self._registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self._registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self._registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # linear counting is more accurate while many registers are still empty
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
+
+    def __getstate__(self):
+        # an array pickles far smaller and faster than a set of ints on the way back from a worker process
+        state = self.__dict__.copy()
+        state['_hashes'] = np.fromiter(self._hashes, dtype=np.uint64, count=len(self._hashes))
+        return state
+
+    def __setstate__(self, state):
+        state['_hashes'] = set(state['_hashes'].tolist())
+        self.__dict__.update(state)
+
+
+class RunningStats:
+    """
+    Statistics of the records of a delivery that are updated chunk by chunk in one pass, so they can be reported
+    without holding the whole delivery in memory: the number of records, the exact minimum and maximum date and
+    the number of unique records, counted from a 64 bit hash of each row with a DistinctCount. Rows are hashed
+    with row_hashes, so a row counts once even when its columns are inferred as different types in different
+    chunks. Stats of different deliveries merge, so they add up per day= partition and per run.
+
+    :param date_column: the (datetime) column the minimum and maximum are taken over
+    :param threshold: unique records counted exactly, beyond it they are estimated
+    """
+
+    def __init__(self, date_column='date', threshold=DEFAULT_EXACT_THRESHOLD):
+        self.date_column = date_column
+        self.rows = 0
+        self.minimum = None
+        self.maximum = None
+        self.distinct = DistinctCount(threshold)
+
+    def _update_range(self, minimum, maximum):
+        if minimum is None or pd.isna(minimum):
+            return
+        self.minimum = minimum if self.minimum is None else min(self.minimum, minimum)
+        self.maximum = maximum if self.maximum is None else max(self.maximum, maximum)
+
+    def update(self, df):
+        if df.empty:
+            return self
+        self.rows += len(df)
+        dates = df[self.date_column]
+        self._update_range(dates.min(), dates.max())
+        self.distinct.update(row_hashes(df))
+        return self
+
+    def merge(self, other):
+        self.rows += other.rows
+        self._update_range(other.minimum, other.maximum)
+        self.distinct.merge(other.distinct)
+        return self
+
+    @property
+    def unique(self):
+        return self.distinct.count()
+
+    def as_dict(self):
+        """
+        Returns the stats in the form they are logged
+        """
+        return {'Maximum': self.maximum.strftime('%Y-%m-%d') if self.maximum is not None else None,
+                'Minimum': self.minimum.strftime('%Y-%m-%d') if self.minimum is not None else None,
+                'Unique Record': self.unique,
+                'Records': self.rows,
+                'Unique Exact': self.distinct.exact}
@@ -0,0 +1,58 @@
+import os
+import tempfile
+
+from s3_client.s3_client import S3Location
+
+
+class ObjectStore:
+    """
+    Reads and writes whole binary objects in a local folder or under an s3 prefix, replacing them atomically
+    """
+
+    def __init__(self, location, s3_client=None):
+        self.location = str(location).rstrip('/')
+        self.is_s3 = self.location.startswith("s3://")
+        self._s3_client = s3_client
+
+    @property
+    def s3_client(self):
+        if self._s3_client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise ImportError("boto3 must be installed to keep {} in s3".format(self.location))
+            self._s3_client = boto3.client(service_name='s3')
+        return self._s3_client
+
+    def path(self, name):
+        return f"{self.location}/{name}"
+
+    def read(self, name):
+        if self.is_s3:
+            loc = S3Location(self.path(name))
+            try:
+                return self.s3_client.get_object(Bucket=loc.bucket, Key=loc.key)['Body'].read()
+            except self.s3_client.exceptions.NoSuchKey:
+                return None
+        if not os.path.exists(self.path(name)):
+            return None
+        with open(self.path(name), 'rb') as f:
+            return f.read()
+
+    def write(self, name, body):
+        if self.is_s3:
+            loc = S3Location(self.path(name))
+            self.s3_client.put_object(Bucket=loc.bucket, Key=loc.key, Body=body)
+            return
+        directory = os.path.dirname(os.path.abspath(self.path(name)))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".store-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(body)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path(name))
+        except Exception:
+            os.remove(tmp_path)
+            raise
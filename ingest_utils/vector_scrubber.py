@@ -0,0 +1,262 @@
+import datetime
+import re
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype, is_datetime64_any_dtype, is_timedelta64_dtype
+
+USE_DEFAULT_VALUE = "use_default"
+USE_INVALID_DATA = "do_not_replace"
+REMOVE_ENTRY = "remove_record"
+
+# category and description reported by each fallback mode, as dativa reports them
+FALLBACKS = {USE_DEFAULT_VALUE: ("replaced", "Replaced with default value"),
+             USE_INVALID_DATA: ("ignored", "No changes made"),
+             REMOVE_ENTRY: ("quarantined", "Data quarantined")}
+
+# params dativa accepts that change nothing at their default, any other value needs the dativa engine
+UNSUPPORTED_PARAMS = {"is_unique": False,
+                      "skip_blank": False,
+                      "attempt_closest_match": False,
+                      "lookalike_match": False,
+                      "string_distance_threshold": None}
+
+
+class ReportEntry:
+    """
+    A report entry with the fields of a dativa ReportEntry. Instead of a copy of the records it describes, df
+    only holds the original values of the invalid records, indexed like them, and is None for other entries
+    """
+
+    def __init__(self, rule, field, number_records, category, description, df=None):
+        self.date = datetime.datetime.now()
+        self.df = df
+        self.field = field
+        self.rule = rule
+        self.number_records = int(number_records)
+        self.category = category
+        self.description = description
+
+    def __str__(self):
+        return "{0}, Field {1}({2}): #{3} {4}/|{5}".format(self.date, self.field, self.rule, self.number_records,
+                                                           self.category, self.description)
+
+    def get_log_dict(self):
+        return {"date": self.date,
+                "field": self.field,
+                "rule": self.rule,
+                "number_records": self.number_records,
+                "category": self.category,
+                "description": self.description}
+
+
+def _column_name(df, field):
+    """
+    Finds the column a rule runs on the way dativa does, by name or else by position
+    """
+    if field in df.columns:
+        return field
+    try:
+        return df.columns[int(field)]
+    except (ValueError, TypeError, IndexError):
+        return None
+
+
+def _map_unique(values, func):
+    """
+    Applies a python function once per distinct value of a series instead of once per row
+    :return: numpy object array aligned with the series
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    mapped = np.empty(len(uniques) + 1, dtype=object)
+    mapped[:-1] = [func(value) for value in uniques]
+    mapped[-1] = func(None)
+    return mapped[codes]
+
+
+class _Rule(ABC):
+    """
+    A single column rule, the subclasses set `clean` values where the records are valid and null where they
+    are not, the fallback mode then decides what happens to the invalid records
+    """
+
+    rule_type = None
+    params = {}
+
+    def __init__(self, field, params):
+        self.field = field
+        unknown = set(params) - set(self.params) - {"fallback_mode", "default_value"} - set(UNSUPPORTED_PARAMS)
+        if unknown:
+            raise ValueError("{} rule on {} has unknown params {}".format(self.rule_type, field, sorted(unknown)))
+        for param, default in UNSUPPORTED_PARAMS.items():
+            if param in params and params[param] != default:
+                raise ValueError("{} is not supported by the vectorized scrubber, use the dativa engine".format(param))
+        for param, default in self.params.items():
+            if param not in params and default is None:
+                raise ValueError("{} rule on {} must set {}".format(self.rule_type, field, param))
+            setattr(self, param, params.get(param, default))
+        self.fallback_mode = params.get("fallback_mode")
+        if self.fallback_mode not in FALLBACKS:
+            raise ValueError("{} is not a valid fallback_mode".format(self.fallback_mode))
+        self.default_value = params.get("default_value", "")
+
+    @abstractmethod
+    def clean(self, df, column, report):
+        """
+        :return: the column with the clean value of the valid records and null for the invalid ones
+        """
+
+    def run(self, df, report):
+        column = _column_name(df, self.field)
+        if column is None:
+            report.append(ReportEntry(self.rule_type, self.field, len(df), "quarantined",
+                                      "File did not contain required column"))
+            df.drop(df.index, inplace=True)
+            return
+        original = df[column]
+        clean = self.clean(df, column, report)
+        invalid = clean.isnull().to_numpy()
+        if invalid.any():
+            category, description = FALLBACKS[self.fallback_mode]
+            report.append(ReportEntry(self.rule_type, column, invalid.sum(), category, description,
+                                      df=original[invalid].to_frame()))
+            if self.fallback_mode == USE_DEFAULT_VALUE:
+                if is_numeric_dtype(clean) and isinstance(self.default_value, (int, float)):
+                    values = np.where(invalid, self.default_value, clean.to_numpy())
+                else:
+                    values = clean.to_numpy(dtype=object, copy=True)
+                    values[invalid] = self.default_value
+                clean = pd.Series(values, index=clean.index, dtype=values.dtype)
+            elif self.fallback_mode == USE_INVALID_DATA:
+                if is_numeric_dtype(clean) and is_numeric_dtype(original):
+                    values = np.where(invalid, original.to_numpy(dtype=clean.dtype), clean.to_numpy())
+                    clean = pd.Series(values, index=clean.index, dtype=clean.dtype)
+                else:
+                    values = clean.to_numpy(dtype=object, copy=True)
+                    values[invalid] = original[invalid].astype(object).to_numpy()
+                    clean = pd.Series(values, index=clean.index, dtype=object)
+            else:
+                df.drop(df.index[invalid], inplace=True)
+                clean = clean[~invalid]
+        df[column] = clean
+
+
+class _NumberRule(_Rule):
+    rule_type = "Number"
+    params = {"decimal_places": None,
+              "minimum_value": None,
+              "maximum_value": None,
+              "fix_decimal_places": None}
+
+    def clean(self, df, column, report):
+        values = df[column]
+        if is_numeric_dtype(values):
+            in_range = ((self.minimum_value <= values) & (values <= self.maximum_value)).to_numpy()
+            clean = values.where(in_range).round(self.decimal_places)
+            if self.fix_decimal_places:
+                report.append(ReportEntry(self.rule_type, column, in_range.sum(), "modified",
+                                          "Automatically fixed to {0} decimal places".format(self.decimal_places)))
+            else:
+                clean = clean.where(clean == values)
+            return clean
+
+        regex = re.compile("\\d+" if self.decimal_places == 0 else "-?\\d+\\." + "\\d" * self.decimal_places)
+        format_string = "{{0:.{0}f}}".format(self.decimal_places)
+
+        def validate(value):
+            try:
+                number = float(np.nan if value is None else value)
+            except ValueError:
+                return None
+            if not self.minimum_value <= number <= self.maximum_value:
+                return None
+            if self.fix_decimal_places:
+                return format_string.format(number)
+            return value if isinstance(value, str) and regex.fullmatch(value) else None
+
+        clean = pd.Series(_map_unique(values, validate), index=values.index, dtype=object)
+        if self.fix_decimal_places:
+            changed = (clean.notnull() & (clean != values) & df.notnull().all(axis=1)).sum()
+            if changed:
+                report.append(ReportEntry(self.rule_type, column, changed, "modified",
+                                          "Automatically fixed to {0} decimal places".format(self.decimal_places)))
+        return clean
+
+
+class _DateRule(_Rule):
+    rule_type = "Date"
+    params = {"date_format": None,
+              "range_check": "none",
+              "range_minimum": "none",
+              "range_maximum": "none"}
+
+    def _parse(self, values):
+        if self.date_format == "%s":
+            return pd.to_datetime(values, unit='s', errors='coerce')
+        return pd.to_datetime(values, format=self.date_format, exact=True, errors='coerce')
+
+    def _format(self, dates):
+        """
+        Formats the distinct dates only, deliveries hold few distinct days
+        """
+        codes, uniques = pd.factorize(dates)
+        if self.date_format == "%s":
+            formatted = ((uniques - pd.Timestamp(1970, 1, 1)).total_seconds()).map("{0:.0f}".format)
+        else:
+            formatted = uniques.strftime(self.date_format)
+        formatted = np.append(np.asarray(formatted, dtype=object), None)
+        return pd.Series(formatted[codes], index=dates.index, dtype=object)
+
+    def clean(self, df, column, report):
+        values = df[column]
+        if is_datetime64_any_dtype(values) or is_timedelta64_dtype(values):
+            dates = values
+        else:
+            dates = self._parse(values)
+        if self.range_check == "rolling":
+            now = datetime.datetime.now()
+            minimum = now + datetime.timedelta(days=int(self.range_minimum))
+            maximum = now + datetime.timedelta(days=int(self.range_maximum))
+        elif self.range_check == "fixed":
+            minimum = self._parse(pd.Series([self.range_minimum])).iloc[0]
+            maximum = self._parse(pd.Series([self.range_maximum])).iloc[0]
+        if self.range_check != "none":
+            dates = dates.where((dates >= minimum) & (dates <= maximum))
+        return self._format(dates)
+
+
+class VectorScrubber:
+    """
+    Runs the Number and Date rules of a scrubber config with column operations over the whole frame,
+    instead of per value as dativa does. It reports the same entries as dativa.scrubber.Scrubber.run
+    and cleans the frame in place the same way, rules that need dativa features (best matches,
+    lookalikes, uniqueness) raise a ValueError when the config is compiled.
+
+    Unlike dativa there is no limit on the number of records in a frame.
+
+    :param config: a scrubber config, see scrubber_config/scrubber_settings.py
+    """
+
+    rule_types = {"Number": _NumberRule,
+                  "Date": _DateRule}
+
+    def __init__(self, config):
+        self.rules = []
+        for rule in config["rules"]:
+            if rule.get("rule_type") not in self.rule_types:
+                raise ValueError("{} rules are not supported by the vectorized scrubber".format(rule.get("rule_type")))
+            if rule.get("append_results"):
+                raise ValueError("append_results is not supported by the vectorized scrubber")
+            self.rules.append(self.rule_types[rule["rule_type"]](rule["field"], rule["params"]))
+
+    def run(self, df):
+        """
+        Cleans a DataFrame in place
+        :return: list of ReportEntry
+        """
+        report = []
+        for rule in self.rules:
+            if df.shape[0] > 0:
+                rule.run(df, report)
+        return report
@@ -1,8 +1,6 @@
 import os
-import logging
+import cProfile
 import configargparse as argparse
-from newtools import log_to_stdout
-from ingest import IngestClass
 
 parser = argparse.ArgumentParser(description="""Ingests for a given TV, validates data, creates DB + table, 
                                  then partitions cleaned data by day and tv_type""",
@@ -10,7 +8,9 @@ parser = argparse.ArgumentParser(description="""Ingests for a given TV, validate
                                  add_config_file_help=False,
                                  add_env_var_help=False,)
 
-parser.add_argument("-tv", "--tv_type", help='tv_type for running the function', required=True, type=str),
+parser.add_argument("-tv", "--tv_type", help='tv_type for running the function, a comma separated list of tv types '
+                                             'or all, each delivery is read once for all of them', required=True,
+                    type=str),
 
 parser.add_argument("-so", "--source_bucket", help='source_bucket for running the function', required=True, type=str),
 
@@ -21,12 +21,136 @@ parser.add_argument("-p", "--aws_profile", help="AWS credentials", required=True
 
 parser.add_argument("-db", "--database", help="the database you want to use", default="ingest", type=str),
 
-parser.add_argument("-t", "--table", help="the table you want to use", required=True, type=str),
+parser.add_argument("-t", "--table", help="the table you want to use, may contain {tv_type} when running for more "
+                                          "than one tv type", required=True, type=str),
 
 parser.add_argument("-r", "--region", help="the region you want to use", default="us-east-1", type=str),
 
+parser.add_argument("-m", "--manifest", help="local path or s3 location of the processed-object manifest, "
+                                             "defaults to _manifests/ in the destination bucket", default=None,
+                    type=str),
+
+parser.add_argument("--start-date", help="first delivery day to ingest, YYYYMMDD or YYYY-MM-DD, "
+                                         "defaults to 2500 days before the end date", default=None, type=str),
+
+parser.add_argument("--end-date", help="last delivery day to ingest, YYYYMMDD or YYYY-MM-DD, defaults to today",
+                    default=None, type=str),
+
+parser.add_argument("--list-workers", help="number of day prefixes to list concurrently", default=8, type=int),
+
+parser.add_argument("--pipelined", help="overlap S3 reads/writes and cleaning across deliveries",
+                    action="store_true"),
+
+parser.add_argument("--io-workers", help="threads for S3 reads and writes in pipelined mode", default=8, type=int),
+
+parser.add_argument("--cpu-workers", help="processes for parsing and scrubbing in pipelined mode, "
+                                          "defaults to the number of cpus", default=None, type=int),
+
+parser.add_argument("--max-in-flight-mb", help="cap on the delivery bytes in flight in pipelined mode", default=256,
+                    type=int),
+
+parser.add_argument("--async-io", help="read and write the deliveries with coroutines over one shared connection "
+                                       "pool instead of threads, hundreds can be in flight", action="store_true",
+                    dest="async_io"),
+
+parser.add_argument("--max-pool-connections", help="size of the connection pool of --async-io, also the cap on the "
+                                                   "deliveries in flight", default=128, type=int),
+
+parser.add_argument("--source-cache", help="local folder to keep the deliveries read in, by ETag, so later runs on "
+                                           "this machine don't download them again", default=None, type=str),
+
+parser.add_argument("--source-cache-max-gb", help="size cap of --source-cache, the least recently used deliveries are "
+                                                  "evicted beyond it", default=10, type=float),
+
+parser.add_argument("--chunk-size", help="stream deliveries this many rows at a time instead of loading them whole, "
+                                         "bounds memory regardless of the delivery size", default=None, type=int),
+
+parser.add_argument("--stage-intermediary", help="write cleaned files to the intermediary bucket and copy them to "
+                                                 "the output, instead of writing the day= partition directly",
+                    action="store_true", dest="stage_intermediary"),
+
+parser.add_argument("--output-format", help="format of the cleaned files", default="csv",
+                    choices=["csv", "parquet"]),
+
+parser.add_argument("--compression", help="compression codec of the output files, parquet defaults to snappy and csv "
+                                          "is not compressed by default, csv can be written with gzip or zstd",
+                    default=None, choices=["snappy", "zstd", "gzip"]),
+
+parser.add_argument("--compression-level", help="level of the --compression codec, 1-9 for gzip and 1-22 for zstd, "
+                                                "defaults to the codec's default", default=None, type=int),
+
+parser.add_argument("--scrubber-engine", help="run the scrubber config with dativa, or compiled into vectorized "
+                                              "column operations", default="dativa", choices=["dativa", "vectorized"]),
+
+parser.add_argument("--loader", help="parse every column of the deliveries and infer its type, or only the columns of "
+                                     "scrubber_config/input_schema.py as its types, with pyarrow and only the records "
+                                     "of the tv types", default="infer", choices=["infer", "schema"]),
+
+parser.add_argument("--reconcile-partitions", help="list the whole output prefix and add every partition missing from "
+                                                   "athena, not just the days written by this run",
+                    action="store_true", dest="reconcile_partitions"),
+
+parser.add_argument("--dedup-deliveries", help="skip deliveries with the same content as one already ingested, "
+                                               "from their ETag", action="store_true", dest="dedup_deliveries"),
+
+parser.add_argument("--dedup-rows", help="drop rows already written to the same day= partition by another delivery",
+                    action="store_true", dest="dedup_rows"),
+
+parser.add_argument("--dedup-location", help="local path or s3 location of the dedup index, defaults to _dedup/ in "
+                                             "the destination bucket", default=None, type=str),
+
+parser.add_argument("--ddl-cache", help="local path or s3 location of the cache of the DDL already run, defaults "
+                                        "to _manifests/ in the destination bucket", default=None, type=str),
+
+parser.add_argument("--refresh-ddl", help="send the CREATE DATABASE and CREATE TABLE statements even if the DDL cache "
+                                          "has them", action="store_true", dest="refresh_ddl"),
+
+parser.add_argument("--athena-max-queries", help="athena queries run at a time, eg. the partition batches",
+                    default=3, type=int),
+
+parser.add_argument("--shard-index", help="the shard of a backfill this process runs, 0 to --shard-count - 1",
+                    default=None, type=int),
+
+parser.add_argument("--shard-count", help="number of shards the deliveries of the date window are split into, each "
+                                          "run as its own process or node", default=1, type=int),
+
+parser.add_argument("--shard-strategy", help="assign days to shards by a hash of the day, or balance their size",
+                    default="day", choices=["day", "size"]),
+
+parser.add_argument("--shard-location", help="local path or s3 location of the shard records and manifests, "
+                                             "defaults to _shards/ in the destination bucket", default=None, type=str),
+
+parser.add_argument("--coordinate", help="once every shard is done, add the partitions they wrote and merge their "
+                                         "manifests, instead of ingesting", action="store_true"),
+
+parser.add_argument("--quarantine", help="copy the records the scrubber rules default, remove or let through invalid "
+                                         "to a quarantine table, tagged with their delivery, rule and original value",
+                    action="store_true"),
+
+parser.add_argument("--quarantine-location", help="s3 location of the quarantine table, defaults to quarantine/ in the "
+                                                  "destination bucket", default=None, type=str),
+
+parser.add_argument("--quarantine-table", help="the quarantine table", default="quarantine", type=str),
+
+parser.add_argument("--quarantine-max-rows", help="rejected rows buffered for a day before they are written",
+                    default=500000, type=int),
+
+parser.add_argument("--metrics-file", help="write the metrics of the run, and of each delivery, to this JSON file",
+                    default=None, type=str),
+
+parser.add_argument("--profile", help="write a cProfile dump of the run to this file, read it with pstats. Only the "
+                                      "main process is profiled, not the --cpu-workers", default=None, type=str),
+
+parser.add_argument("--full-refresh", help="reprocess every delivery, ignoring the manifest", action="store_true",
+                    dest="full_refresh"),
+
 args = vars(parser.parse_args())
 os.environ['AWS_PROFILE'] = args["aws_profile"]
+
+# imported once the arguments are parsed, so --help and argument errors don't wait for it
+from ingest import IngestClass  # noqa: E402
+from ingest_utils.metrics import JsonFileSink  # noqa: E402
+
 ingest = IngestClass(
     region=args['aws_profile'],
     tv_type=args['tv_type'],
@@ -34,6 +158,48 @@ ingest = IngestClass(
     source_bucket=args['source_bucket'],
     destination_bucket=args['destination_bucket'],
     table=args['table'],
+    manifest_location=args['manifest'],
+    full_refresh=args['full_refresh'],
+    start_date=args['start_date'],
+    end_date=args['end_date'],
+    list_workers=args['list_workers'],
+    pipelined=args['pipelined'],
+    io_workers=args['io_workers'],
+    cpu_workers=args['cpu_workers'],
+    max_in_flight_bytes=args['max_in_flight_mb'] * 1024 * 1024,
+    chunk_size=args['chunk_size'],
+    source_cache_dir=args['source_cache'],
+    source_cache_max_bytes=int(args['source_cache_max_gb'] * 1024 ** 3),
+    async_io=args['async_io'],
+    max_pool_connections=args['max_pool_connections'],
+    stage_intermediary=args['stage_intermediary'],
+    output_format=args['output_format'],
+    compression=args['compression'],
+    compression_level=args['compression_level'],
+    scrubber_engine=args['scrubber_engine'],
+    loader=args['loader'],
+    reconcile_partitions=args['reconcile_partitions'],
+    dedup_deliveries=args['dedup_deliveries'],
+    dedup_rows=args['dedup_rows'],
+    dedup_location=args['dedup_location'],
+    ddl_cache_location=args['ddl_cache'],
+    refresh_ddl=args['refresh_ddl'],
+    athena_max_queries=args['athena_max_queries'],
+    shard_index=args['shard_index'],
+    shard_count=args['shard_count'],
+    shard_strategy=args['shard_strategy'],
+    shard_location=args['shard_location'],
+    quarantine=args['quarantine'],
+    quarantine_location=args['quarantine_location'],
+    quarantine_table=args['quarantine_table'],
+    quarantine_max_rows=args['quarantine_max_rows'],
+    metrics_sink=JsonFileSink(args['metrics_file']) if args['metrics_file'] else None,
 )
-log_to_stdout("toms ingest", logging.DEBUG)
-ingest.ingest()
\ No newline at end of file
+if args['coordinate']:
+    ingest.coordinate()
+elif args['profile']:
+    profiler = cProfile.Profile()
+    profiler.runcall(ingest.ingest)
+    profiler.dump_stats(args['profile'])
+else:
+    ingest.ingest()
\ No newline at end of file
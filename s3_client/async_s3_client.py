@@ -0,0 +1,145 @@
+import logging
+
+from s3_client.s3_client import S3Location, TransferStats
+
+logger = logging.getLogger("dativa.tools.aws.s3_lib")
+
+DEFAULT_MAX_POOL_CONNECTIONS = 128
+
+
+class AsyncS3Client:
+    """
+    Coroutines to list, get, put, copy and delete objects over a single aiobotocore client. Every call shares
+    the client's connection pool, of max_pool_connections connections, calls beyond that wait on the pool
+    for a connection, so hundreds of object operations can be in flight from one thread without a thread for
+    each of them.
+
+    The client is created on the running event loop when the AsyncS3Client is entered and closed when it is
+    left, it can be entered again on another loop afterwards:
+
+        async with AsyncS3Client(max_pool_connections=256) as s3:
+            bodies = await asyncio.gather(*(s3.get(path) for path in paths))
+
+    :param client: pre initialised aiobotocore s3 client, it is not closed on exit
+    :param max_pool_connections: size of the connection pool shared by all the calls
+    :param region_name: region of the client that is created
+    :param metrics: optional ingest_utils.metrics.Metrics, the calls are counted in it under 'requests' by
+        operation, like the ones made through a CountingClient
+    """
+
+    def __init__(self, client=None, max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS, region_name=None,
+                 metrics=None):
+        self.max_pool_connections = max_pool_connections
+        self.region_name = region_name
+        self.metrics = metrics
+        self._given_client = client
+        self._client = client
+        self._context = None
+
+    async def __aenter__(self):
+        if self._given_client is None:
+            # aiobotocore, and aiohttp below it, take a while to import, so only when the client is first used
+            try:
+                from aiobotocore.config import AioConfig
+                from aiobotocore.session import get_session
+            except ImportError:
+                raise ImportError("aiobotocore must be installed to run AsyncS3Client")
+            self._context = get_session().create_client(
+                's3', region_name=self.region_name, config=AioConfig(max_pool_connections=self.max_pool_connections))
+            self._client = await self._context.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._context is not None:
+            context, self._context, self._client = self._context, None, None
+            await context.__aexit__(*exc)
+
+    @property
+    def client(self):
+        if self._client is None:
+            raise RuntimeError("AsyncS3Client must be entered with `async with` before it is used")
+        return self._client
+
+    def _count(self, operation):
+        if self.metrics is not None:
+            self.metrics.add({'requests': {operation: 1}})
+
+    async def list(self, path, suffix=None):
+        """
+        Lists the objects below a location
+        :return: list of dicts with key, last_modified, size and etag, like `S3Client.list_dict`
+        """
+        loc = S3Location(path)
+        kwargs = {'Bucket': loc.bucket, 'Prefix': loc.path if loc.path else ""}
+        records = []
+        while True:
+            self._count('list_objects_v2')
+            response = await self.client.list_objects_v2(**kwargs)
+            for key in response.get('Contents', []):
+                if not suffix or key['Key'].endswith(suffix):
+                    records.append({'key': key['Key'],
+                                    'last_modified': key['LastModified'],
+                                    'size': key['Size'],
+                                    'etag': key.get('ETag', '').strip('"')})
+            if response.get('IsTruncated') and 'NextContinuationToken' in response:
+                kwargs['ContinuationToken'] = response['NextContinuationToken']
+            else:
+                return records
+
+    async def get(self, path):
+        """
+        :return: the content of an object as bytes
+        """
+        loc = S3Location(path)
+        self._count('get_object')
+        response = await self.client.get_object(Bucket=loc.bucket, Key=loc.key)
+        body = response['Body']
+        try:
+            return await body.read()
+        finally:
+            body.close()
+
+    async def put(self, path, body):
+        """
+        Writes an object with a single PUT, up to 5GB
+        """
+        loc = S3Location(path)
+        self._count('put_object')
+        await self.client.put_object(Bucket=loc.bucket, Key=loc.key, Body=body)
+
+    async def copy(self, source, destination):
+        """
+        Copies an object within S3 with a single CopyObject, up to 5GB
+        """
+        source, destination = S3Location(source), S3Location(destination)
+        self._count('copy_object')
+        await self.client.copy_object(Bucket=destination.bucket, Key=destination.key,
+                                      CopySource={'Bucket': source.bucket, 'Key': source.key})
+
+    async def delete(self, path, suffix=""):
+        """
+        Deletes the objects below a location, in batches of 1000 keys that are all sent at once
+        :return: TransferStats, keys S3 could not delete are in its errors
+        """
+        import asyncio
+
+        loc = S3Location(path)
+        stats = TransferStats("delete")
+        keys = [{'Key': obj['key']} for obj in await self.list(path, suffix)]
+        batches = [keys[i:i + 1000] for i in range(0, len(keys), 1000)]
+
+        async def _delete(batch):
+            self._count('delete_objects')
+            return await self.client.delete_objects(Bucket=loc.bucket, Delete={"Objects": batch, "Quiet": True})
+
+        for batch, response in zip(batches, await asyncio.gather(*map(_delete, batches), return_exceptions=True)):
+            if isinstance(response, Exception):
+                errors = [{'Key': key['Key'], 'Code': type(response).__name__, 'Message': str(response)}
+                          for key in batch]
+            else:
+                errors = response.get('Errors', [])
+            for error in errors:
+                stats.fail(error['Key'], "{0}: {1}".format(error.get('Code'), error.get('Message')))
+            for _ in range(len(batch) - len(errors)):
+                stats.add()
+        return stats.finish()
@@ -1,15 +1,24 @@
 import logging
 import fnmatch
+import heapq
 import os
+import re
+import time
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from urllib import parse
 
-try:
-    import boto3
-except ImportError:
-    boto3 = None
-
 logger = logging.getLogger("dativa.tools.aws.s3_lib")
 
+# s3:// urls that urlparse returns unchanged: a lower case bucket and a key without query, fragment, params or
+# white space. These are split directly, anything else goes through urlparse
+_SIMPLE_S3_URL = re.compile(r"s3://([a-z0-9][a-z0-9._-]*)(?:/([^?#;\s\x00-\x1f]*))?\Z")
+_SIMPLE_KEY_PART = re.compile(r"[^?#;\s\x00-\x1f]*\Z")
+
+# compact record of a listed object, a tuple so a million of them cost far less than a million dicts
+S3Object = namedtuple('S3Object', ['key', 'last_modified', 'size', 'etag'])
+
 
 class S3Location(str):
     """
@@ -40,19 +49,27 @@ class S3Location(str):
         if s3_str is None:
             s3_str = cls._from_kwargs(bucket, key)
 
-        validated_string = cls._validate(s3_str, ignore_double_slash)
+        if cls is S3Location:
+            return _intern_location(s3_str, ignore_double_slash)
 
-        instance = super(S3Location, cls).__new__(cls, validated_string)
+        return cls._from_parts(*cls._parse(s3_str, ignore_double_slash))
 
+    @classmethod
+    def _from_parts(cls, bucket, key, simple=False):
+        """
+        Internal constructor for a bucket and key that are already validated
+        :param simple: the location is a plain s3:// url that urlparse would not change, see join
+        """
+        instance = super(S3Location, cls).__new__(cls, "s3://" + bucket + "/" + key)
+        instance._bucket = bucket
+        instance._key = key
+        instance._simple = simple
         return instance
 
     def __init__(self, *args, **kwargs):
-
+        # the bucket and key are set by __new__
         super().__init__()
 
-        self._bucket = self.split('/')[2]
-        self._key = '/'.join(self.split('/')[3:])
-
     @staticmethod
     def _from_kwargs(bucket=None, key=None):
 
@@ -63,7 +80,21 @@ class S3Location(str):
                                              path=key or '')
 
     @classmethod
-    def _validate(self, s3_str, ignore_double_slash=False):
+    def _validate(cls, s3_str, ignore_double_slash=False):
+        _bucket, _key, _ = cls._parse(s3_str, ignore_double_slash)
+        return "s3://{bucket}/{path}".format(bucket=_bucket, path=_key)
+
+    @staticmethod
+    def _parse(s3_str, ignore_double_slash=False):
+        """
+        Splits a location into its bucket and key, raising S3ClientError if it is not valid
+        :return: bucket, key and whether it is a plain s3:// url
+        """
+        match = _SIMPLE_S3_URL.match(s3_str) if isinstance(s3_str, str) else None
+        if match:
+            _bucket, _key = match.group(1), match.group(2) or ''
+            S3Location._check_double_slash(s3_str, _bucket, _key, ignore_double_slash)
+            return _bucket, _key, True
 
         result = parse.urlparse(s3_str)
 
@@ -101,16 +132,16 @@ class S3Location(str):
             raise S3ClientError("S3 URLs must be either s3://, http://, or https://, "
                                 "current val: {}".format(s3_str))
 
-        s3_path = "s3://{bucket}/{path}".format(bucket=_bucket,
-                                                path=_key or '')
+        _key = _key or ''
+        S3Location._check_double_slash(s3_str, _bucket, _key, ignore_double_slash)
 
-        if not ignore_double_slash:
-            if "//" in "{bucket}/{path}".format(bucket=_bucket,
-                                                path=_key or ''):
-                raise S3ClientError("S3 URLs cannot contains a // unless ignore_double_slash is set to True, "
-                                    "current val: {}".format(s3_str))
+        return _bucket, _key, _SIMPLE_S3_URL.match("s3://" + _bucket + "/" + _key) is not None
 
-        return s3_path
+    @staticmethod
+    def _check_double_slash(s3_str, bucket, key, ignore_double_slash):
+        if not ignore_double_slash and "//" in bucket + "/" + key:
+            raise S3ClientError("S3 URLs cannot contains a // unless ignore_double_slash is set to True, "
+                                "current val: {}".format(s3_str))
 
     @staticmethod
     def _coalesce_empty(s, n):
@@ -131,7 +162,7 @@ class S3Location(str):
     @property
     def key(self):
 
-        return self._coalesce_empty(self._key, None)
+        return self._key or None
 
     @property
     def path(self):
@@ -139,7 +170,7 @@ class S3Location(str):
 
     @property
     def bucket(self):
-        return self._coalesce_empty(self._bucket, None)
+        return self._bucket or None
 
     @property
     def s3_url(self):
@@ -161,6 +192,13 @@ class S3Location(str):
 
         to_join = '/'.join(other)
 
+        if self._simple and _SIMPLE_KEY_PART.match(to_join):
+            # the result is a plain s3:// url as well, so only the joined part needs checking
+            _key = self._key + to_join if self.endswith('/') else self._key + '/' + to_join
+            joined = S3Location._from_parts(self._bucket, _key, True)
+            self._check_double_slash(joined, self._bucket, _key, ignore_double_slash)
+            return joined
+
         if self.endswith('/'):
             joined = self.s3_url + to_join
         else:
@@ -172,7 +210,7 @@ class S3Location(str):
         return ('S3Location(\'{}\')'.format(self))
 
     def __eq__(self, other):
-        return self.s3_url == str(other)
+        return str.__eq__(self, str(other))
 
     def __contains__(self, item):
         return self.__str__().__contains__(item)
@@ -181,6 +219,65 @@ class S3Location(str):
         return hash(self.__str__())
 
 
+class TransferStats:
+    """
+    Outcome of a bulk operation: how many objects and bytes were handled, how fast, and the objects that failed
+
+    :param operation: name of the operation, used in the log line
+    """
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.objects = 0
+        self.bytes = 0
+        self.errors = dict()
+        self.seconds = 0.0
+        self._start = time.monotonic()
+
+    def add(self, size=0):
+        self.objects += 1
+        self.bytes += size
+
+    def fail(self, key, reason):
+        self.errors[key] = reason
+        logger.error("Failed to {0} {1}: {2}".format(self.operation, key, reason))
+
+    def finish(self):
+        self.seconds = time.monotonic() - self._start
+        logger.info(str(self))
+        return self
+
+    @property
+    def objects_per_second(self):
+        return self.objects / self.seconds if self.seconds else 0.0
+
+    @property
+    def mb_per_second(self):
+        return self.bytes / 1024 / 1024 / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {'operation': self.operation,
+                'objects': self.objects,
+                'bytes': self.bytes,
+                'errors': len(self.errors),
+                'seconds': round(self.seconds, 3),
+                'objects_per_second': round(self.objects_per_second, 1),
+                'mb_per_second': round(self.mb_per_second, 2)}
+
+    def __str__(self):
+        return "{operation}: {objects} objects, {bytes} bytes in {seconds}s ({objects_per_second} objects/s, " \
+               "{mb_per_second} MB/s), {errors} errors".format(**self.as_dict())
+
+
+@lru_cache(maxsize=4096)
+def _intern_location(s3_str, ignore_double_slash):
+    """
+    Locations by the string and flag they were created from, so repeated prefixes are parsed once and
+    share one instance
+    """
+    return S3Location._from_parts(*S3Location._parse(s3_str, ignore_double_slash))
+
+
 class S3ClientError(Exception):
     """
     A generic class for reporting errors in the athena client
@@ -191,16 +288,123 @@ class S3ClientError(Exception):
         self.reason = reason
 
 
+class PartitionAggregator:
+    """
+    Folds listed objects into the size, number of objects and last modified time of their partition, the first
+    folder of their key, the table, and its k=v folders. Folders without an = are named partition_{depth}.
+    Objects without a partition column of another object count as an empty string for it.
+    """
+
+    OBJECT_FIELDS = ('table', 'last_modified', 'size', 'key', 'file', 'etag')
+
+    def __init__(self):
+        self.columns = []
+        self._known = set()
+        self._partitions = dict()
+
+    @property
+    def output_columns(self):
+        return ['table'] + self.columns + ['size', 'key', 'last_modified']
+
+    def add(self, value):
+        """
+        :param value: a dict as returned by `S3Client.list_dict`, with the key relative to the tables
+        """
+        folders = value['key'].split('/')
+        value['table'] = folders[0]
+        value['file'] = folders[-1]
+        for i, partition in enumerate(folders[1:-1]):
+            if "=" in partition:
+                value[partition.split('=')[0]] = partition.split('=')[1]
+            else:
+                value['partition_{0}'.format(i)] = partition
+
+        partition = tuple((column, partition_value) for column, partition_value in value.items()
+                          if column not in self.OBJECT_FIELDS)
+        for column, _ in partition:
+            if column not in self._known:
+                self._known.add(column)
+                self.columns.append(column)
+        partition = (value['table'], partition)
+
+        totals = self._partitions.get(partition)
+        if totals is None:
+            self._partitions[partition] = [value['size'], 1, value['last_modified']]
+        else:
+            totals[0] += value['size']
+            totals[1] += 1
+            totals[2] = max(totals[2], value['last_modified'])
+
+    def rows(self):
+        """
+        Yields one dict per partition, sorted by table and partition values
+        """
+        merged = dict()
+        for (table, partition), (size, count, last_modified) in self._partitions.items():
+            values = dict(partition)
+            group = (table,) + tuple(values.get(column, "") for column in self.columns)
+            totals = merged.get(group)
+            if totals is None:
+                merged[group] = [size, count, last_modified]
+            else:
+                totals[0] += size
+                totals[1] += count
+                totals[2] = max(totals[2], last_modified)
+
+        for group in sorted(merged):
+            size, count, last_modified = merged[group]
+            row = dict(zip(['table'] + self.columns, group))
+            row.update(size=size, key=count, last_modified=last_modified)
+            yield row
+
+
 class S3Client:
     """
     Class that provides easy access over boto s3 client
-    """
 
-    def __init__(self, boto3_client=None):
-        if not boto3:
-            raise ImportError("boto3 must be installed to run S3Client")
+    :param boto3_client: pre initialised boto3 s3 client
+    :param transfer_config: boto3.s3.transfer.TransferConfig used by the folder uploads and downloads, eg.
+        TransferConfig(multipart_chunksize=16 * 1024 * 1024, max_concurrency=4) for the chunk size and the
+        threads used for each multipart transfer
+    :param max_workers: number of objects the bulk operations work on at the same time
+    """
 
-        self.s3_client = boto3_client if boto3_client else boto3.client(service_name='s3')
+    def __init__(self, boto3_client=None, transfer_config=None, max_workers=16):
+        if not boto3_client:
+            # boto3 takes a while to import, only when a client has to be created
+            try:
+                import boto3
+            except ImportError:
+                raise ImportError("boto3 must be installed to run S3Client")
+            boto3_client = boto3.client(service_name='s3')
+        self.s3_client = boto3_client
+        self.transfer_config = transfer_config
+        self.max_workers = max_workers
+
+    def _transfer_kwargs(self):
+        return {'Config': self.transfer_config} if self.transfer_config is not None else {}
+
+    def _run_all(self, stats, func, items, raise_on_error=False):
+        """
+        Runs func(item) for every (key, size, item) concurrently, recording each outcome in stats
+        :param raise_on_error: raise the first error once the items already started are done, the items not
+            started yet are cancelled
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(func, item): (key, size) for key, size, item in items}
+            for future in as_completed(futures):
+                key, size = futures[future]
+                try:
+                    future.result()
+                    stats.add(size)
+                except Exception as e:
+                    stats.fail(key, repr(e))
+                    if raise_on_error:
+                        for pending in futures:
+                            pending.cancel()
+                        stats.finish()
+                        raise
+        return stats.finish()
 
     def _files_within(self, directory_path, pattern):
         """
@@ -210,62 +414,122 @@ class S3Client:
             for file_name in fnmatch.filter(filenames, pattern):
                 yield os.path.join(dirpath, file_name)
 
-    def put_folder(self, source, bucket, destination="", file_format="*"):
-        """
-        Copies files from a directory on local system to s3
-+        :param source: Folder on local filesystem that must be copied to s3
-+        :param bucket: s3 bucket in which files have to be copied
-+        :param destination: Location on s3 bucket to which files have to be copied
-+        :param file_format: pattern for files to be transferred
-+        :return: None
-        """
-        if os.path.isdir(source):
-            file_list = list(self._files_within(source, file_format))
-            for each_file in file_list:
-                part_key = os.path.relpath(each_file, source)
-                key = os.path.join(destination, part_key)
-                self.s3_client.upload_file(each_file, bucket, key)
-        else:
+    def put_folder(self, source, bucket, destination="", file_format="*", raise_on_error=True):
+        """
+        Copies files from a directory on local system to s3, max_workers files at a time
+        :param source: Folder on local filesystem that must be copied to s3
+        :param bucket: s3 bucket in which files have to be copied
+        :param destination: Location on s3 bucket to which files have to be copied
+        :param file_format: pattern for files to be transferred
+        :param raise_on_error: raise the first failed upload, as put_folder always has. False uploads the other
+            files anyway and reports the failures in the errors of the TransferStats
+        :return: TransferStats
+        """
+        if not os.path.isdir(source):
             raise S3ClientError("Source must be a valid directory path")
 
+        def _upload(args):
+            each_file, key = args
+            self.s3_client.upload_file(each_file, bucket, key, **self._transfer_kwargs())
+
+        items = []
+        for each_file in self._files_within(source, file_format):
+            key = os.path.join(destination, os.path.relpath(each_file, source))
+            items.append((key, os.path.getsize(each_file), (each_file, key)))
+        return self._run_all(TransferStats("upload"), _upload, items, raise_on_error)
+
+    def get_folder(self, path, destination, suffix=None, raise_on_error=True):
+        """
+        Copies the files below an s3 location to a directory on local system, max_workers files at a time
+        :param path: S3 location to copy
+        :param destination: Folder on local filesystem, the keys below path become its sub folders
+        :param suffix: Suffix filter for files on S3
+        :param raise_on_error: raise the first failed download, as get_folder always has. False downloads the
+            other files anyway and reports the failures in the errors of the TransferStats
+        :return: TransferStats
+        """
+        loc = S3Location(path)
+
+        def _download(args):
+            key, file_name = args
+            os.makedirs(os.path.dirname(file_name), exist_ok=True)
+            self.s3_client.download_file(loc.bucket, key, file_name, **self._transfer_kwargs())
+
+        items = []
+        for obj in self.list_parallel(path, suffix, max_workers=self.max_workers, compact=True):
+            relative = obj.key[len(loc.path or ""):].lstrip("/")
+            items.append((obj.key, obj.size, (obj.key, os.path.join(destination, *relative.split("/")))))
+        return self._run_all(TransferStats("download"), _download, items, raise_on_error)
+
     def _generate_keys(self, bucket, prefix, suffix="", start_after=None):
 
-        if start_after is None:
-            s3_objects = self.s3_client.list_objects_v2(Bucket=bucket,
-                                                        Prefix=prefix,
-                                                        MaxKeys=1000)
-        else:
-            s3_objects = self.s3_client.list_objects_v2(Bucket=bucket,
-                                                        Prefix=prefix,
-                                                        MaxKeys=1000,
-                                                        StartAfter=start_after)
+        kwargs = {'Bucket': bucket, 'Prefix': prefix, 'MaxKeys': 1000}
+        while True:
+            if start_after is not None:
+                kwargs['StartAfter'] = start_after
+            s3_objects = self.s3_client.list_objects_v2(**kwargs)
 
-        if 'Contents' in s3_objects:
+            if 'Contents' not in s3_objects:
+                break
             for key in s3_objects["Contents"]:
                 if key['Key'].endswith(suffix):
                     yield key['Key']
 
             # get the next keys
-            yield from self._generate_keys(bucket, prefix, suffix, s3_objects["Contents"][-1]['Key'])
+            start_after = s3_objects["Contents"][-1]['Key']
 
-    def delete_files(self, bucket, prefix, suffix=""):
-        return self.delete("s3://{0}/{1}".format(bucket, prefix), suffix)
+    def delete_files(self, bucket, prefix, suffix="", raise_on_error=True):
+        return self.delete("s3://{0}/{1}".format(bucket, prefix), suffix, raise_on_error)
 
-    def delete(self, path, suffix=""):
+    def delete(self, path, suffix="", raise_on_error=True):
+        """
+        Deletes the files below an s3 location. Batches of 1000 keys are deleted while the next batches are
+        still being listed, with up to max_workers batches in flight
+        :param raise_on_error: raise the first batch whose delete_objects call failed, as delete always has, the
+            batches not sent yet are cancelled. False deletes the other batches anyway. Either way the keys S3
+            reported it could not delete are in the errors of the TransferStats
+        :return: TransferStats
+        """
         loc = S3Location(path)
-        keys = []
-        for key in self._generate_keys(loc.bucket, loc.path, suffix):
-            keys.append({'Key': key})
-            if len(keys) == 1000:
-                logger.info("Deleting {0} files in {1}".format(len(keys), loc.s3_url))
-                self.s3_client.delete_objects(Bucket=loc.bucket,
-                                              Delete={"Objects": keys})
-                keys = []
-
-        if len(keys) > 0:
+        stats = TransferStats("delete")
+        in_flight = deque()
+
+        def _delete(keys):
             logger.info("Deleting {0} files in {1}".format(len(keys), loc.s3_url))
-            self.s3_client.delete_objects(Bucket=loc.bucket,
-                                          Delete={"Objects": keys})
+            return self.s3_client.delete_objects(Bucket=loc.bucket, Delete={"Objects": keys, "Quiet": True})
+
+        def _collect(future, keys):
+            try:
+                errors = future.result().get('Errors', [])
+            except Exception as e:
+                for key in keys:
+                    stats.fail(key['Key'], repr(e))
+                if raise_on_error:
+                    for pending, _ in in_flight:
+                        pending.cancel()
+                    stats.finish()
+                    raise
+                return
+            for error in errors:
+                stats.fail(error['Key'], "{0}: {1}".format(error.get('Code'), error.get('Message')))
+            for _ in range(len(keys) - len(errors)):
+                stats.add()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            keys = []
+            for key in self._generate_keys(loc.bucket, loc.path, suffix):
+                keys.append({'Key': key})
+                if len(keys) == 1000:
+                    in_flight.append((executor.submit(_delete, keys), keys))
+                    keys = []
+                    if len(in_flight) >= self.max_workers:
+                        _collect(*in_flight.popleft())
+
+            if len(keys) > 0:
+                in_flight.append((executor.submit(_delete, keys), keys))
+            while in_flight:
+                _collect(*in_flight.popleft())
+        return stats.finish()
 
     def list_files(self, bucket, prefix="", suffix=None, remove_prefix=False):
         return self.list("s3://{0}/{1}".format(bucket, prefix), suffix, remove_prefix)
@@ -294,7 +558,8 @@ class S3Client:
                         yield {
                             'key': key['Key'].replace(loc.path, '') if loc.path and remove_prefix else key['Key'],
                             'last_modified': key['LastModified'],
-                            'size': key['Size']
+                            'size': key['Size'],
+                            'etag': key.get('ETag', '').strip('"')
                         }
 
                 # Do we need to carry on?
@@ -307,31 +572,159 @@ class S3Client:
             else:
                 break
 
-    def get_partitions(self, path):
+    def list_folders(self, path, delimiter="/", remove_prefix=False):
+        """
+            Return the common prefixes (folders) directly below a path. Uses a delimiter listing,
+            so the objects inside the folders are never listed
 
-        s3_path = S3Location(path)
+            ## Parameters
+            - path: S3 location to list the folders of
+            - delimiter: character that separates folders
+            - remove_prefix: return the folders relative to path
+        """
 
-        files = list()
+        loc = S3Location(path)
+        prefix = loc.path if loc.path else ""
+        if prefix and not prefix.endswith(delimiter):
+            prefix = prefix + delimiter
 
-        for value in self.list_dict(s3_path):
-            folders = value['key'].split('/')
-            value['table'] = folders[0]
-            value['file'] = folders[-1]
-            for i, partition in enumerate(folders[1:-1]):
-                if "=" in partition:
-                    value[partition.split('=')[0]] = partition.split('=')[1]
-                else:
-                    value['partition_{0}'.format(i)] = partition
+        kwargs = {'Bucket': loc.bucket, 'Prefix': prefix, 'Delimiter': delimiter}
+        while True:
+            response = self.s3_client.list_objects_v2(**kwargs)
+            for common_prefix in response.get('CommonPrefixes', []):
+                folder = common_prefix['Prefix']
+                yield folder[len(prefix):] if remove_prefix else folder
 
-            files.append(value)
+            if response.get('IsTruncated') and 'NextContinuationToken' in response:
+                kwargs['ContinuationToken'] = response['NextContinuationToken']
+            else:
+                break
+
+    @staticmethod
+    def _record(key, strip, compact):
+        name = key['Key'][len(strip):] if strip else key['Key']
+        etag = key.get('ETag', '').strip('"')
+        if compact:
+            return S3Object(name, key['LastModified'], key['Size'], etag)
+        return {'key': name, 'last_modified': key['LastModified'], 'size': key['Size'], 'etag': etag}
+
+    def _list_prefix(self, bucket, prefix, suffix=None, strip="", compact=False):
+        """
+        Pages through a single prefix, one request after another
+        :return: list of the records of the objects, in key order
+        """
+        records = []
+        kwargs = {'Bucket': bucket, 'Prefix': prefix}
+        while True:
+            response = self.s3_client.list_objects_v2(**kwargs)
+            for key in response.get('Contents', []):
+                if not suffix or key['Key'].endswith(suffix):
+                    records.append(self._record(key, strip, compact))
+            if response.get('IsTruncated') and 'NextContinuationToken' in response:
+                kwargs['ContinuationToken'] = response['NextContinuationToken']
+            else:
+                return records
 
+    def _split(self, bucket, prefix, delimiter, suffix, strip, compact):
+        """
+        Lists the level directly below a prefix with a delimiter
+        :return: the sub-prefixes and the records of the objects that are not in any of them
+        """
+        folders, records = [], []
+        kwargs = {'Bucket': bucket, 'Prefix': prefix, 'Delimiter': delimiter}
+        while True:
+            response = self.s3_client.list_objects_v2(**kwargs)
+            folders.extend(common_prefix['Prefix'] for common_prefix in response.get('CommonPrefixes', []))
+            for key in response.get('Contents', []):
+                if not suffix or key['Key'].endswith(suffix):
+                    records.append(self._record(key, strip, compact))
+            if response.get('IsTruncated') and 'NextContinuationToken' in response:
+                kwargs['ContinuationToken'] = response['NextContinuationToken']
+            else:
+                return folders, records
+
+    def list_parallel(self, path, suffix=None, remove_prefix=False, prefixes=None, delimiter="/", max_workers=8,
+                      sort=False, compact=False):
+        """
+            Lists the objects below a path by splitting it into sub-prefixes and paging through them
+            concurrently. Results are yielded as each sub-prefix finishes, or in key order with sort
+
+            ## Parameters
+            - path: S3 location to list
+            - suffix: Suffix filter for files on S3
+            - remove_prefix: return the keys relative to path
+            - prefixes: sub-prefixes of path to list, eg. known day prefixes 'YYYYMMDD/'. By default path is
+              split by delimiter, listing the objects directly below it as well
+            - delimiter: character that separates folders when splitting path
+            - max_workers: number of sub-prefixes listed at the same time
+            - sort: yield the objects in key order, which holds back every sub-prefix until the ones before it
+              have been listed
+            - compact: yield S3Object tuples instead of dicts
+        """
+
+        loc = S3Location(path)
+        prefix = loc.path if loc.path else ""
+        if prefix and not prefix.endswith(delimiter):
+            prefix = prefix + delimiter
+        strip = prefix if remove_prefix else ""
+
+        if prefixes is None:
+            sub_prefixes, top_level = self._split(loc.bucket, prefix, delimiter, suffix, strip, compact)
+        else:
+            sub_prefixes, top_level = sorted(prefix + sub_prefix for sub_prefix in prefixes), []
+        logger.info("Listing {0} sub-prefixes of {1}".format(len(sub_prefixes), loc.s3_url))
+
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        futures = []
+        try:
+            futures = [executor.submit(self._list_prefix, loc.bucket, sub_prefix, suffix, strip, compact)
+                       for sub_prefix in sub_prefixes]
+            if sort:
+                # sub-prefixes that end in the delimiter never overlap, so their key ranges are in prefix order
+                listed = (record for future in futures for record in future.result())
+                key = (lambda record: record.key) if compact else (lambda record: record['key'])
+                yield from heapq.merge(top_level, listed, key=key)
+            else:
+                yield from top_level
+                for future in as_completed(futures):
+                    yield from future.result()
+        finally:
+            # a consumer that stops early does not wait for the sub-prefixes nobody started on. Cancelled by hand,
+            # shutdown(cancel_futures=True) needs python 3.9
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def iter_partitions(self, path):
+        """
+            Yields the size, number of objects and last modified time of each partition below a path, as dicts
+            with the same fields and in the same order as the rows of get_partitions, without needing pandas
+
+            ## Parameters
+            - path: S3 location of the tables, eg. the output location of an ingest
+        """
+        return self._aggregate_partitions(path).rows()
+
+    def _aggregate_partitions(self, path):
+        aggregator = PartitionAggregator()
+        for value in self.list_dict(S3Location(path)):
+            aggregator.add(value)
+        return aggregator
+
+    def get_partitions(self, path):
+        """
+            Returns a DataFrame with the size, number of objects (key) and last modified time of each partition
+            below a path, one column for the table, the first folder, and one for each k=v folder. Objects are
+            folded into their partition as they are listed, so memory grows with the number of partitions
+            rather than the number of objects
+
+            ## Parameters
+            - path: S3 location of the tables, eg. the output location of an ingest
+        """
         try:
             import pandas as pd
         except ImportError:
             raise ImportError("Pandas must be installed to call get_partitions")
 
-        df = pd.DataFrame.from_dict(files)
-
-        return df.fillna("").groupby(['table'] + [a for a in df.columns.tolist() if
-                                                  a not in ['table', 'last_modified', 'size', 'key', 'file']]).agg(
-            {'size': 'sum', 'key': 'count', 'last_modified': 'max'}).reset_index()
\ No newline at end of file
+        aggregator = self._aggregate_partitions(path)
+        return pd.DataFrame(list(aggregator.rows()), columns=aggregator.output_columns)
\ No newline at end of file
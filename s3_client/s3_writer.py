@@ -0,0 +1,93 @@
+import logging
+from io import BytesIO
+
+from s3_client.s3_client import S3Location
+
+logger = logging.getLogger("dativa.tools.aws.s3_lib")
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class S3StreamWriter:
+    """
+    File like object that writes to an S3 location as data arrives, so the whole object never has to be
+    held in memory. Small objects are written with a single PUT, once more than `part_size` bytes have been
+    written the data is sent as a multipart upload. The object only appears in S3 when the writer is closed,
+    an exception inside a `with` block aborts the upload.
+
+    :param s3_client: boto3 s3 client
+    :param path: S3 location to write to
+    :param part_size: bytes buffered per part, S3 requires at least 5MB for all but the last part
+    """
+
+    def __init__(self, s3_client, path, part_size=8 * 1024 * 1024):
+        self.s3_client = s3_client
+        self.location = S3Location(path)
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.bytes_written = 0
+        self.closed = False
+        self._buffer = BytesIO()
+        self._upload_id = None
+        self._parts = []
+
+    def write(self, data):
+        self._buffer.write(data)
+        self.bytes_written += len(data)
+        if self._buffer.tell() >= self.part_size:
+            self._upload_part()
+        return len(data)
+
+    def tell(self):
+        return self.bytes_written
+
+    def flush(self):
+        pass
+
+    def writable(self):
+        return True
+
+    def _upload_part(self):
+        if self._upload_id is None:
+            self._upload_id = self.s3_client.create_multipart_upload(Bucket=self.location.bucket,
+                                                                     Key=self.location.key)['UploadId']
+        part_number = len(self._parts) + 1
+        response = self.s3_client.upload_part(Bucket=self.location.bucket,
+                                              Key=self.location.key,
+                                              UploadId=self._upload_id,
+                                              PartNumber=part_number,
+                                              Body=self._buffer.getvalue())
+        self._parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+        self._buffer = BytesIO()
+
+    def close(self):
+        if self.closed:
+            return
+        if self._upload_id is None:
+            self.s3_client.put_object(Bucket=self.location.bucket,
+                                      Key=self.location.key,
+                                      Body=self._buffer.getvalue())
+        else:
+            if self._buffer.tell():
+                self._upload_part()
+            self.s3_client.complete_multipart_upload(Bucket=self.location.bucket,
+                                                     Key=self.location.key,
+                                                     UploadId=self._upload_id,
+                                                     MultipartUpload={'Parts': self._parts})
+        self.closed = True
+
+    def abort(self):
+        if self._upload_id is not None:
+            logger.info("Aborting multipart upload to {}".format(self.location))
+            self.s3_client.abort_multipart_upload(Bucket=self.location.bucket,
+                                                  Key=self.location.key,
+                                                  UploadId=self._upload_id)
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,49 @@
+from scrubber_config.table_schema import table_columns
+
+# the delivery columns the ingest loads, in the order of table_columns, and the type each one is parsed as.
+# Every column is parsed as text, so the scrubber rules still see the values that were delivered, numbers are
+# converted once the brand frames are split. Columns with few distinct values in a delivery are categoricals, each
+# value is held once with a code per record
+input_schema = {"brand_column": "Brand",
+                "columns": [{"name": "Brand", "dtype": "category"},
+                            {"name": "Resolution", "dtype": "category"},
+                            {"name": "Size ", "dtype": "category"},
+                            {"name": "Selling Price", "dtype": "string"},
+                            {"name": "Original Price", "dtype": "string"},
+                            {"name": "Operating System", "dtype": "category"},
+                            {"name": "Rating", "dtype": "category"},
+                            {"name": "date", "dtype": "category"}]}
+
+DTYPES = ("string", "category")
+
+
+def usecols(schema=input_schema):
+    """
+    Returns the delivery columns that are loaded, the others are skipped as the file is parsed
+    """
+    return [column["name"] for column in schema["columns"]]
+
+
+def categorical_columns(schema=input_schema):
+    return [column["name"] for column in schema["columns"] if column["dtype"] == "category"]
+
+
+def dtypes(schema=input_schema):
+    """
+    Returns the read_csv dtype of each loaded column
+    """
+    return {column["name"]: "category" if column["dtype"] == "category" else str for column in schema["columns"]}
+
+
+def validate(schema=input_schema):
+    """
+    Raises a ValueError if the schema has an unknown dtype, or does not load the brand column or a table column
+    """
+    for column in schema["columns"]:
+        if column["dtype"] not in DTYPES:
+            raise ValueError("dtype of {} must be one of {}".format(column["name"], DTYPES))
+    missing = [column for column, _ in table_columns if column not in usecols(schema)]
+    if missing:
+        raise ValueError("input schema does not load the table columns {}".format(missing))
+    if schema["brand_column"] not in usecols(schema):
+        raise ValueError("input schema does not load the brand column {}".format(schema["brand_column"]))
@@ -0,0 +1,44 @@
+from scrubber_config.scrubber_settings import scrubber_config
+
+# delivery column -> table column, in the order of the columns in sql/create_table.sql
+table_columns = [("Brand", "brand"),
+                 ("Resolution", "resolution"),
+                 ("Size ", "size"),
+                 ("Selling Price", "selling_price"),
+                 ("Original Price", "oringinal_price"),
+                 ("Operating System", "os"),
+                 ("Rating", "rating"),
+                 ("date", "date")]
+
+# athena type of the columns checked by each scrubber rule type, the output is not rounded by the
+# scrubber so Number columns keep their decimals
+rule_types = {"Number": "double",
+              "Date": "date"}
+
+
+def column_types(config=scrubber_config):
+    """
+    Returns the athena type of each delivery column, from the type of the scrubber rule that checks it.
+    Columns without a rule are strings
+    :param config: the scrubber config
+    :return: dict of delivery column to athena type
+    """
+    by_field = {rule["field"].strip(): rule_types.get(rule["rule_type"], "string") for rule in config["rules"]}
+    return {column: by_field.get(column.strip(), "string") for column, _ in table_columns}
+
+
+def date_formats(config=scrubber_config):
+    """
+    Returns the date format of each delivery column checked by a Date rule
+    """
+    formats = {rule["field"].strip(): rule["params"]["date_format"] for rule in config["rules"]
+               if rule["rule_type"] == "Date"}
+    return {column: formats[column.strip()] for column, _ in table_columns if column.strip() in formats}
+
+
+def columns_ddl(config=scrubber_config):
+    """
+    Returns the column list of a CREATE TABLE statement for the typed table
+    """
+    types = column_types(config)
+    return ",\n".join("  `{}` {}".format(name, types[column]) for column, name in table_columns)
@@ -0,0 +1,15 @@
+CREATE EXTERNAL TABLE IF NOT EXISTS `{table}`(
+{columns})
+PARTITIONED BY (
+  `day` string)
+ROW FORMAT SERDE
+  'org.apache.hadoop.hive.serde2.OpenCSVSerde'
+WITH SERDEPROPERTIES (
+  'skip.header.line.count'='1')
+STORED AS INPUTFORMAT
+  'org.apache.hadoop.mapred.TextInputFormat'
+OUTPUTFORMAT
+  'org.apache.hadoop.hive.ql.io.HiveIgnoreKeyTextOutputFormat'
+LOCATION
+  '{location}'
+TBLPROPERTIES ('delimiter'=',', 'skip.header.line.count'='1')
\ No newline at end of file
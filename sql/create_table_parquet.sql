@@ -0,0 +1,8 @@
+CREATE EXTERNAL TABLE IF NOT EXISTS `{table}`(
+{columns})
+PARTITIONED BY (
+  `day` string)
+STORED AS PARQUET
+LOCATION
+  '{location}'
+TBLPROPERTIES ('parquet.compression'='{compression}')
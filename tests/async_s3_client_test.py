@@ -0,0 +1,85 @@
+import asyncio
+import tempfile
+import threading
+from unittest import TestCase
+
+from benchmarks.deliveries import load_deliveries
+from benchmarks.local_aws import LocalAsyncS3, LocalS3, local_ingest
+from ingest_utils.metrics import Metrics
+from s3_client.async_s3_client import AsyncS3Client
+
+
+def _outputs(s3):
+    return {key: body for (bucket, key), (body, _, _) in s3.objects.items() if bucket == 'out' and 'day=' in key}
+
+
+class TestAsyncS3Client(TestCase):
+
+    def test_operations(self):
+        s3, metrics = LocalS3(), Metrics()
+        for i in range(2500):
+            s3.put('raw', f'20220512/TV_{i}.csv', b'x' * i)
+
+        async def _run():
+            async with AsyncS3Client(LocalAsyncS3(s3), metrics=metrics) as client:
+                listed = await client.list('s3://raw/20220512/', suffix='.csv')
+                bodies = await asyncio.gather(*(client.get(f"s3://raw/{obj['key']}") for obj in listed[:10]))
+                await client.put('s3://out/a.csv', b'abc')
+                await client.copy('s3://out/a.csv', 's3://out/b.csv')
+                deleted = await client.delete('s3://raw/20220512/')
+                return listed, bodies, deleted
+
+        listed, bodies, deleted = asyncio.run(_run())
+        self.assertEqual(len(listed), 2500)
+        self.assertEqual([len(body) for body in bodies], [obj['size'] for obj in listed[:10]])
+        self.assertEqual(s3.objects[('out', 'b.csv')][0], b'abc')
+        self.assertEqual((deleted.objects, len(deleted.errors)), (2500, 0))
+        self.assertFalse([key for bucket, key in s3.objects if bucket == 'raw'])
+        self.assertEqual(metrics.as_dict()['requests'], {'list_objects_v2': 6, 'get_object': 10, 'put_object': 1,
+                                                         'copy_object': 1, 'delete_objects': 3})
+
+    def test_must_be_entered(self):
+        with self.assertRaises(RuntimeError):
+            asyncio.run(AsyncS3Client().get('s3://raw/a.csv'))
+
+
+class TestAsyncIngest(TestCase):
+
+    def test_same_output_as_serial(self):
+        expected = LocalS3()
+        load_deliveries(expected, 'raw', days=2, files=4, rows=100)
+        local_ingest(expected, tv_type='TCL,TOSHIBA').ingest()
+
+        for kwargs in ({'cpu_workers': 0}, {'cpu_workers': 2, 'stage_intermediary': True}):
+            with self.subTest(**kwargs):
+                s3 = LocalS3()
+                load_deliveries(s3, 'raw', days=2, files=4, rows=100)
+                client = LocalAsyncS3(s3, latency=0.01)
+                ingest = local_ingest(s3, tv_type='TCL,TOSHIBA', async_io=True, async_s3_client=client, **kwargs)
+                ingest.ingest()
+                self.assertEqual(_outputs(s3), _outputs(expected))
+                self.assertEqual(ingest.metrics_summary['deliveries'], 8)
+                self.assertGreater(client.max_in_flight, 1)
+
+    def test_encoding_and_the_source_cache_are_off_the_loop(self):
+        s3 = LocalS3()
+        load_deliveries(s3, 'raw', days=1, files=4, rows=100)
+        with tempfile.TemporaryDirectory() as cache:
+            ingest = local_ingest(s3, async_io=True, async_s3_client=LocalAsyncS3(s3), cpu_workers=0, dedup_rows=True,
+                                  source_cache_dir=cache)
+            threads = set()
+            for name in ['_drop_written_rows', '_cache_fill']:
+                method = getattr(ingest, name)
+
+                def recorded(*args, method=method):
+                    threads.add(threading.current_thread().name)
+                    return method(*args)
+                setattr(ingest, name, recorded)
+            ingest.ingest()
+        self.assertEqual(ingest.failures, dict())
+        self.assertTrue(threads)
+        self.assertNotIn('ingest-async-io', threads)
+
+    def test_not_with_chunks(self):
+        with self.assertRaises(ValueError):
+            local_ingest(LocalS3(), async_io=True, chunk_size=100)
@@ -0,0 +1,69 @@
+import io
+import os
+from os import path
+from unittest import TestCase
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from benchmarks.local_aws import LocalS3, local_ingest
+from ingest import clean_delivery, parse_tv_types
+
+
+class TestClean(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestClean, cls).setUpClass()
+        cls.base_path = os.path.dirname(os.path.realpath(__file__))
+        df = pd.read_csv(path.join(cls.base_path, 'test_data/input/test_data.csv'), index_col=0)
+        cls.body = df.assign(date=20220512).to_csv(index=False).encode('utf-8')
+
+    def test_parse_tv_types(self):
+        self.assertEqual(parse_tv_types('TCL'), ['TCL'])
+        self.assertEqual(parse_tv_types('TCL, TOSHIBA'), ['TCL', 'TOSHIBA'])
+        self.assertIsNone(parse_tv_types('all'))
+
+    def test_single_tv_type(self):
+        result = clean_delivery(self.body, ['TCL'])
+        self.assertEqual(list(result), ['TCL'])
+        true_df = pd.read_csv(path.join(self.base_path, 'test_data/output/output_data.csv'), dtype=object)
+        output = pd.read_csv(io.BytesIO(result['TCL']['output']), dtype=object)
+        assert_frame_equal(true_df.astype(str), output.astype(str))
+        self.assertEqual(result['TCL']['stats']['Maximum'], '2022-05-12')
+
+    def test_multiple_tv_types_read_once(self):
+        result = clean_delivery(self.body, ['TCL', 'TOSHIBA', 'NOT A BRAND'])
+        self.assertEqual(sorted(result), ['TCL', 'TOSHIBA'])
+        self.assertIsNone(clean_delivery(self.body, ['NOT A BRAND']))
+        self.assertIn('REALME', clean_delivery(self.body, None))
+
+    def test_brands_are_matched_whatever_their_case_and_spacing(self):
+        df = pd.read_csv(io.BytesIO(self.body))
+        lg = int(df['Brand'].str.strip().eq('LG').sum())
+        self.assertGreater(lg, int(df['Brand'].eq('LG').sum()))
+        for tv_type in ['LG', 'lg']:
+            result = clean_delivery(self.body, [tv_type])
+            self.assertEqual(list(result), [tv_type])
+            self.assertEqual(result[tv_type]['stats']['Records'], lg)
+        self.assertEqual(clean_delivery(self.body, None)['LG']['stats']['Records'], lg)
+
+    def test_all_tv_types_are_written_once_each(self):
+        s3 = LocalS3()
+        s3.put('raw', '20220512/TV_0.csv', self.body)
+        ingest = local_ingest(s3, tv_type='all', table='tv_data')
+        ingest.ingest()
+        self.assertEqual(ingest.failures, dict())
+
+        brands = pd.read_csv(io.BytesIO(self.body))['Brand']
+        names = {' '.join(brand.split()).upper() for brand in brands}
+        prefixes = {key.split('/')[0] for bucket, key in s3.objects if bucket == 'out' and '/day=' in key}
+        self.assertEqual(len(prefixes), len(names))
+        self.assertIn('LG-data', prefixes)
+        self.assertIn('SUN_KING-data', prefixes)
+        self.assertFalse([prefix for prefix in prefixes if ' ' in prefix])
+        written = pd.read_csv(io.BytesIO(s3.objects[('out', 'LG-data/day=20220512/TV_0.csv')][0]))
+        self.assertEqual(len(written), int(brands.str.strip().eq('LG').sum()))
+
+        tables = {query.split('`')[1]: query.split('LOCATION')[1].split("'")[1]
+                  for query in ingest.ac.queries if 'CREATE EXTERNAL TABLE' in query}
+        self.assertEqual(len(tables), len(names))
+        self.assertEqual(tables['tv_data_sun_king'], 's3://out/SUN_KING-data')
@@ -0,0 +1,121 @@
+import gzip
+import io
+import tempfile
+from unittest import TestCase
+import pandas as pd
+from benchmarks.compression_benchmark import parse_args, run
+from benchmarks.deliveries import generate_frame, load_deliveries
+from benchmarks.local_aws import LocalS3, local_ingest
+from ingest_utils.compression import codec_of, compress, sniff_stream, strip_suffix, validate_level
+from ingest_utils.output_format import FrameWriter, encode, file_name
+
+
+def outputs(s3):
+    """
+    The output files of a run by key without the codec suffix, decompressed
+    """
+    return {strip_suffix(key): pd.read_csv(io.BytesIO(body), compression=codec_of(key, body[:4]))
+            for (bucket, key), (body, _, _) in s3.objects.items() if bucket == 'out' and '/day=' in key}
+
+
+class TestCompression(TestCase):
+
+    def test_codec_from_suffix_or_content(self):
+        body = b'Brand,date\nTCL,20220512\n'
+        self.assertEqual(codec_of('20220512/a.csv.gz'), 'gzip')
+        self.assertEqual(codec_of('20220512/a.csv.zst'), 'zstd')
+        self.assertIsNone(codec_of('20220512/a.csv', body[:4]))
+        self.assertEqual(codec_of('20220512/a.csv', compress(body, 'gzip')[:4]), 'gzip')
+        self.assertEqual(codec_of('20220512/a.csv', compress(body, 'zstd')[:4]), 'zstd')
+
+        codec, stream = sniff_stream('20220512/a.csv', io.BytesIO(compress(body, 'zstd')))
+        self.assertEqual(codec, 'zstd')
+        self.assertEqual(pd.read_csv(stream, compression=codec)['Brand'].tolist(), ['TCL'])
+
+    def test_output_names(self):
+        self.assertEqual(file_name('TV_1.csv.gz'), 'TV_1.csv')
+        self.assertEqual(file_name('TV_1.csv', 'csv', 'gzip'), 'TV_1.csv.gz')
+        self.assertEqual(file_name('TV_1.csv.zst', 'csv', 'zstd'), 'TV_1.csv.zst')
+        self.assertEqual(file_name('TV_1.csv.gz', 'parquet', 'zstd'), 'TV_1.parquet')
+
+    def test_streamed_output_matches_encoded_output(self):
+        df = generate_frame('20220512', 300).astype(str)
+        for codec in ['gzip', 'zstd']:
+            with self.subTest(codec=codec):
+                sink = io.BytesIO()
+                sink.close = lambda: None
+                writer = FrameWriter(sink, 'csv', codec, compression_level=1)
+                writer.write(df[:100])
+                writer.write(df[100:])
+                writer.close()
+                for body in [sink.getvalue(), encode(df, 'csv', codec, 1)]:
+                    pd.testing.assert_frame_equal(pd.read_csv(io.BytesIO(body), compression=codec, dtype=str),
+                                                  pd.read_csv(io.BytesIO(encode(df)), dtype=str))
+
+    def test_levels_are_checked(self):
+        validate_level('zstd', 19)
+        validate_level('snappy', None)
+        with self.assertRaises(ValueError):
+            validate_level('gzip', 10)
+        with self.assertRaises(ValueError):
+            validate_level('snappy', 3)
+        with self.assertRaises(ValueError):
+            local_ingest(LocalS3(), compression='snappy')
+
+    def test_benchmark_reports_every_codec(self):
+        results = run(parse_args(['--rows', '500', '--repeat', '1']))
+        self.assertEqual(results['codecs']['csv']['ratio'], 1.0)
+        self.assertGreater(results['codecs']['csv-zstd-3']['ratio'], 1.0)
+        self.assertIn('parse_mb_per_second', results['codecs']['csv-gzip-6'])
+
+
+class TestIngestCompression(TestCase):
+
+    def test_compressed_deliveries_are_ingested_like_plain_ones(self):
+        s3 = LocalS3()
+        load_deliveries(s3, 'raw', days=2, files=2, rows=200)
+        local_ingest(s3, tv_type='TCL,TOSHIBA', scrubber_engine='vectorized').ingest()
+        expected = outputs(s3)
+        self.assertEqual(len(expected), 8)
+
+        for compression in ['gzip', 'zstd']:
+            for kwargs in [dict(), dict(chunk_size=70), dict(pipelined=True, cpu_workers=0), dict(cached=True)]:
+                with self.subTest(compression=compression, **kwargs), tempfile.TemporaryDirectory() as cache:
+                    if kwargs.pop('cached', False):
+                        kwargs['source_cache_dir'] = cache
+                    s3 = LocalS3()
+                    load_deliveries(s3, 'raw', days=2, files=2, rows=200, compression=compression)
+                    ingest = local_ingest(s3, tv_type='TCL,TOSHIBA', scrubber_engine='vectorized', **kwargs)
+                    ingest.ingest()
+                    self.assertEqual(ingest.failures, dict())
+                    written = outputs(s3)
+                    self.assertEqual(sorted(written), sorted(expected))
+                    if 'chunk_size' not in kwargs:
+                        for key, df in expected.items():
+                            pd.testing.assert_frame_equal(written[key], df)
+
+    def test_compressed_deliveries_named_csv_are_sniffed(self):
+        s3 = LocalS3()
+        body = generate_frame('20220512', 200, brands=['TCL']).to_csv(index=False).encode('utf-8')
+        s3.put('raw', '20220512/TV_0.csv', gzip.compress(body))
+        for kwargs in [dict(), dict(chunk_size=70)]:
+            with self.subTest(**kwargs):
+                ingest = local_ingest(s3, full_refresh=True, start_date='20220501', end_date='20220531', **kwargs)
+                ingest.ingest()
+                self.assertEqual(ingest.failures, dict())
+                self.assertEqual(len(outputs(s3)['TCL-data/day=20220512/TV_0.csv']), 200)
+
+    def test_compressed_output(self):
+        for compression, suffix in [('gzip', '.csv.gz'), ('zstd', '.csv.zst')]:
+            for kwargs in [dict(), dict(chunk_size=70)]:
+                with self.subTest(compression=compression, **kwargs):
+                    s3 = LocalS3()
+                    load_deliveries(s3, 'raw', days=1, files=2, rows=200)
+                    ingest = local_ingest(s3, compression=compression, compression_level=1, **kwargs)
+                    ingest.ingest()
+                    keys = [key for bucket, key in s3.objects if bucket == 'out' and '/day=' in key]
+                    self.assertEqual(len(keys), 2)
+                    self.assertTrue(all(key.endswith(suffix) for key in keys))
+                    self.assertLess(ingest.metrics_summary['bytes_out'], ingest.metrics_summary['bytes_in'] / 2)
+                    self.assertEqual(sum(len(df) for df in outputs(s3).values()),
+                                     ingest.metrics_summary['rows_kept'])
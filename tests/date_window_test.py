@@ -0,0 +1,56 @@
+from datetime import date, datetime
+from unittest import TestCase
+from s3_client.s3_client import S3Client
+from ingest_utils.date_window import DateWindow, list_window
+
+
+class ListingClient:
+    """Answers list_objects_v2 from an in memory list of keys, two keys per page"""
+
+    def __init__(self, keys):
+        self.keys = sorted(keys)
+        self.prefixes_listed = []
+
+    def list_objects_v2(self, Bucket, Prefix="", Delimiter=None, ContinuationToken=None, **kwargs):
+        self.prefixes_listed.append((Prefix, Delimiter))
+        keys = [k for k in self.keys if k.startswith(Prefix)]
+        if Delimiter:
+            folders = sorted({Prefix + k[len(Prefix):].split(Delimiter)[0] + Delimiter
+                              for k in keys if Delimiter in k[len(Prefix):]})
+            return {'CommonPrefixes': [{'Prefix': f} for f in folders], 'IsTruncated': False}
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + 2]
+        response = {'IsTruncated': start + 2 < len(keys)}
+        if page:
+            response['Contents'] = [{'Key': k, 'LastModified': datetime(2022, 5, 12), 'Size': 1, 'ETag': '"e"'}
+                                    for k in page]
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(start + 2)
+        return response
+
+
+class TestDateWindow(TestCase):
+
+    def test_window_days(self):
+        window = DateWindow(start='2022-05-10', end='20220512')
+        self.assertEqual(window.start, date(2022, 5, 10))
+        self.assertEqual(len(window), 3)
+        self.assertIn('20220511', window)
+        self.assertNotIn('20220513', window)
+
+    def test_default_window(self):
+        window = DateWindow(end=date(2022, 5, 12))
+        self.assertEqual(len(window), 2501)
+        self.assertRaises(ValueError, DateWindow, start='20220513', end='20220512')
+
+    def test_list_window_only_lists_days_inside(self):
+        client = ListingClient(['20220510/a.csv', '20220511/a.csv', '20220511/b.csv', '20220511/c.txt',
+                                '20220511/d.csv', '20220601/a.csv', 'other/a.csv'])
+        objects = list_window(S3Client(client), 's3://tv-type-raw/', DateWindow('20220501', '20220531'),
+                              suffix='.csv', max_workers=2)
+
+        self.assertEqual([i['key'] for i in objects],
+                         ['20220510/a.csv', '20220511/a.csv', '20220511/b.csv', '20220511/d.csv'])
+        self.assertEqual(objects[0]['etag'], 'e')
+        self.assertNotIn(('20220601/', None), client.prefixes_listed)
+        self.assertNotIn(('other/', None), client.prefixes_listed)
@@ -0,0 +1,96 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from benchmarks.local_aws import LocalS3, local_ingest
+from ingest_utils.ddl_cache import DDLCache
+
+
+class TestDDLCache(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'manifests', 'TCL-ddl.json')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_fingerprint_of_sql_and_location(self):
+        cache = DDLCache(self.path).load()
+        cache.record('db.tcl', 'CREATE TABLE tcl', 's3://out/TCL-data')
+        cache.save()
+
+        cache = DDLCache(self.path).load()
+        self.assertTrue(cache.is_current('db.tcl', 'CREATE TABLE tcl', 's3://out/TCL-data'))
+        self.assertFalse(cache.is_current('db.tcl', 'CREATE TABLE tcl2', 's3://out/TCL-data'))
+        self.assertFalse(cache.is_current('db.tcl', 'CREATE TABLE tcl', 's3://out/other'))
+        cache.forget('db.tcl')
+        self.assertFalse(cache.is_current('db.tcl', 'CREATE TABLE tcl', 's3://out/TCL-data'))
+
+    def test_in_s3(self):
+        s3 = LocalS3()
+        cache = DDLCache('s3://out/_manifests/TCL-ddl.json', s3_client=s3)
+        cache.load().record('db', 'CREATE DATABASE db')
+        cache.save()
+        self.assertIn(('out', '_manifests/TCL-ddl.json'), s3.objects)
+        self.assertTrue(DDLCache('s3://out/_manifests/TCL-ddl.json', s3_client=s3).is_current('db',
+                                                                                              'CREATE DATABASE db'))
+
+
+class TestIngestDDL(TestCase):
+
+    def test_unchanged_ddl_is_skipped(self):
+        s3 = LocalS3()
+        ingest = local_ingest(s3, tv_type='TCL,TOSHIBA')
+        ingest.setup()
+        self.assertEqual(len(ingest.ac.batches), 2)
+        self.assertIn('CREATE DATABASE', ingest.ac.batches[0][0])
+        self.assertEqual(len(ingest.ac.batches[1]), 2)
+
+        ingest = local_ingest(s3, tv_type='TCL,TOSHIBA')
+        ingest.setup()
+        self.assertEqual(ingest.ac.queries, [])
+        self.assertEqual(ingest.metrics.as_dict()['ddl'], {'run': 0, 'skipped': 3})
+
+        ingest = local_ingest(s3, tv_type='TCL,TOSHIBA', output_format='parquet')
+        ingest.setup()
+        self.assertEqual(len(ingest.ac.queries), 2)
+
+        ingest = local_ingest(s3, tv_type='TCL,TOSHIBA', output_format='parquet', refresh_ddl=True)
+        ingest.setup()
+        self.assertEqual(len(ingest.ac.queries), 3)
+
+    def test_dropped_tables_are_created_again(self):
+        s3 = LocalS3()
+        ingest = local_ingest(s3, tv_type='TCL')
+        ingest.setup()
+        ingest.drop_table()
+        ingest.ac.queries.clear()
+        ingest.setup()
+        self.assertEqual(len(ingest.ac.queries), 1)
+        self.assertIn('CREATE EXTERNAL TABLE', ingest.ac.queries[0])
+
+    def test_database_is_created_again_after_another_tv_type_tears_it_down(self):
+        s3 = LocalS3()
+        local_ingest(s3, tv_type='TCL').setup()
+        toshiba = local_ingest(s3, tv_type='TOSHIBA')
+        toshiba.setup()
+        self.assertFalse(any('CREATE DATABASE' in query for query in toshiba.ac.queries))
+
+        local_ingest(s3, tv_type='TCL').teardown()
+        toshiba = local_ingest(s3, tv_type='TOSHIBA')
+        toshiba.setup()
+        self.assertIn('CREATE DATABASE', toshiba.ac.batches[0][0])
+
+    def test_tables_exist_before_partitions_are_added(self):
+        ingest = local_ingest(LocalS3(), tv_type='all')
+        ingest.add_partitions({'TCL': {'20220512'}, 'TOSHIBA': {'20220512', '20220513'}})
+        create, partitions = ingest.ac.batches
+        self.assertTrue(all('CREATE EXTERNAL TABLE' in sql for sql in create))
+        self.assertEqual(len(create), 2)
+        self.assertTrue(all('ADD IF NOT EXISTS' in sql for sql in partitions))
+        self.assertEqual(len(partitions), 2)
+
+        ingest.ac.batches.clear()
+        ingest.add_partitions({'TCL': {'20220514'}})
+        self.assertEqual(len(ingest.ac.batches), 1)
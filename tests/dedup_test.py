@@ -0,0 +1,140 @@
+import io
+import tempfile
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+from benchmarks.deliveries import generate_frame, load_deliveries
+from benchmarks.local_aws import LocalS3, local_ingest
+from ingest_utils.dedup import ContentIndex, RowIndex, row_hashes
+
+
+class TestContentIndex(TestCase):
+
+    def test_etags_and_multipart_content(self):
+        s3 = LocalS3()
+        s3.put('raw', 'a.csv', b'abc')
+        with tempfile.TemporaryDirectory() as folder:
+            index = ContentIndex(folder, s3_client=s3)
+            single = index.content_hash('900150983cd24fb0d6963f7d28e17f72', 's3://raw/a.csv')
+            multipart = index.content_hash('0123456789abcdef0123456789abcdef-2', 's3://raw/a.csv')
+            self.assertEqual(single, multipart)
+            self.assertEqual(s3.requests, {'get': 1})
+            index.add(single)
+            index.save()
+
+            index = ContentIndex(folder, s3_client=s3).load()
+            self.assertTrue(index.is_indexed(single))
+            index.content_hash('0123456789abcdef0123456789abcdef-2', 's3://raw/a.csv')
+            self.assertEqual(s3.requests, {'get': 1})
+            index.reset()
+            self.assertFalse(index.is_indexed(single))
+
+
+class TestRowIndex(TestCase):
+
+    def test_keep_discard_and_release(self):
+        with tempfile.TemporaryDirectory() as folder:
+            index = RowIndex(folder)
+            hashes = np.array([1, 2, 2, 3], dtype=np.uint64)
+            self.assertEqual(index.keep('20220512', 'a.csv', hashes).tolist(), [True, True, False, True])
+            self.assertEqual(index.keep('20220512', 'b.csv', np.array([3, 4], dtype=np.uint64)).tolist(),
+                             [False, True])
+            index.discard('20220512', 'b.csv')
+            index.release('20220512')
+            self.assertEqual(RowIndex(folder).keep('20220512', 'b.csv', np.array([3, 4], dtype=np.uint64)).tolist(),
+                             [False, True])
+
+    def test_delivery_processed_again_replaces_its_rows(self):
+        with tempfile.TemporaryDirectory() as folder:
+            index = RowIndex(folder)
+            index.keep('20220512', 'a.csv', np.array([1, 2, 3], dtype=np.uint64))
+            index.keep('20220512', 'b.csv', np.array([4], dtype=np.uint64))
+            index.release('20220512')
+
+            index = RowIndex(folder)
+            # a.csv is not deduplicated against what it wrote before, only against b.csv and itself
+            self.assertEqual(index.keep('20220512', 'a.csv', np.array([1, 2, 5], dtype=np.uint64)).tolist(),
+                             [True, True, True])
+            self.assertEqual(index.keep('20220512', 'a.csv', np.array([4, 5, 6], dtype=np.uint64)).tolist(),
+                             [False, False, True])
+            self.assertEqual(index.keep('20220512', 'c.csv', np.array([3, 6], dtype=np.uint64)).tolist(),
+                             [True, False])
+            # a.csv could not be written, its earlier rows are back
+            index.discard('20220512', 'a.csv')
+            self.assertEqual(index.keep('20220512', 'd.csv', np.array([1, 3, 5], dtype=np.uint64)).tolist(),
+                             [False, False, True])
+
+    def test_row_hashes_ignore_how_the_rows_were_parsed(self):
+        body = generate_frame('20220512', 100).to_csv(index=False).encode('utf-8')
+        inferred = pd.read_csv(io.BytesIO(body))
+        strings = pd.read_csv(io.BytesIO(body), dtype=str)
+        self.assertEqual(row_hashes(inferred).tolist(), row_hashes(strings).tolist())
+
+
+def output_rows(s3):
+    return sum(len(pd.read_csv(io.BytesIO(body))) for (bucket, key), (body, _, _) in s3.objects.items()
+               if bucket == 'out' and key.endswith('.csv'))
+
+
+class TestIngestDedup(TestCase):
+
+    def test_redelivered_files_are_skipped(self):
+        s3 = LocalS3()
+        load_deliveries(s3, 'raw', days=1, files=2, rows=100)
+        day = next(key for _, key in s3.objects).split('/')[0]
+        s3.put('raw', f'{day}/TV_0_copy.csv', s3.objects[('raw', f'{day}/TV_0.csv')][0])
+        ingest = local_ingest(s3, dedup_deliveries=True)
+        ingest.ingest()
+        self.assertEqual(ingest.metrics_summary['deliveries_duplicate'], 1)
+        self.assertEqual(ingest.metrics_summary['deliveries'], 2)
+
+        # the copy skipped within the first run is checked again, now against the index
+        s3.put('raw', f'{day}/TV_1_copy.csv', s3.objects[('raw', f'{day}/TV_1.csv')][0])
+        ingest = local_ingest(s3, dedup_deliveries=True)
+        ingest.ingest()
+        self.assertEqual(ingest.metrics_summary['deliveries_duplicate'], 2)
+        self.assertEqual(ingest.metrics_summary['deliveries'], 0)
+
+        ingest = local_ingest(s3, dedup_deliveries=True)
+        ingest.ingest()
+        self.assertEqual(ingest.metrics_summary['deliveries_duplicate'], 0)
+
+    def test_duplicate_rows_are_dropped(self):
+        for mode in ({}, {'chunk_size': 70}, {'pipelined': True, 'cpu_workers': 0}):
+            with self.subTest(**mode):
+                s3 = LocalS3()
+                load_deliveries(s3, 'raw', days=1, files=1, rows=300, brands=['TCL'])
+                day, df = next(key for _, key in s3.objects).split('/')[0], None
+                df = pd.read_csv(io.BytesIO(s3.objects[('raw', f'{day}/TV_0.csv')][0]), dtype=str)
+                unique = len(df.drop_duplicates())
+                s3.put('raw', f'{day}/TV_1.csv', df.iloc[100:200].to_csv(index=False).encode('utf-8'))
+                ingest = local_ingest(s3, dedup_rows=True, **mode)
+                ingest.ingest()
+                self.assertEqual(output_rows(s3), unique)
+                self.assertEqual(ingest.metrics_summary['rows_duplicate'], 400 - unique)
+
+                # the rows written are remembered by the next run
+                s3.put('raw', f'{day}/TV_2.csv', df.iloc[:10].to_csv(index=False).encode('utf-8'))
+                local_ingest(s3, dedup_rows=True, **mode).ingest()
+                self.assertEqual(output_rows(s3), unique)
+
+    def test_changed_redelivery_under_the_same_key(self):
+        for mode in ({}, {'chunk_size': 30}, {'pipelined': True, 'cpu_workers': 0}):
+            with self.subTest(**mode):
+                s3 = LocalS3()
+                load_deliveries(s3, 'raw', days=1, files=1, rows=100, brands=['TCL'])
+                day = next(key for _, key in s3.objects).split('/')[0]
+                df = pd.read_csv(io.BytesIO(s3.objects[('raw', f'{day}/TV_0.csv')][0]), dtype=str)
+                s3.put('raw', f'{day}/TV_1.csv', df.iloc[:10].to_csv(index=False).encode('utf-8'))
+                local_ingest(s3, dedup_rows=True, **mode).ingest()
+                self.assertEqual(output_rows(s3), len(df.drop_duplicates()))
+
+                # a corrected TV_0.csv replaces the whole output written for it, not only its changed rows
+                df.loc[50, 'Selling Price'] = '123456'
+                s3.put('raw', f'{day}/TV_0.csv', df.to_csv(index=False).encode('utf-8'))
+                ingest = local_ingest(s3, dedup_rows=True, **mode)
+                ingest.ingest()
+                self.assertEqual(ingest.metrics_summary['deliveries'], 1)
+                self.assertEqual(output_rows(s3), len(df.drop_duplicates()))
+                written = pd.read_csv(io.BytesIO(s3.objects[('out', f'TCL-data/day={day}/TV_0.csv')][0]), dtype=str)
+                self.assertIn('123456', written['Selling Price'].tolist())
@@ -0,0 +1,23 @@
+from unittest import TestCase
+from benchmarks.import_benchmark import LAZY, parse_importtime, time_import
+
+
+class TestImportBenchmark(TestCase):
+
+    def test_parse_importtime(self):
+        stderr = "\n".join(["import time: self [us] | cumulative | imported package",
+                            "import time:       120 |        120 |     _io",
+                            "import time:       300 |        300 |   json.decoder",
+                            "import time:       500 |        800 | json"])
+        self.assertEqual(parse_importtime(stderr), [('_io', 120, 120, 2), ('json.decoder', 300, 300, 1),
+                                                    ('json', 500, 800, 0)])
+
+    def test_ingest_imports_no_heavy_dependency(self):
+        for module in ['ingest', 's3_client.async_s3_client']:
+            result = time_import(module, repeat=1)
+            self.assertEqual(result['lazy_imported'], [], module)
+            self.assertGreater(result['seconds'], 0)
+
+    def test_lazy_dependencies_are_reported(self):
+        self.assertIn('asyncio', LAZY)
+        self.assertEqual(time_import('asyncio', repeat=1)['lazy_imported'], ['asyncio'])
@@ -0,0 +1,31 @@
+from unittest import TestCase
+import pandas as pd
+from benchmarks.deliveries import generate_frame, load_deliveries
+from benchmarks.ingest_benchmark import parse_args, run
+from benchmarks.local_aws import LocalS3, local_ingest
+
+
+class TestIngestBenchmark(TestCase):
+
+    def test_generated_deliveries_are_reproducible(self):
+        pd.testing.assert_frame_equal(generate_frame('20220512', 100, seed=3), generate_frame('20220512', 100, seed=3))
+        df = generate_frame('20220512', 2000, dirty_fraction=0.2)
+        self.assertTrue((df['Size '] < 0).any())
+        self.assertIn('abc', set(df['Selling Price']))
+        self.assertIn('19000101', set(df['date']))
+
+    def test_ingest_against_local_stand_ins(self):
+        s3 = LocalS3()
+        self.assertEqual(load_deliveries(s3, 'raw', days=2, files=2, rows=200)[0], 4)
+        ingest = local_ingest(s3, tv_type='TCL,TOSHIBA', scrubber_engine='vectorized')
+        ingest.ingest()
+        self.assertEqual(ingest.failures, dict())
+        outputs = sorted(key for bucket, key in s3.objects if bucket == 'out' and key.endswith('.csv'))
+        self.assertEqual(len(outputs), 8)
+        self.assertTrue(any('ADD IF NOT EXISTS' in query for query in ingest.ac.queries))
+
+    def test_run_reports_every_stage(self):
+        results = run(parse_args(['--days', '1', '--files', '1', '--rows', '100', '--scrubber-engine', 'vectorized']))
+        self.assertEqual(list(results['stages']), ['list', 'load', 'scrub', 'write', 'partition', 'ingest'])
+        self.assertEqual(results['stages']['load']['rows'], 100)
+        self.assertEqual(results['stages']['load']['requests'], {'get': 1})
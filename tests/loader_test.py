@@ -0,0 +1,129 @@
+import copy
+import io
+import os
+import tempfile
+from unittest import TestCase
+import pandas as pd
+from benchmarks.deliveries import generate_frame, load_deliveries
+from benchmarks.loader_benchmark import parse_args, run
+from benchmarks.local_aws import LocalS3, local_ingest
+from ingest_utils.compression import compress
+from ingest_utils.loader import read_schema
+from scrubber_config.input_schema import input_schema, usecols, validate
+from scrubber_config.table_schema import table_columns
+
+
+def outputs(s3):
+    return {key: pd.read_csv(io.BytesIO(body))
+            for (bucket, key), (body, _, _) in s3.objects.items()
+            if bucket == 'out' and '/day=' in key and not key.startswith('quarantine/')}
+
+
+class TestInputSchema(TestCase):
+
+    def test_schema_loads_the_table_columns(self):
+        validate()
+        self.assertEqual(usecols(), [column for column, _ in table_columns])
+
+    def test_invalid_schemas_are_rejected(self):
+        schema = copy.deepcopy(input_schema)
+        schema['columns'][0]['dtype'] = 'int'
+        with self.assertRaises(ValueError):
+            validate(schema)
+        schema = copy.deepcopy(input_schema)
+        schema['columns'] = schema['columns'][1:]
+        with self.assertRaises(ValueError):
+            validate(schema)
+
+
+class TestReadSchema(TestCase):
+
+    def test_only_schema_columns_and_brands_are_loaded(self):
+        df = generate_frame('20220512', 300, dirty_fraction=0.2).drop(columns=['Resolution'])
+        df.insert(0, 'Model', 'X')
+        body = df.to_csv(index=False).encode('utf-8')
+
+        loaded, rows = read_schema(body, brands=['TCL', 'Mi'])
+        self.assertEqual(rows, 300)
+        self.assertEqual(list(loaded.columns), [column for column in usecols() if column != 'Resolution'])
+        self.assertEqual(set(loaded['Brand']), {'TCL', 'Mi'})
+        self.assertEqual(len(loaded), df['Brand'].isin(['TCL', 'Mi']).sum())
+        self.assertEqual(loaded['Brand'].dtype, 'category')
+        self.assertEqual(loaded['Selling Price'].dtype, object)
+
+        expected = pd.read_csv(io.BytesIO(body), dtype=str)
+        expected = expected[expected['Brand'].isin(['TCL', 'Mi'])].reset_index(drop=True)
+        pd.testing.assert_frame_equal(loaded.astype(object), expected[loaded.columns].astype(object))
+
+    def test_brands_are_matched_on_their_brand_key(self):
+        df = generate_frame('20220512', 30)
+        df['Brand'] = ['LG', 'LG ', ' lg', 'Sun  King', 'TCL'] * 6
+        loaded, _ = read_schema(df.to_csv(index=False).encode('utf-8'), brands=['LG', 'Sun King'])
+        self.assertEqual(len(loaded), 24)
+        self.assertEqual(set(loaded['Brand']), {'LG', 'LG ', ' lg', 'Sun  King'})
+
+    def test_compressed_and_file_sources(self):
+        body = generate_frame('20220512', 200).to_csv(index=False).encode('utf-8')
+        expected, _ = read_schema(body)
+        with tempfile.TemporaryDirectory() as folder:
+            for codec in [None, 'gzip', 'zstd']:
+                with self.subTest(codec=codec):
+                    data = compress(body, codec) if codec else body
+                    path = os.path.join(folder, 'delivery')
+                    with open(path, 'wb') as f:
+                        f.write(data)
+                    for source in [data, path]:
+                        loaded, rows = read_schema(source, codec=codec)
+                        self.assertEqual(rows, 200)
+                        pd.testing.assert_frame_equal(loaded, expected)
+
+
+class TestIngestLoader(TestCase):
+
+    def test_schema_loader_ingests_like_the_infer_loader(self):
+        s3 = LocalS3()
+        load_deliveries(s3, 'raw', days=2, files=2, rows=300)
+        ingest = local_ingest(s3, tv_type='TCL,TOSHIBA', scrubber_engine='vectorized', quarantine=True)
+        ingest.ingest()
+        expected, summary = outputs(s3), ingest.metrics_summary
+        self.assertEqual(summary['loader'], 'infer')
+
+        for compression in [None, 'zstd']:
+            for kwargs in [dict(), dict(chunk_size=70), dict(pipelined=True, cpu_workers=0), dict(cached=True)]:
+                with self.subTest(compression=compression, **kwargs), tempfile.TemporaryDirectory() as cache:
+                    if kwargs.pop('cached', False):
+                        kwargs['source_cache_dir'] = cache
+                    s3 = LocalS3()
+                    load_deliveries(s3, 'raw', days=2, files=2, rows=300, compression=compression)
+                    ingest = local_ingest(s3, tv_type='TCL,TOSHIBA', scrubber_engine='vectorized', quarantine=True,
+                                          loader='schema', **kwargs)
+                    ingest.ingest()
+                    self.assertEqual(ingest.failures, dict())
+                    written = outputs(s3)
+                    self.assertEqual(sorted(written), sorted(expected))
+                    # numbers are written as they were delivered, rather than as the type inferred for the file
+                    for key, df in expected.items():
+                        pd.testing.assert_frame_equal(written[key], df, check_dtype=False)
+                    for name in ['rows_in', 'rows_kept', 'rows_quarantined', 'defaulted']:
+                        self.assertEqual(ingest.metrics_summary[name], summary[name])
+                    self.assertEqual(ingest.metrics_summary['loader'], 'schema')
+                    if 'chunk_size' not in kwargs:
+                        self.assertLess(ingest.metrics_summary['frame_bytes'], summary['frame_bytes'] / 2)
+
+    def test_summary_reports_memory(self):
+        s3 = LocalS3()
+        load_deliveries(s3, 'raw', days=1, files=1, rows=200)
+        ingest = local_ingest(s3, loader='schema')
+        ingest.ingest()
+        self.assertGreater(ingest.metrics_summary['frame_bytes'], 0)
+        self.assertGreater(ingest.metrics_summary['peak_memory_mb'], 0)
+        self.assertIn('parse', ingest.metrics_summary['seconds'])
+
+    def test_unknown_loader(self):
+        with self.assertRaises(ValueError):
+            local_ingest(LocalS3(), loader='fast')
+
+    def test_benchmark_compares_the_loaders(self):
+        results = run(parse_args(['--rows', '2000', '--repeat', '1']))
+        self.assertEqual(results['loaders']['infer']['rows_kept'], results['loaders']['schema']['rows_kept'])
+        self.assertIn('parse_speedup', results['schema_vs_infer'])
@@ -0,0 +1,66 @@
+import os
+import json
+import tempfile
+from datetime import datetime
+from unittest import TestCase
+from ingest_utils.manifest import ProcessedManifest
+
+
+def _obj(key, etag="abc", size=10, last_modified=datetime(2022, 5, 12)):
+    return {'key': key, 'etag': etag, 'size': size, 'last_modified': last_modified}
+
+
+class TestManifest(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'manifests', 'TCL-data.json')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_pending_only_new_or_changed(self):
+        manifest = ProcessedManifest(self.path, source='s3://tv-type-raw/').load()
+        manifest.mark_processed(_obj('20220512/a.csv'))
+        manifest.mark_processed(_obj('20220512/b.csv'))
+        manifest.save()
+
+        manifest = ProcessedManifest(self.path, source='s3://tv-type-raw/').load()
+        pending = manifest.pending([_obj('20220512/a.csv'),
+                                    _obj('20220512/b.csv', etag='changed'),
+                                    _obj('20220513/c.csv')])
+        self.assertEqual([i['key'] for i in pending], ['20220512/b.csv', '20220513/c.csv'])
+
+    def test_checkpoint_and_atomic_save(self):
+        manifest = ProcessedManifest(self.path, checkpoint_every=2).load()
+        manifest.mark_processed(_obj('20220512/a.csv'))
+        self.assertFalse(os.path.exists(self.path))
+        manifest.mark_processed(_obj('20220512/b.csv'))
+        with open(self.path) as f:
+            self.assertEqual(set(json.load(f)['objects']), {'20220512/a.csv', '20220512/b.csv'})
+        self.assertEqual([i for i in os.listdir(os.path.dirname(self.path)) if i.endswith('.tmp')], [])
+
+    def test_other_source_ignored(self):
+        manifest = ProcessedManifest(self.path, source='s3://tv-type-raw/').load()
+        manifest.mark_processed(_obj('20220512/a.csv'))
+        manifest.save()
+
+        manifest = ProcessedManifest(self.path, source='s3://other-raw/').load()
+        self.assertEqual(len(manifest.pending([_obj('20220512/a.csv')])), 1)
+
+    def test_pending_partitions_saved_until_cleared(self):
+        manifest = ProcessedManifest(self.path, checkpoint_every=1).load()
+        manifest.add_pending_partitions({'TCL': ['20220512']}, quarantined=['20220512'])
+        manifest.add_pending_partitions({'TCL': ['20220513'], 'TOSHIBA': ['20220512']})
+        manifest.mark_processed(_obj('20220512/a.csv'))
+
+        manifest = ProcessedManifest(self.path).load()
+        self.assertEqual(manifest.pending_partitions, {'TCL': {'20220512', '20220513'}, 'TOSHIBA': {'20220512'}})
+        self.assertEqual(manifest.pending_quarantine, {'20220512'})
+        manifest.reset()
+        self.assertEqual(set(manifest.pending_partitions), {'TCL', 'TOSHIBA'})
+        manifest.clear_pending_partitions()
+        manifest.save()
+
+        manifest = ProcessedManifest(self.path).load()
+        self.assertEqual((manifest.pending_partitions, manifest.pending_quarantine), (dict(), set()))
@@ -0,0 +1,53 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+from benchmarks.deliveries import load_deliveries
+from benchmarks.local_aws import LocalS3, local_ingest
+from ingest_utils.metrics import Metrics, CountingClient, JsonFileSink
+
+
+class TestMetrics(TestCase):
+
+    def test_add_merges_nested_counts(self):
+        metrics = Metrics()
+        metrics.add({'rows_in': 10, 'seconds': {'parse': 0.5}}, key='a.csv')
+        metrics.add({'rows_in': 5, 'seconds': {'parse': 0.25, 'scrub': 1}}, key='b.csv')
+        with metrics.timer('list'):
+            pass
+        totals = metrics.as_dict()
+        self.assertEqual(totals['rows_in'], 15)
+        self.assertEqual(totals['seconds']['parse'], 0.75)
+        self.assertIn('list', totals['seconds'])
+        self.assertEqual(metrics.for_delivery('b.csv'), {'rows_in': 5, 'seconds': {'parse': 0.25, 'scrub': 1}})
+        self.assertEqual(metrics.summary(run='x')['deliveries'], 2)
+
+    def test_counting_client(self):
+        s3, metrics = LocalS3(), Metrics()
+        client = CountingClient(s3, metrics)
+        client.put_object(Bucket='b', Key='k', Body=b'x')
+        client.get_object(Bucket='b', Key='k')
+        client.get_object(Bucket='b', Key='k')
+        self.assertEqual(metrics.as_dict()['requests'], {'put_object': 1, 'get_object': 2})
+        self.assertIs(client.exceptions.NoSuchKey, s3.exceptions.NoSuchKey)
+
+    def test_ingest_metrics(self):
+        for mode in ({}, {'chunk_size': 50}):
+            with self.subTest(**mode), tempfile.TemporaryDirectory() as folder:
+                s3 = LocalS3()
+                load_deliveries(s3, 'raw', days=2, files=2, rows=200)
+                path = os.path.join(folder, 'metrics.json')
+                ingest = local_ingest(s3, tv_type='TCL,TOSHIBA', metrics_sink=JsonFileSink(path), **mode)
+                ingest.ingest()
+                summary = ingest.metrics_summary
+                self.assertEqual((summary['deliveries'], summary['rows_in'], summary['failures']), (4, 800, 0))
+                self.assertLess(summary['rows_kept'], summary['rows_in'])
+                self.assertEqual(summary['bytes_in'], s3.total_bytes('raw'))
+                self.assertGreater(summary['bytes_out'], 0)
+                self.assertTrue({'list', 'download', 'parse', 'filter', 'scrub', 'upload', 'athena'}
+                                <= set(summary['seconds']))
+                self.assertIn('list_objects_v2', summary['requests'])
+                with open(path) as f:
+                    written = json.load(f)
+                self.assertEqual(len(written['deliveries_metrics']), 4)
+                self.assertEqual(sum(d['rows_in'] for d in written['deliveries_metrics'].values()), 800)
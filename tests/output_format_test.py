@@ -0,0 +1,46 @@
+import io
+import os
+from os import path
+from unittest import TestCase
+import pandas as pd
+from ingest import clean_delivery
+from ingest_utils.output_format import FrameWriter, file_name
+from scrubber_config.table_schema import column_types, columns_ddl
+
+
+class TestOutputFormat(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestOutputFormat, cls).setUpClass()
+        cls.base_path = os.path.dirname(os.path.realpath(__file__))
+        cls.df = pd.read_csv(path.join(cls.base_path, 'test_data/input/test_data.csv'), index_col=0)
+        cls.body = cls.df.assign(date=20220512).to_csv(index=False).encode('utf-8')
+
+    def test_column_types(self):
+        types = column_types()
+        self.assertEqual(types['Size '], 'double')
+        self.assertEqual(types['date'], 'date')
+        self.assertEqual(types['Brand'], 'string')
+        self.assertIn('`oringinal_price` double', columns_ddl())
+        self.assertEqual(file_name('TV_0.csv', 'parquet'), 'TV_0.parquet')
+
+    def test_parquet_matches_csv(self):
+        result = clean_delivery(self.body, ['TCL'], output_format='parquet', compression='zstd')
+        output = pd.read_parquet(io.BytesIO(result['TCL']['output']))
+        true_df = pd.read_csv(path.join(self.base_path, 'test_data/output/output_data.csv'))
+        self.assertEqual(len(output), len(true_df))
+        self.assertEqual(list(output['selling_price']), list(true_df['Selling Price'].astype(float)))
+        self.assertEqual(str(output['date'].iloc[0]), '2022-05-12')
+
+    def test_frame_writer_row_groups(self):
+        sink = io.BytesIO()
+        sink.close = lambda: None
+        writer = FrameWriter(sink, 'parquet')
+        df = self.df.assign(date=20220512)
+        writer.write(df.iloc[:10])
+        writer.write(df.iloc[10:])
+        writer.close()
+        output = pd.read_parquet(io.BytesIO(sink.getvalue()))
+        self.assertEqual(len(output), len(df))
+        self.assertEqual(writer.rows, len(df))
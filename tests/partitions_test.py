@@ -0,0 +1,114 @@
+import json
+import re
+from unittest import TestCase
+from benchmarks.deliveries import load_deliveries
+from benchmarks.local_aws import LocalAthena, LocalS3, local_ingest
+
+# Athena rejects queries over 262144 bytes
+MAX_QUERY_BYTES = 262144
+
+
+def partitions(queries):
+    """
+    Returns the table and the day and location of each partition the ALTER TABLE queries add
+    """
+    added = []
+    for query in queries:
+        if query.startswith('ALTER TABLE'):
+            table = query.split()[2]
+            added += [(table, day, location)
+                      for day, location in re.findall(r"PARTITION\(day='(\d+)'\) LOCATION '([^']+)'", query)]
+    return sorted(added)
+
+
+class FailingAthena(LocalAthena):
+    """Fails the batches that add partitions"""
+
+    def wait_for_completion(self):
+        failed = any(query.startswith('ALTER TABLE') for query in self._batch)
+        super().wait_for_completion()
+        if failed:
+            raise RuntimeError("Query exhausted resources at this scale factor")
+
+
+class TestPartitions(TestCase):
+
+    def test_partitions_of_the_days_written(self):
+        s3 = LocalS3()
+        load_deliveries(s3, 'raw', days=3, files=2, rows=100)
+        days = sorted({key.split('/')[0] for _, key in s3.objects})
+        ingest = local_ingest(s3, tv_type='TCL,TOSHIBA')
+        ingest.ingest()
+        expected = [(table, day, f's3://out/{tv_type}-data/day={day}/')
+                    for tv_type, table in [('TCL', 'tcl_data'), ('TOSHIBA', 'toshiba_data')] for day in days]
+        self.assertEqual(partitions(ingest.ac.queries), expected)
+        # one query per table, submitted together
+        alter = [query for query in ingest.ac.batches[-1] if query.startswith('ALTER TABLE')]
+        self.assertEqual(len(alter), 2)
+        self.assertFalse([query for query in ingest.ac.queries if query.startswith('SHOW PARTITIONS')])
+
+        # nothing new, nothing to add
+        ingest = local_ingest(s3, tv_type='TCL,TOSHIBA')
+        ingest.ingest()
+        self.assertEqual(partitions(ingest.ac.queries), [])
+
+    def test_queries_stay_under_the_size_limit(self):
+        days = {f'{year}{month:02d}{day:02d}' for year in range(2000, 2016) for month in range(1, 13)
+                for day in range(1, 29)}
+        ingest = local_ingest(LocalS3())
+        ingest.add_partitions({'TCL': days})
+        queries = [query for query in ingest.ac.queries if query.startswith('ALTER TABLE')]
+        self.assertGreater(len(queries), 1)
+        for query in queries:
+            self.assertLess(len(query.encode('utf-8')), MAX_QUERY_BYTES)
+        added = partitions(queries)
+        self.assertEqual(len(added), len(days))
+        self.assertEqual({day for _, day, _ in added}, days)
+
+    def test_reconcile_adds_the_partitions_athena_is_missing(self):
+        s3 = LocalS3()
+        load_deliveries(s3, 'raw', days=3, files=1, rows=100)
+        days = sorted({key.split('/')[0] for _, key in s3.objects})
+        local_ingest(s3).ingest()
+
+        athena = LocalAthena(s3, partitions={'tcl_data': [f'day={days[0]}']})
+        ingest = local_ingest(s3, athena_client=athena, reconcile_partitions=True)
+        ingest.ingest()
+        self.assertEqual(ingest.metrics_summary['deliveries'], 0)
+        self.assertIn('SHOW PARTITIONS tcl_data', athena.queries)
+        self.assertEqual(partitions(athena.queries),
+                         [('tcl_data', day, f's3://out/TCL-data/day={day}/') for day in days[1:]])
+
+    def test_partitions_are_added_by_the_next_run_when_athena_fails(self):
+        s3 = LocalS3()
+        load_deliveries(s3, 'raw', days=2, files=1, rows=100)
+        days = sorted({key.split('/')[0] for _, key in s3.objects})
+        athena = FailingAthena(s3)
+        ingest = local_ingest(s3, athena_client=athena, tv_type='TCL,TOSHIBA', quarantine=True,
+                              scrubber_engine='vectorized')
+        ingest.ingest()
+        self.assertEqual(ingest.metrics_summary['deliveries'], 2)
+        self.assertTrue(partitions(athena.queries))
+        quarantined = sorted(ingest.quarantine.days)
+        self.assertTrue(quarantined)
+
+        # the deliveries are recorded as processed, the days they wrote are kept until they are added
+        manifest = json.loads(s3.objects[('out', '_manifests/TCL_TOSHIBA-data.json')][0])
+        self.assertEqual(sorted(manifest['objects']), [f'{day}/TV_0.csv' for day in days])
+        self.assertEqual(manifest['pending_partitions'], {'TCL': days, 'TOSHIBA': days})
+        self.assertEqual(manifest['pending_quarantine'], quarantined)
+
+        ingest = local_ingest(s3, tv_type='TCL,TOSHIBA', quarantine=True, scrubber_engine='vectorized')
+        ingest.ingest()
+        self.assertEqual(ingest.metrics_summary['deliveries'], 0)
+        self.assertEqual(partitions(ingest.ac.queries),
+                         sorted([(f'{tv_type.lower()}_data', day, f's3://out/{tv_type}-data/day={day}/')
+                                 for tv_type in ['TCL', 'TOSHIBA'] for day in days]
+                                + [('quarantine', day, f's3://out/quarantine/day={day}/') for day in quarantined]))
+
+        # once added, they are not added again
+        ingest = local_ingest(s3, tv_type='TCL,TOSHIBA', quarantine=True, scrubber_engine='vectorized')
+        ingest.ingest()
+        self.assertEqual(partitions(ingest.ac.queries), [])
+        manifest = json.loads(s3.objects[('out', '_manifests/TCL_TOSHIBA-data.json')][0])
+        self.assertEqual((manifest['pending_partitions'], manifest['pending_quarantine']), (dict(), []))
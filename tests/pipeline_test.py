@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from unittest import TestCase
+from ingest_utils.async_pipeline import AsyncPipeline
+from ingest_utils.pipeline import BoundedPipeline, run_serial
+
+
+def _double(data):
+    return data * 2
+
+
+class TestPipeline(TestCase):
+
+    def setUp(self):
+        self.items = [{'key': str(i), 'size': 10, 'value': i} for i in range(20)]
+        self.written = dict()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.lock = threading.Lock()
+
+    def _read(self, item):
+        with self.lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return item['value']
+
+    def _write(self, item, result):
+        with self.lock:
+            self.in_flight -= 1
+            if item['key'] == '3':
+                raise ValueError("bad delivery")
+            self.written[item['key']] = result
+
+    def _check(self, outcomes):
+        failures = {item['key']: error for item, result, error in outcomes if error is not None}
+        self.assertEqual(list(failures), ['3'])
+        self.assertIsInstance(failures['3'], ValueError)
+        self.assertEqual(len(self.written), 19)
+        self.assertEqual(self.written['7'], 14)
+
+    def test_serial(self):
+        self._check(list(run_serial(self.items, self._read, _double, self._write)))
+
+    def test_threads_bounded_by_bytes(self):
+        pipeline = BoundedPipeline(io_workers=4, cpu_workers=0, max_in_flight_bytes=30)
+        self._check(list(pipeline.run(self.items, self._read, _double, self._write)))
+        self.assertLessEqual(self.peak_in_flight, 3)
+
+    def test_processes(self):
+        pipeline = BoundedPipeline(io_workers=4, cpu_workers=2, max_in_flight=5)
+        self._check(list(pipeline.run(self.items, self._read, _double, self._write)))
+        self.assertLessEqual(self.peak_in_flight, 5)
+
+    def test_coroutines(self):
+
+        async def _read(item):
+            value = self._read(item)
+            await asyncio.sleep(0.01)
+            return value
+
+        async def _write(item, result):
+            await asyncio.sleep(0.01)
+            self._write(item, result)
+
+        for cpu_workers in (0, 2):
+            with self.subTest(cpu_workers=cpu_workers):
+                self.setUp()
+                pipeline = AsyncPipeline(max_in_flight=8, cpu_workers=cpu_workers)
+                self._check(list(pipeline.run(self.items, _read, _double, _write)))
+                self.assertEqual(self.peak_in_flight, 8)
@@ -0,0 +1,112 @@
+import io
+import tempfile
+from unittest import TestCase
+import pandas as pd
+from benchmarks.deliveries import generate_frame, load_deliveries
+from benchmarks.local_aws import LocalS3, local_ingest
+from ingest import _scrub
+from ingest_utils.quarantine import QuarantineSink, TAGS, rejected_rows
+from ingest_utils.stats import RunningStats
+
+
+def quarantine_rows(s3):
+    frames = [pd.read_csv(io.BytesIO(body), dtype=str, keep_default_na=False)
+              for (bucket, key), (body, _, _) in s3.objects.items()
+              if bucket == 'out' and key.startswith('quarantine/')]
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+
+class TestRejectedRows(TestCase):
+
+    def test_both_engines_reject_the_same_records(self):
+        df = generate_frame('20220512', 500, dirty_fraction=0.2)
+        rejected = dict()
+        for engine in ['dativa', 'vectorized']:
+            reports = dict()
+            rejected[engine] = rejected_rows(df, _scrub(df, RunningStats(), reports, engine))
+            replaced = sum(entry['number_records'] for entry in reports.values() if entry['category'] == 'replaced')
+            self.assertEqual(len(rejected[engine]), replaced)
+        pd.testing.assert_frame_equal(rejected['dativa'], rejected['vectorized'])
+
+        rows = rejected['vectorized']
+        self.assertEqual(list(rows.columns[-len(TAGS):]), TAGS)
+        self.assertEqual(set(rows['outcome']), {'replaced'})
+        self.assertEqual(set(rows['field']), {'Selling Price', 'Original Price'})
+        for _, row in rows.iterrows():
+            self.assertEqual(row['original_value'], row[row['field']])
+
+    def test_clean_records_are_not_rejected(self):
+        df = generate_frame('20220512', 100, dirty_fraction=0)
+        self.assertIsNone(rejected_rows(df, _scrub(df, RunningStats(), dict(), 'vectorized')))
+
+
+class TestQuarantineSink(TestCase):
+
+    def test_rows_are_buffered_per_day(self):
+        rows = pd.DataFrame({'Brand': ['TCL'] * 3, 'original_value': ['abc', '-5', '']})
+        with tempfile.TemporaryDirectory() as folder:
+            sink = QuarantineSink(folder, max_rows=5)
+            self.assertEqual(sink.add('20220512', '20220512/a.csv', rows), 0)
+            self.assertEqual(sink.add('20220513', '20220513/a.csv', rows), 0)
+            self.assertGreater(sink.add('20220512', '20220512/b.csv', rows), 0)
+            self.assertEqual(sink.days, {'20220512'})
+            self.assertGreater(sink.flush(), 0)
+            self.assertEqual(sink.days, {'20220512', '20220513'})
+            self.assertEqual(sink.flush(), 0)
+
+            written = pd.read_csv(sink.store.path(f"day=20220512/{sink.run_id}-00000.csv"), dtype=str,
+                                  keep_default_na=False)
+            self.assertEqual(written['source_key'].tolist(), ['20220512/a.csv'] * 3 + ['20220512/b.csv'] * 3)
+            self.assertEqual(written['original_value'].tolist(), ['abc', '-5', ''] * 2)
+
+
+class TestIngestQuarantine(TestCase):
+
+    def test_rejected_rows_are_written_in_the_same_pass(self):
+        for chunk_size in [None, 70]:
+            with self.subTest(chunk_size=chunk_size):
+                gets = []
+                for quarantine in [False, True]:
+                    s3 = LocalS3()
+                    load_deliveries(s3, 'raw', days=2, files=3, rows=200)
+                    ingest = local_ingest(s3, tv_type='TCL,TOSHIBA', scrubber_engine='vectorized',
+                                          quarantine=quarantine, chunk_size=chunk_size)
+                    ingest.ingest()
+                    gets.append(s3.requests['get'])
+                self.assertEqual(ingest.failures, dict())
+
+                rows = quarantine_rows(s3)
+                self.assertEqual(len(rows), ingest.metrics_summary['rows_quarantined'])
+                self.assertEqual(set(rows['Brand']), {'TCL', 'TOSHIBA'})
+                self.assertEqual(rows['source_key'].str.split('/').str[0].nunique(), 2)
+                # one object per day, and the sources are only read once
+                objects = [key for bucket, key in s3.objects if bucket == 'out' and key.startswith('quarantine/')]
+                self.assertEqual(sorted(key.split('/')[1] for key in objects),
+                                 ['day=' + day for day in sorted(ingest.quarantine.days)])
+                self.assertEqual(gets[0], gets[1])
+
+                queries = ingest.ac.queries
+                self.assertTrue(any('CREATE EXTERNAL TABLE IF NOT EXISTS `quarantine`' in query for query in queries))
+                self.assertTrue(any('ALTER TABLE quarantine ADD IF NOT EXISTS' in query for query in queries))
+
+    def test_quarantine_is_off_by_default(self):
+        s3 = LocalS3()
+        load_deliveries(s3, 'raw', days=1, files=1, rows=200)
+        ingest = local_ingest(s3, scrubber_engine='vectorized')
+        ingest.ingest()
+        self.assertIsNone(quarantine_rows(s3))
+        self.assertNotIn('rows_quarantined', ingest.metrics_summary)
+
+    def test_quarantine_location_with_a_trailing_slash(self):
+        s3 = LocalS3()
+        load_deliveries(s3, 'raw', days=1, files=1, rows=200)
+        ingest = local_ingest(s3, scrubber_engine='vectorized', quarantine=True,
+                              quarantine_location='s3://out/rejected/')
+        ingest.ingest()
+        day, = ingest.quarantine.days
+        objects = [key for bucket, key in s3.objects if bucket == 'out' and key.startswith('rejected')]
+        self.assertEqual([key.rpartition('/')[0] for key in objects], [f'rejected/day={day}'])
+        alter = [query for query in ingest.ac.queries if query.startswith('ALTER TABLE quarantine')]
+        self.assertEqual(len(alter), 1)
+        self.assertIn(f"LOCATION 's3://out/rejected/day={day}/'", alter[0])
+        self.assertNotIn('//day=', alter[0])
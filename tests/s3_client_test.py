@@ -0,0 +1,220 @@
+import os
+import tempfile
+from datetime import datetime, timezone
+from unittest import TestCase
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from s3_client.s3_client import S3Client, S3Object
+
+
+class PagingClient:
+    """Answers list_objects_v2 from an in memory list of keys, two keys or prefixes per page"""
+
+    def __init__(self, keys):
+        self.keys = sorted(keys)
+        self.requests = 0
+
+    def list_objects_v2(self, Bucket, Prefix="", Delimiter=None, ContinuationToken=None, StartAfter=None, **kwargs):
+        self.requests += 1
+        keys = [k for k in self.keys if k.startswith(Prefix) and (StartAfter is None or k > StartAfter)]
+        folders = []
+        if Delimiter:
+            folders = sorted({Prefix + k[len(Prefix):].split(Delimiter)[0] + Delimiter
+                              for k in keys if Delimiter in k[len(Prefix):]})
+            keys = [k for k in keys if Delimiter not in k[len(Prefix):]]
+        entries = [('key', k) for k in keys] + [('folder', f) for f in folders]
+        start = int(ContinuationToken or 0)
+        page = entries[start:start + 2]
+        response = {'IsTruncated': start + 2 < len(entries)}
+        contents = [{'Key': k, 'LastModified': datetime(2022, 5, 12), 'Size': 1, 'ETag': '"e"'}
+                    for kind, k in page if kind == 'key']
+        if contents:
+            response['Contents'] = contents
+        if any(kind == 'folder' for kind, _ in page):
+            response['CommonPrefixes'] = [{'Prefix': f} for kind, f in page if kind == 'folder']
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(start + 2)
+        return response
+
+
+class BulkClient(PagingClient):
+    """Keeps uploaded files in memory, and refuses to delete keys containing 'locked'"""
+
+    def __init__(self, keys=()):
+        super().__init__(keys)
+        self.bodies = {key: b'x' for key in keys}
+        self.delete_batches = []
+
+    def upload_file(self, file_name, bucket, key, Config=None):
+        with open(file_name, 'rb') as f:
+            self.bodies[key] = f.read()
+        self.keys = sorted(self.bodies)
+
+    def download_file(self, bucket, key, file_name, Config=None):
+        with open(file_name, 'wb') as f:
+            f.write(self.bodies[key])
+
+    def delete_objects(self, Bucket, Delete):
+        self.delete_batches.append(len(Delete['Objects']))
+        errors = [{'Key': o['Key'], 'Code': 'AccessDenied', 'Message': 'Access Denied'}
+                  for o in Delete['Objects'] if 'locked' in o['Key']]
+        return {'Errors': errors} if errors else {}
+
+
+def reference_partitions(s3c, path):
+    """get_partitions as it was before it streamed, building a frame of every object"""
+    files = list()
+    for value in s3c.list_dict(path):
+        folders = value['key'].split('/')
+        value['table'] = folders[0]
+        value['file'] = folders[-1]
+        for i, partition in enumerate(folders[1:-1]):
+            if "=" in partition:
+                value[partition.split('=')[0]] = partition.split('=')[1]
+            else:
+                value['partition_{0}'.format(i)] = partition
+        files.append(value)
+    df = pd.DataFrame.from_dict(files)
+    return df.fillna("").groupby(['table'] + [a for a in df.columns.tolist() if
+                                              a not in ['table', 'last_modified', 'size', 'key', 'file', 'etag']]).agg(
+        {'size': 'sum', 'key': 'count', 'last_modified': 'max'}).reset_index()
+
+
+class DatedClient(PagingClient):
+    """Lists each key with its own size and modification time"""
+
+    def list_objects_v2(self, **kwargs):
+        response = super().list_objects_v2(**kwargs)
+        for record in response.get('Contents', []):
+            index = self.keys.index(record['Key'])
+            record.update(Size=index * 10, LastModified=datetime(2022, 5, 1 + index % 20, tzinfo=timezone.utc))
+        return response
+
+
+class TestS3Client(TestCase):
+
+    keys = ['raw/20220510/a.csv', 'raw/20220510/b.csv', 'raw/20220510/c.txt', 'raw/20220511/a.csv',
+            'raw/20220512/a.csv', 'raw/20220512/b.csv', 'raw/20220512/c.csv', 'raw/readme.csv', 'other/a.csv']
+
+    def test_list_parallel_matches_list_dict(self):
+        s3c = S3Client(PagingClient(self.keys))
+        expected = list(s3c.list_dict('s3://bucket/raw/', '.csv'))
+        unsorted = list(s3c.list_parallel('s3://bucket/raw', '.csv', max_workers=3))
+        self.assertCountEqual([i['key'] for i in unsorted], [i['key'] for i in expected])
+        self.assertEqual(list(s3c.list_parallel('s3://bucket/raw', '.csv', sort=True)), expected)
+
+    def test_list_parallel_compact_and_prefixes(self):
+        s3c = S3Client(PagingClient(self.keys))
+        objects = list(s3c.list_parallel('s3://bucket/raw/', remove_prefix=True, prefixes=['20220512/', '20220510/'],
+                                         sort=True, compact=True))
+        self.assertIsInstance(objects[0], S3Object)
+        self.assertEqual([i.key for i in objects], ['20220510/a.csv', '20220510/b.csv', '20220510/c.txt',
+                                                    '20220512/a.csv', '20220512/b.csv', '20220512/c.csv'])
+        self.assertEqual(objects[0].etag, 'e')
+
+    def test_list_parallel_stopped_early_cancels_the_other_prefixes(self):
+        client = PagingClient([f'raw/2022{day:04d}/a.csv' for day in range(100)])
+        s3c = S3Client(client)
+        listed = s3c.list_parallel('s3://bucket/raw/', '.csv', max_workers=1, sort=True)
+        self.assertEqual(next(listed)['key'], 'raw/20220000/a.csv')
+        listed.close()
+        requests = client.requests
+        self.assertLess(requests, 60)
+        self.assertEqual(client.requests, requests)
+
+    def test_generate_keys_does_not_recurse(self):
+        keys = ['big/{:05d}.csv'.format(i) for i in range(3000)]
+        client = PagingClient(keys)
+        self.assertEqual(list(S3Client(client)._generate_keys('bucket', 'big/', '.csv')), keys)
+        self.assertEqual(client.requests, 1501)
+
+    def test_put_and_get_folder(self):
+        client = BulkClient()
+        s3c = S3Client(client, max_workers=4)
+        with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as destination:
+            os.makedirs(os.path.join(source, '20220512'))
+            for name in ('a.csv', 'b.csv'):
+                with open(os.path.join(source, '20220512', name), 'wb') as f:
+                    f.write(b'abc')
+            stats = s3c.put_folder(source, 'bucket', 'raw')
+            self.assertEqual((stats.objects, stats.bytes, stats.errors), (2, 6, {}))
+            self.assertEqual(sorted(client.bodies), ['raw/20220512/a.csv', 'raw/20220512/b.csv'])
+
+            stats = s3c.get_folder('s3://bucket/raw', destination)
+            self.assertEqual(stats.objects, 2)
+            with open(os.path.join(destination, '20220512', 'b.csv'), 'rb') as f:
+                self.assertEqual(f.read(), b'abc')
+            self.assertIn('objects_per_second', stats.as_dict())
+
+    def test_put_folder_raises_unless_told_otherwise(self):
+        class FailingClient(BulkClient):
+            def upload_file(self, file_name, bucket, key, Config=None):
+                if key.endswith('bad.csv'):
+                    raise OSError("upload failed")
+                super().upload_file(file_name, bucket, key, Config)
+
+        with tempfile.TemporaryDirectory() as source:
+            for name in ('a.csv', 'bad.csv', 'c.csv'):
+                with open(os.path.join(source, name), 'wb') as f:
+                    f.write(b'abc')
+            with self.assertRaises(OSError):
+                S3Client(FailingClient(), max_workers=1).put_folder(source, 'bucket', 'raw')
+
+            client = FailingClient()
+            stats = S3Client(client, max_workers=1).put_folder(source, 'bucket', 'raw', raise_on_error=False)
+            self.assertEqual((stats.objects, list(stats.errors)), (2, ['raw/bad.csv']))
+            self.assertEqual(sorted(client.bodies), ['raw/a.csv', 'raw/c.csv'])
+
+    def test_delete_reports_errors(self):
+        keys = ['out/{:04d}.csv'.format(i) for i in range(2500)] + ['out/locked.csv']
+        client = BulkClient(keys)
+        stats = S3Client(client, max_workers=2).delete('s3://bucket/out/')
+        self.assertEqual(client.delete_batches, [1000, 1000, 501])
+        self.assertEqual(stats.objects, 2500)
+        self.assertEqual(list(stats.errors), ['out/locked.csv'])
+        self.assertIn('AccessDenied', stats.errors['out/locked.csv'])
+
+    def test_get_folder_raises_unless_told_otherwise(self):
+        class FailingClient(BulkClient):
+            def download_file(self, bucket, key, file_name, Config=None):
+                if key.endswith('bad.csv'):
+                    raise OSError("download failed")
+                super().download_file(bucket, key, file_name, Config)
+
+        keys = ['raw/a.csv', 'raw/bad.csv', 'raw/c.csv']
+        with tempfile.TemporaryDirectory() as destination:
+            with self.assertRaises(OSError):
+                S3Client(FailingClient(keys), max_workers=1).get_folder('s3://bucket/raw', destination)
+
+            stats = S3Client(FailingClient(keys), max_workers=1).get_folder('s3://bucket/raw', destination,
+                                                                            raise_on_error=False)
+            self.assertEqual((stats.objects, list(stats.errors)), (2, ['raw/bad.csv']))
+            self.assertEqual(sorted(os.listdir(destination)), ['a.csv', 'c.csv'])
+
+    def test_delete_raises_a_failed_batch_unless_told_otherwise(self):
+        class FailingClient(BulkClient):
+            def delete_objects(self, Bucket, Delete):
+                if any('bad' in o['Key'] for o in Delete['Objects']):
+                    raise OSError("connection reset")
+                return super().delete_objects(Bucket, Delete)
+
+        keys = ['out/{:04d}.csv'.format(i) for i in range(1500)] + ['out/bad.csv']
+        with self.assertRaises(OSError):
+            S3Client(FailingClient(keys), max_workers=1).delete('s3://bucket/out/')
+
+        client = FailingClient(keys)
+        stats = S3Client(client, max_workers=1).delete('s3://bucket/out/', raise_on_error=False)
+        self.assertEqual(client.delete_batches, [1000])
+        self.assertEqual(stats.objects, 1000)
+        self.assertEqual(len(stats.errors), 501)
+        self.assertIn('connection reset', stats.errors['out/bad.csv'])
+
+    def test_get_partitions_matches_reference(self):
+        keys = ['TCL-data/day=20220510/a.csv', 'TCL-data/day=20220510/b.csv', 'TCL-data/day=20220511/a.csv',
+                'TOSHIBA-data/day=20220510/a.csv', 'TOSHIBA-data/day=20220510/hour=01/a.csv',
+                'TOSHIBA-data/day=20220510/hour=02/a.csv', 'TOSHIBA-data/raw/a.csv', 'TOSHIBA-data/day=/a.csv',
+                'TOSHIBA-data/a.csv', 'readme.txt', '_manifests/TCL-data.json']
+        s3c = S3Client(DatedClient(keys))
+        expected = reference_partitions(s3c, 's3://bucket/')
+        assert_frame_equal(s3c.get_partitions('s3://bucket/'), expected)
+        self.assertEqual(list(s3c.iter_partitions('s3://bucket/')), expected.to_dict('records'))
@@ -0,0 +1,49 @@
+from unittest import TestCase
+from newtools import S3Location as ReferenceLocation
+from s3_client.s3_client import S3Location, S3ClientError
+
+CASES = ['s3://bucket/folder/file.txt', 'bucket/folder', 'https://s3.amazonaws.com/bucket-name/',
+         'http://s3-eu-west-1.amazonaws.com/bucket/key/file', 's3://bucket', 's3://bucket/', 's3://Bucket/Key',
+         's3://bucket/a//b', 's3://bucket:80/key', 's3://user:pass@bucket/key', 's3://user@bucket/key', '/abs/path',
+         'ftp://bucket/key', 's3:///key', 'https://example.com/bucket/key', 's3://bucket/key?x=1', 's3://bucket/key#f',
+         's3://bucket/key;p', 's3://bucket/a b', ' s3://bucket/key', 's3://bucket/key\t', 'MyBucket/key', 'bucket/k;x',
+         's3://b.c-d_e/k%20x', 's3://bucket//key', 's3://bucket/é/ü', 'bucket', '']
+
+JOINS = [('file',), ('day=20220512', 'TV_0.csv'), ('/file',), ('file?x',), ('a file',), ('',), ('a//b',), ('k;v',)]
+
+
+def describe(cls, s3_str, ignore_double_slash):
+    """The observable behaviour of a location and its joins, or the error it raises"""
+    try:
+        loc = cls(s3_str, ignore_double_slash)
+    except (ValueError, S3ClientError) as e:
+        return 'error', str(e).replace('S3 Client failed: reason ', '')
+    joins = []
+    for parts in JOINS:
+        for ignore in (False, True):
+            try:
+                joined = loc.join(*parts, ignore_double_slash=ignore)
+                joins.append((str(joined), joined.bucket, joined.key, joined.prefix, joined.file))
+            except (ValueError, S3ClientError) as e:
+                joins.append(('error', str(e).replace('S3 Client failed: reason ', '')))
+    return str(loc), loc.bucket, loc.key, loc.prefix, loc.file, repr(loc), joins
+
+
+class TestS3Location(TestCase):
+
+    def test_same_behaviour_as_reference(self):
+        for s3_str in CASES:
+            for ignore_double_slash in (False, True):
+                with self.subTest(s3_str=s3_str, ignore_double_slash=ignore_double_slash):
+                    self.assertEqual(describe(ReferenceLocation, s3_str, ignore_double_slash),
+                                     describe(S3Location, s3_str, ignore_double_slash))
+
+    def test_equality_and_interning(self):
+        loc = S3Location('s3://bucket/folder')
+        self.assertIs(loc, S3Location('s3://bucket/folder'))
+        self.assertEqual(loc, 's3://bucket/folder')
+        self.assertEqual(loc, S3Location('bucket/folder'))
+        self.assertEqual(loc, S3Location(bucket='bucket', key='folder'))
+        self.assertEqual(hash(loc), hash('s3://bucket/folder'))
+        self.assertEqual(loc.join('file.csv').key, 'folder/file.csv')
+        self.assertRaises(S3ClientError, loc.join, '/file.csv')
@@ -0,0 +1,41 @@
+from unittest import TestCase
+from benchmarks.local_aws import LocalS3
+from s3_client.s3_writer import MIN_PART_SIZE, S3StreamWriter
+
+
+class TestS3StreamWriter(TestCase):
+
+    def test_small_object_is_a_single_put(self):
+        s3 = LocalS3()
+        with S3StreamWriter(s3, 's3://out/a.csv') as writer:
+            writer.write(b'a,b\n')
+            writer.write(b'1,2\n')
+            self.assertEqual(s3.objects, dict())
+        self.assertEqual(s3.objects[('out', 'a.csv')][0], b'a,b\n1,2\n')
+        self.assertEqual(s3.requests, {'put': 1})
+        self.assertEqual(writer.bytes_written, 8)
+
+    def test_large_object_is_a_multipart_upload(self):
+        s3 = LocalS3()
+        block = b'x' * (1024 * 1024)
+        with S3StreamWriter(s3, 's3://out/a.csv', part_size=MIN_PART_SIZE) as writer:
+            for _ in range(6):
+                writer.write(block)
+            # the first part has been uploaded, the object only appears once the upload is completed
+            self.assertEqual(s3.requests, {'put': 2})
+            self.assertEqual(s3.objects, dict())
+        self.assertEqual(s3.objects[('out', 'a.csv')][0], block * 6)
+        # create, two parts and complete
+        self.assertEqual(s3.requests, {'put': 4})
+
+    def test_error_aborts_the_upload(self):
+        for size in (10, 6 * 1024 * 1024):
+            with self.subTest(size=size):
+                s3 = LocalS3()
+                with self.assertRaises(IOError):
+                    with S3StreamWriter(s3, 's3://out/a.csv') as writer:
+                        writer.write(b'x' * size)
+                        raise IOError("connection reset")
+                self.assertTrue(writer.closed)
+                self.assertEqual(s3.objects, dict())
+                self.assertEqual(s3._uploads, dict())
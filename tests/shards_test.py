@@ -0,0 +1,65 @@
+from unittest import TestCase
+
+from benchmarks.deliveries import load_deliveries
+from benchmarks.local_aws import LocalS3, local_ingest
+from ingest_utils.shards import pack_days, select_shard, shard_of_day
+
+
+def _obj(key, size=10):
+    return {'key': key, 'size': size}
+
+
+class TestSelectShard(TestCase):
+
+    def test_each_day_goes_to_one_shard(self):
+        objects = [_obj(f'202205{day:02}/TV_{f}.csv') for day in range(1, 31) for f in range(3)]
+        for strategy in ('day', 'size'):
+            with self.subTest(strategy=strategy):
+                shards = [select_shard(objects, i, 4, strategy) for i in range(4)]
+                self.assertEqual(sorted(o['key'] for shard in shards for o in shard), sorted(o['key'] for o in objects))
+                days = [{o['key'].split('/')[0] for o in shard} for shard in shards]
+                self.assertEqual(sum(len(d) for d in days), 30)
+        self.assertEqual(shard_of_day('20220512', 4), shard_of_day('20220512', 4))
+
+    def test_size_balances_the_shards(self):
+        objects = [_obj('20220501/a.csv', 100), _obj('20220502/a.csv', 60), _obj('20220503/a.csv', 50),
+                   _obj('20220504/a.csv', 30), _obj('20220504/b.csv', 15)]
+        self.assertEqual(pack_days(objects, 2), {'20220501': 0, '20220502': 1, '20220503': 1, '20220504': 0})
+        with self.assertRaises(ValueError):
+            select_shard(objects, 0, 2, 'random')
+
+
+class TestShardedIngest(TestCase):
+
+    def test_shards_then_coordinate(self):
+        s3 = LocalS3()
+        load_deliveries(s3, 'raw', days=6, files=2, rows=50)
+        shards = [local_ingest(s3, tv_type='TCL,TOSHIBA', shard_index=i, shard_count=3, shard_strategy='size')
+                  for i in range(3)]
+        for shard in shards[:2]:
+            shard.ingest()
+            self.assertEqual(shard.ac.queries, [])
+
+        coordinator = local_ingest(s3, tv_type='TCL,TOSHIBA', shard_count=3)
+        self.assertEqual(coordinator.coordinate(), [2])
+        shards[2].ingest()
+        self.assertEqual(sum(s.metrics_summary['deliveries'] for s in shards), 12)
+
+        coordinator = local_ingest(s3, tv_type='TCL,TOSHIBA', shard_count=3)
+        self.assertEqual(coordinator.coordinate(), [])
+        partitions = coordinator.ac.batches[-1]
+        self.assertEqual(sum(sql.count('PARTITION') for sql in partitions), 12)
+
+        # the coordinator merged the manifests, unsharded runs and new shards have nothing left to do
+        ingest = local_ingest(s3, tv_type='TCL,TOSHIBA')
+        ingest.ingest()
+        self.assertEqual(ingest.metrics_summary['deliveries'], 0)
+        shard = local_ingest(s3, tv_type='TCL,TOSHIBA', shard_index=0, shard_count=2)
+        shard.ingest()
+        self.assertEqual(shard.metrics_summary['deliveries'], 0)
+
+    def test_invalid_shards(self):
+        for kwargs in ({'shard_index': 3, 'shard_count': 3}, {'shard_count': 0},
+                       {'shard_index': 0, 'shard_count': 2, 'dedup_deliveries': True}):
+            with self.subTest(**kwargs), self.assertRaises(ValueError):
+                local_ingest(LocalS3(), **kwargs)
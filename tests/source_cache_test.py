@@ -0,0 +1,150 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from benchmarks.deliveries import load_deliveries
+from benchmarks.local_aws import LocalAsyncS3, LocalS3, local_ingest
+from ingest_utils.source_cache import SourceCache
+
+
+def _outputs(s3):
+    return {key: body for (bucket, key), (body, _, _) in s3.objects.items() if bucket == 'out' and 'day=' in key}
+
+
+class TestSourceCache(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_fill_get_and_evict(self):
+        cache = SourceCache(self.tmp_dir.name, max_bytes=250)
+        self.assertIsNone(cache.get('raw', 'a.csv', 'etag1'))
+        cached = cache.fill('raw', 'a.csv', 'etag1', lambda f: f.write(b'a' * 100))
+        self.assertEqual(cached.size, 100)
+        self.assertEqual(cache.get('raw', 'a.csv', 'etag1'), cached)
+        self.assertIsNone(cache.get('raw', 'a.csv', 'etag2'))
+
+        cache.fill('raw', 'b.csv', 'etag1', lambda f: f.write(b'b' * 100))
+        os.utime(cache.path('raw', 'b.csv', 'etag1'), (1, 1))
+        os.utime(cache.path('raw', 'a.csv', 'etag1'), (2, 2))
+        cache.fill('raw', 'c.csv', 'etag1', lambda f: f.write(b'c' * 100))
+        # b was the least recently used, evicting it is enough to be under 90% of the cap
+        self.assertIsNone(cache.get('raw', 'b.csv', 'etag1'))
+        self.assertIsNotNone(cache.get('raw', 'a.csv', 'etag1'))
+        with open(cache.get('raw', 'c.csv', 'etag1').path, 'rb') as f:
+            self.assertEqual(f.read(), b'c' * 100)
+
+    def test_failed_fill_leaves_nothing(self):
+        cache = SourceCache(self.tmp_dir.name)
+
+        def _fail(f):
+            f.write(b'partial')
+            raise IOError("connection reset")
+
+        with self.assertRaises(IOError):
+            cache.fill('raw', 'a.csv', 'etag1', _fail)
+        self.assertIsNone(cache.get('raw', 'a.csv', 'etag1'))
+        self.assertEqual([f for _, _, files in os.walk(self.tmp_dir.name) for f in files], [])
+
+    def test_pinned_file_outlives_eviction(self):
+        cache = SourceCache(self.tmp_dir.name, max_bytes=250)
+        cached = cache.fill('raw', 'a.csv', 'etag1', lambda f: f.write(b'a' * 100))
+        pinned = cache.pin(cached)
+        self.assertNotEqual(pinned.path, cached.path)
+        self.assertEqual(pinned.size, 100)
+
+        cache.max_bytes = 0
+        cache.evict()
+        self.assertIsNone(cache.get('raw', 'a.csv', 'etag1'))
+        self.assertIsNone(cache.pin(cached))
+        with open(pinned.path, 'rb') as f:
+            self.assertEqual(f.read(), b'a' * 100)
+        # pins are not counted in the size of the cache
+        self.assertEqual(cache._scan(), ([], 0))
+
+        cache.unpin(pinned)
+        cache.unpin(pinned)
+        self.assertEqual([f for _, _, files in os.walk(self.tmp_dir.name) for f in files], [])
+
+
+class TestIngestSourceCache(TestCase):
+
+    def test_second_run_reads_from_disk(self):
+        for mode in ({}, {'chunk_size': 30}, {'pipelined': True, 'cpu_workers': 2}, {'async_io': True}):
+            with self.subTest(**mode), tempfile.TemporaryDirectory() as cache_dir:
+                expected = LocalS3()
+                load_deliveries(expected, 'raw', days=2, files=2, rows=100)
+                local_ingest(expected, tv_type='TCL,TOSHIBA', async_s3_client=LocalAsyncS3(expected), **mode).ingest()
+
+                s3 = LocalS3()
+                load_deliveries(s3, 'raw', days=2, files=2, rows=100)
+                kwargs = dict(tv_type='TCL,TOSHIBA', full_refresh=True, source_cache_dir=cache_dir,
+                              async_s3_client=LocalAsyncS3(s3), **mode)
+                ingest = local_ingest(s3, **kwargs)
+                ingest.ingest()
+                self.assertEqual(ingest.metrics_summary['source_cache'], {'misses': 4})
+                self.assertEqual(_outputs(s3), _outputs(expected))
+
+                gets = s3.requests['get']
+                ingest = local_ingest(s3, **kwargs)
+                ingest.ingest()
+                size = sum(len(body) for (bucket, _), (body, _, _) in s3.objects.items() if bucket == 'raw')
+                self.assertEqual(ingest.metrics_summary['source_cache'], {'hits': 4, 'bytes_saved': size})
+                self.assertEqual(ingest.metrics_summary['bytes_in'], size)
+                # only the DDL cache, and the manifest for the partitions still to add, are read from s3
+                self.assertEqual(s3.requests['get'] - gets, 2)
+                self.assertEqual(_outputs(s3), _outputs(expected))
+
+    def test_delivery_evicted_before_it_is_parsed(self):
+        for mode in ({}, {'chunk_size': 30}, {'pipelined': True, 'cpu_workers': 2}, {'async_io': True}):
+            with self.subTest(**mode), tempfile.TemporaryDirectory() as cache_dir:
+                expected = LocalS3()
+                load_deliveries(expected, 'raw', days=2, files=2, rows=100)
+                local_ingest(expected, tv_type='TCL,TOSHIBA', async_s3_client=LocalAsyncS3(expected), **mode).ingest()
+
+                s3 = LocalS3()
+                load_deliveries(s3, 'raw', days=2, files=2, rows=100)
+                ingest = local_ingest(s3, tv_type='TCL,TOSHIBA', source_cache_dir=cache_dir,
+                                      async_s3_client=LocalAsyncS3(s3), **mode)
+                pin = ingest.source_cache.pin
+
+                def _pin_then_evict(cached):
+                    # another worker sharing the cache evicts everything once the delivery has been read
+                    try:
+                        return pin(cached)
+                    finally:
+                        ingest.source_cache.max_bytes = 0
+                        ingest.source_cache.evict()
+
+                ingest.source_cache.pin = _pin_then_evict
+                ingest.ingest()
+                self.assertEqual(ingest.failures, dict())
+                self.assertEqual(_outputs(s3), _outputs(expected))
+                self.assertEqual([f for _, _, files in os.walk(cache_dir) for f in files], [])
+
+    def test_delivery_evicted_before_it_is_pinned_is_downloaded_again(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            expected = LocalS3()
+            load_deliveries(expected, 'raw', days=1, files=2, rows=100)
+            local_ingest(expected).ingest()
+
+            s3 = LocalS3()
+            load_deliveries(s3, 'raw', days=1, files=2, rows=100)
+            ingest = local_ingest(s3, source_cache_dir=cache_dir)
+            fill = ingest.source_cache.fill
+
+            def _fill_then_evict(*args):
+                cached = fill(*args)
+                os.remove(cached.path)
+                return cached
+
+            ingest.source_cache.fill = _fill_then_evict
+            gets = s3.requests.get('get', 0)
+            ingest.ingest()
+            self.assertEqual(ingest.failures, dict())
+            self.assertEqual(_outputs(s3), _outputs(expected))
+            # the DDL cache, and each delivery twice
+            self.assertEqual(s3.requests['get'] - gets, 5)
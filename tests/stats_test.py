@@ -0,0 +1,81 @@
+import pickle
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+from benchmarks.deliveries import generate_frame, load_deliveries
+from benchmarks.local_aws import LocalS3, local_ingest
+from ingest_utils.stats import DistinctCount, RunningStats
+
+
+def hashes(start, stop):
+    return pd.util.hash_array(np.arange(start, stop))
+
+
+class TestDistinctCount(TestCase):
+
+    def test_exact_up_to_threshold(self):
+        count = DistinctCount(threshold=1000)
+        for chunk in np.array_split(np.concatenate([hashes(0, 1000), hashes(0, 500)]), 7):
+            count.update(chunk)
+        self.assertTrue(count.exact)
+        self.assertEqual(count.count(), 1000)
+        count.update(hashes(1000, 1001))
+        self.assertFalse(count.exact)
+
+    def test_estimate_beyond_threshold(self):
+        for n in (5000, 200000):
+            with self.subTest(n=n):
+                count = DistinctCount(threshold=1000)
+                for chunk in np.array_split(hashes(0, n), 10):
+                    count.update(chunk)
+                self.assertAlmostEqual(count.count() / n, 1, delta=0.03)
+
+    def test_merge_counts_the_union(self):
+        for threshold in (100000, 1000):
+            with self.subTest(threshold=threshold):
+                first, second = DistinctCount(threshold), DistinctCount(threshold)
+                first.update(hashes(0, 40000))
+                second.update(hashes(20000, 60000))
+                merged = pickle.loads(pickle.dumps(first)).merge(pickle.loads(pickle.dumps(second)))
+                self.assertAlmostEqual(merged.count() / 60000, 1, delta=0.03 if threshold == 1000 else 0)
+
+    def test_running_stats_merge(self):
+        df = pd.DataFrame({'date': pd.to_datetime(['20220510', '20220512', '20220511']), 'value': [1, 2, 1]})
+        first, second = RunningStats().update(df.iloc[:2]), RunningStats().update(df)
+        merged = RunningStats().merge(first).merge(second)
+        self.assertEqual(merged.as_dict(), {'Maximum': '2022-05-12', 'Minimum': '2022-05-10', 'Unique Record': 3,
+                                            'Records': 5, 'Unique Exact': True})
+
+    def test_unique_records_ignore_the_inferred_types(self):
+        dates = pd.to_datetime(['20220512'] * 2)
+        ints = pd.DataFrame({'date': dates, 'size': [32, 40]})
+        floats = pd.DataFrame({'date': dates, 'size': [32.0, np.nan]})
+        self.assertEqual(RunningStats().update(ints).update(floats).unique, 3)
+
+
+class TestIngestStats(TestCase):
+
+    def test_stats_per_partition_and_run(self):
+        s3 = LocalS3()
+        load_deliveries(s3, 'raw', days=3, files=2, rows=300)
+        ingest = local_ingest(s3, tv_type='TCL,TOSHIBA')
+        with self.assertLogs('toms ingest', level='INFO') as logs:
+            ingest.ingest()
+        partition_logs = [line for line in logs.output if 'Ingest partition stats' in line]
+        self.assertEqual(len(partition_logs), 6)
+        self.assertEqual(sorted(ingest.run_stats), ['TCL', 'TOSHIBA'])
+        self.assertEqual(sum(stats.rows for stats in ingest.run_stats.values()), ingest.metrics_summary['rows_kept'])
+
+    def test_chunked_run_counts_unique_records_like_a_whole_run(self):
+        df = generate_frame('20220512', 2, brands=['TCL'])
+        # the sizes of the chunks with the second record are floats, the others ints
+        df.loc[1, 'Size '] = None
+        body = df.iloc[[0, 0, 0, 0, 1, 1, 1]].to_csv(index=False).encode('utf-8')
+        for chunk_size in (None, 3):
+            with self.subTest(chunk_size=chunk_size):
+                s3 = LocalS3()
+                s3.put('raw', '20220512/TV_0.csv', body)
+                ingest = local_ingest(s3, chunk_size=chunk_size)
+                ingest.ingest()
+                self.assertEqual(ingest.run_stats['TCL'].rows, 7)
+                self.assertEqual(ingest.run_stats['TCL'].unique, 2)
@@ -0,0 +1,71 @@
+import io
+from unittest import TestCase
+import pandas as pd
+from benchmarks.deliveries import load_deliveries
+from benchmarks.local_aws import LocalS3, local_ingest
+
+
+def outputs(s3):
+    return {key: body for (bucket, key), (body, _, _) in s3.objects.items() if bucket == 'out' and '/day=' in key}
+
+
+class BrokenBody(io.BytesIO):
+    """A response body whose connection is reset once half of it has been read"""
+
+    def read(self, size=-1):
+        if self.tell() > len(self.getvalue()) // 2:
+            raise IOError("connection reset")
+        return super().read(size)
+
+
+class BrokenS3(LocalS3):
+
+    def get_object(self, Bucket, Key, **kwargs):
+        response = super().get_object(Bucket, Key, **kwargs)
+        if Key.endswith('TV_1.csv'):
+            response['Body'] = BrokenBody(response['Body'].getvalue())
+        return response
+
+
+class TestStream(TestCase):
+
+    def test_chunks_are_written_like_a_whole_delivery(self):
+        expected = LocalS3()
+        load_deliveries(expected, 'raw', days=1, files=2, rows=300)
+        ingest = local_ingest(expected, tv_type='TCL,TOSHIBA')
+        ingest.ingest()
+        summary, stats = ingest.metrics_summary, ingest.run_stats
+
+        for chunk_size in (70, 299, 10000):
+            with self.subTest(chunk_size=chunk_size):
+                s3 = LocalS3()
+                load_deliveries(s3, 'raw', days=1, files=2, rows=300)
+                ingest = local_ingest(s3, tv_type='TCL,TOSHIBA', chunk_size=chunk_size)
+                ingest.ingest()
+                written = outputs(s3)
+                self.assertEqual(sorted(written), sorted(outputs(expected)))
+                # records are written as they were delivered, rather than as the type inferred for the whole file
+                for key, body in outputs(expected).items():
+                    pd.testing.assert_frame_equal(pd.read_csv(io.BytesIO(written[key])), pd.read_csv(io.BytesIO(body)),
+                                                  check_dtype=False)
+                for name in ['rows_in', 'rows_kept', 'defaulted']:
+                    self.assertEqual(ingest.metrics_summary[name], summary[name])
+                self.assertEqual({tv_type: tv_stats.as_dict() for tv_type, tv_stats in ingest.run_stats.items()},
+                                 {tv_type: tv_stats.as_dict() for tv_type, tv_stats in stats.items()})
+
+    def test_failed_delivery_writes_nothing(self):
+        s3 = BrokenS3()
+        load_deliveries(s3, 'raw', days=1, files=2, rows=500)
+        ingest = local_ingest(s3, tv_type='TCL,TOSHIBA', chunk_size=50)
+        ingest.ingest()
+        self.assertEqual([key.split('/')[-1] for key in ingest.failures], ['TV_1.csv'])
+        written = sorted(key.split('/')[-1] for key in outputs(s3))
+        self.assertEqual(written, ['TV_0.csv', 'TV_0.csv'])
+        self.assertEqual(s3._uploads, dict())
+
+        # the failed delivery is not in the manifest, so the next run picks it up again
+        s3.__class__ = LocalS3
+        ingest = local_ingest(s3, tv_type='TCL,TOSHIBA', chunk_size=50)
+        ingest.ingest()
+        self.assertEqual(ingest.metrics_summary['deliveries'], 1)
+        self.assertEqual(len(outputs(s3)), 4)
@@ -0,0 +1,115 @@
+import copy
+import os
+import warnings
+from os import path
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+from dativa.scrubber import Scrubber
+from ingest import clean_delivery
+from ingest_utils.vector_scrubber import VectorScrubber
+from scrubber_config.scrubber_settings import scrubber_config
+
+
+def generate_delivery(rows, seed):
+    """
+    Delivery records with values every rule has to act on: out of range, decimals, blanks, text in
+    number columns and dates outside the rolling window
+    """
+    rng = np.random.default_rng(seed)
+    dates = rng.choice(['20220512', '19000101', '20991231', None, '20260101'], rows)
+    return pd.DataFrame({'Brand': rng.choice(['TCL', 'TOSHIBA', None], rows),
+                         'Size ': rng.choice([32, 43, 55, -1, 1e9], rows),
+                         'Selling Price': rng.choice([100.4, 200.5, 300, -5, 9e8, np.nan], rows),
+                         'Original Price': rng.choice(['100', '100.7', 'abc', '-3', '', None, '1e3'], rows),
+                         'Rating': rng.choice([4.3, 4.45, np.nan, 99e9], rows),
+                         'date': pd.to_datetime(dates, format='%Y%m%d')})
+
+
+def config_variants():
+    yield 'scrubber_config', scrubber_config
+    size_fixed = copy.deepcopy(scrubber_config)
+    size_fixed['rules'][2]['field'] = 'Size '
+    yield 'size_fixed', size_fixed
+    for mode in ('do_not_replace', 'remove_record'):
+        config = copy.deepcopy(size_fixed)
+        for rule in config['rules']:
+            rule['params']['fallback_mode'] = mode
+            rule['params'].pop('default_value', None)
+        yield mode, config
+    config = copy.deepcopy(size_fixed)
+    for rule in config['rules'][:4]:
+        rule['params']['fix_decimal_places'] = False
+    yield 'not_fixed', config
+    config = copy.deepcopy(size_fixed)
+    for rule in config['rules'][:4]:
+        rule['params']['decimal_places'] = 1
+        rule['params']['default_value'] = ''
+    yield 'one_decimal_place', config
+
+
+def report_tuples(report):
+    return [(entry.field, entry.rule, entry.number_records, entry.category, entry.description) for entry in report]
+
+
+class TestVectorScrubber(TestCase):
+
+    def test_parity_with_dativa(self):
+        for name, config in config_variants():
+            for seed in range(3):
+                with self.subTest(config=name, seed=seed):
+                    expected, actual = generate_delivery(500, seed), generate_delivery(500, seed)
+                    with warnings.catch_warnings():
+                        warnings.simplefilter('ignore')
+                        expected_report = Scrubber().run(expected, config)
+                    actual_report = VectorScrubber(config).run(actual)
+                    self.assertEqual(report_tuples(expected_report), report_tuples(actual_report))
+                    self.assertEqual(expected.shape, actual.shape)
+                    self.assertTrue((expected.astype(str).values == actual.astype(str).values).all())
+
+    def test_integer_columns(self):
+        for mode in ('do_not_replace', 'remove_record', 'use_default'):
+            with self.subTest(fallback_mode=mode):
+                params = {'decimal_places': 0, 'fix_decimal_places': True, 'fallback_mode': mode, 'default_value': 0}
+                config = {'rules': [
+                    {'rule_type': 'Number', 'field': 'Size',
+                     'params': dict(params, minimum_value=0, maximum_value=100)},
+                    {'rule_type': 'Number', 'field': 'Views',
+                     'params': dict(params, minimum_value=0, maximum_value=2 ** 40)}]}
+                expected = pd.DataFrame({'Size': [1, 5, 500, -3, 7],
+                                         'Views': np.array([2 ** 35, 2 ** 41, -1, 12, 2 ** 33 + 1], dtype='int64')})
+                actual = expected.copy()
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    expected_report = Scrubber().run(expected, config)
+                self.assertEqual(report_tuples(expected_report), report_tuples(VectorScrubber(config).run(actual)))
+                pd.testing.assert_frame_equal(expected, actual)
+
+    def test_string_dates(self):
+        config = list(config_variants())[1][1]
+        expected = generate_delivery(200, 7).assign(date=lambda df: df.date.dt.strftime('%Y%m%d'))
+        expected.loc[::5, 'date'] = 'not a date'
+        actual = expected.copy()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            expected_report = Scrubber().run(expected, config)
+        self.assertEqual(report_tuples(expected_report), report_tuples(VectorScrubber(config).run(actual)))
+
+    def test_unsupported_config(self):
+        config = copy.deepcopy(scrubber_config)
+        config['rules'][0]['params']['attempt_closest_match'] = True
+        with self.assertRaises(ValueError):
+            VectorScrubber(config)
+        with self.assertRaises(ValueError):
+            VectorScrubber({'rules': [{'field': 'Brand', 'rule_type': 'String', 'params': {}}]})
+
+    def test_clean_delivery_engines_match(self):
+        base_path = os.path.dirname(os.path.realpath(__file__))
+        df = pd.read_csv(path.join(base_path, 'test_data/input/test_data.csv'), index_col=0)
+        body = df.assign(date=20220512).to_csv(index=False).encode('utf-8')
+        dativa = clean_delivery(body, ['TCL', 'TOSHIBA'])
+        vectorized = clean_delivery(body, ['TCL', 'TOSHIBA'], scrubber_engine='vectorized')
+        for tv_type in dativa:
+            self.assertEqual(dativa[tv_type]['output'], vectorized[tv_type]['output'])
+            self.assertEqual([entry.split(', ', 1)[1] for entry in dativa[tv_type]['reports']],
+                             [entry.split(', ', 1)[1] for entry in vectorized[tv_type]['reports']])
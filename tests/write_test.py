@@ -0,0 +1,89 @@
+import json
+from unittest import TestCase
+from benchmarks.deliveries import load_deliveries
+from benchmarks.local_aws import LocalS3, local_ingest
+
+MODES = ({}, {'chunk_size': 70}, {'pipelined': True, 'cpu_workers': 0})
+
+
+def objects(s3, bucket):
+    return {key: body for (name, key), (body, _, _) in s3.objects.items() if name == bucket and 'data/' in key}
+
+
+def processed(s3):
+    return sorted(json.loads(s3.objects[('out', '_manifests/TCL_TOSHIBA-data.json')][0])['objects'])
+
+
+class FailingS3(LocalS3):
+    """Fails to write, or to copy, the TOSHIBA output of TV_1.csv"""
+
+    @staticmethod
+    def _fails(key):
+        return 'TOSHIBA-data' in key and 'TV_1' in key
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        if Bucket == 'out' and self._fails(Key):
+            raise IOError("connection reset")
+        return super().put_object(Bucket, Key, Body, **kwargs)
+
+    def copy_object(self, CopySource, Bucket, Key, **kwargs):
+        if self._fails(Key):
+            raise IOError("connection reset")
+        return super().copy_object(CopySource, Bucket, Key, **kwargs)
+
+
+class TestWrite(TestCase):
+
+    def test_outputs_are_written_to_their_partition(self):
+        for mode in MODES:
+            with self.subTest(**mode):
+                s3 = LocalS3()
+                load_deliveries(s3, 'raw', days=1, files=2, rows=100)
+                day = next(key for _, key in s3.objects).split('/')[0]
+                ingest = local_ingest(s3, tv_type='TCL,TOSHIBA', **mode)
+                ingest.ingest()
+                self.assertEqual(sorted(objects(s3, 'out')),
+                                 [f'{tv_type}-data/day={day}/TV_{i}.csv' for tv_type in ['TCL', 'TOSHIBA']
+                                  for i in range(2)])
+                self.assertEqual(objects(s3, 'tv-type-intermediary'), dict())
+                self.assertNotIn('copy', s3.requests)
+
+    def test_staged_outputs_are_copied_to_their_partition(self):
+        for mode in MODES:
+            with self.subTest(**mode):
+                expected = LocalS3()
+                load_deliveries(expected, 'raw', days=1, files=2, rows=100)
+                local_ingest(expected, tv_type='TCL,TOSHIBA', **mode).ingest()
+
+                s3 = LocalS3()
+                load_deliveries(s3, 'raw', days=1, files=2, rows=100)
+                day = next(key for _, key in s3.objects).split('/')[0]
+                ingest = local_ingest(s3, tv_type='TCL,TOSHIBA', stage_intermediary=True, **mode)
+                ingest.ingest()
+                self.assertEqual(objects(s3, 'out'), objects(expected, 'out'))
+                staged = objects(s3, 'tv-type-intermediary')
+                self.assertEqual(sorted(staged), [f'{tv_type}-data/{day}/TV_{i}.csv' for tv_type in ['TCL', 'TOSHIBA']
+                                                  for i in range(2)])
+                self.assertEqual(s3.requests['copy'], 4)
+                self.assertEqual(ingest.metrics_summary['requests']['copy_object'], 4)
+
+    def test_failed_delivery_is_not_recorded(self):
+        for stage_intermediary in (False, True):
+            for mode in MODES:
+                with self.subTest(stage_intermediary=stage_intermediary, **mode):
+                    s3 = FailingS3()
+                    load_deliveries(s3, 'raw', days=1, files=2, rows=100)
+                    day = next(key for _, key in s3.objects).split('/')[0]
+                    ingest = local_ingest(s3, tv_type='TCL,TOSHIBA', stage_intermediary=stage_intermediary, **mode)
+                    ingest.ingest()
+                    self.assertEqual(sorted(ingest.failures), [f'{day}/TV_1.csv'])
+                    self.assertEqual(processed(s3), [f'{day}/TV_0.csv'])
+                    self.assertNotIn(f'TOSHIBA-data/day={day}/TV_1.csv', objects(s3, 'out'))
+
+                    # the next run writes the delivery again, and records it once it has been written
+                    s3.__class__ = LocalS3
+                    ingest = local_ingest(s3, tv_type='TCL,TOSHIBA', stage_intermediary=stage_intermediary, **mode)
+                    ingest.ingest()
+                    self.assertEqual(ingest.metrics_summary['deliveries'], 1)
+                    self.assertEqual(processed(s3), [f'{day}/TV_0.csv', f'{day}/TV_1.csv'])
+                    self.assertEqual(len(objects(s3, 'out')), 4)